@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import CarbonUsage, CarbonGoal
+from .models import (
+    CarbonGoal,
+    CarbonUsage,
+    CohortStats,
+    MonthRollup,
+    RankEntry,
+    UserMonthRollup,
+    UserWeekRollup,
+)
 
 # Register your models here.
 
@@ -24,5 +32,100 @@ class CarbonGoalAdmin(admin.ModelAdmin):
         "achieved",
     ]
     list_filter = ["achieved", "month", "user"]
+    list_select_related = ["user"]
     ordering = ["-month"]
     readonly_fields = ["progress_percentage"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_baseline()
+
+
+class CheckupRollupAdmin(admin.ModelAdmin):
+    """Read-only view of checkup rollups, maintained by apps.charts.rollups"""
+
+    stat_fields = [
+        "count",
+        "weekly_total_mean",
+        "weekly_total_min",
+        "weekly_total_max",
+        "monthly_estimate_mean",
+        "monthly_estimate_min",
+        "monthly_estimate_max",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(UserWeekRollup)
+class UserWeekRollupAdmin(CheckupRollupAdmin):
+    list_display = ["user", "week", *CheckupRollupAdmin.stat_fields]
+    list_select_related = ["user"]
+    date_hierarchy = "week"
+    ordering = ["-week"]
+    search_fields = ["user__username"]
+
+
+@admin.register(UserMonthRollup)
+class UserMonthRollupAdmin(CheckupRollupAdmin):
+    list_display = ["user", "month", *CheckupRollupAdmin.stat_fields]
+    list_select_related = ["user"]
+    date_hierarchy = "month"
+    ordering = ["-month"]
+    search_fields = ["user__username"]
+
+
+@admin.register(MonthRollup)
+class MonthRollupAdmin(CheckupRollupAdmin):
+    list_display = ["month", *CheckupRollupAdmin.stat_fields]
+    ordering = ["-month"]
+
+
+@admin.register(CohortStats)
+class CohortStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        "month",
+        "house_type",
+        "size_bucket",
+        "count",
+        "monthly_estimate_mean",
+        "monthly_estimate_p10",
+        "monthly_estimate_p50",
+        "monthly_estimate_p90",
+        "computed_at",
+    ]
+    list_filter = ["house_type", "size_bucket"]
+    exclude = ["digests"]
+    ordering = ["-month", "house_type", "size_bucket"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RankEntry)
+class RankEntryAdmin(admin.ModelAdmin):
+    list_display = ["user", "month", "house_type", "size_bucket", "score"]
+    list_filter = ["house_type", "size_bucket"]
+    search_fields = ["user__username"]
+    ordering = ["-month", "house_type", "size_bucket", "score"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,189 @@
+"""Population statistics of weekly checkups per household cohort and month.
+
+A cohort is a house type and a household size bucket. ``compute_month``
+aggregates a month's checkups into one ``CohortStats`` row per cohort, with
+mean, p10, p50 and p90 of each statistic and the t-digests they came from,
+so cohorts can be combined later without rescanning checkups. It is run
+periodically by ``manage.py compute_cohort_stats``; views only read the
+stored rows, through the cache.
+"""
+
+import itertools
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.pages.models import WeeklyCheckupResult
+
+from .models import CheckupRollup, CohortStats
+from .tdigest import TDigest
+
+STAT_FIELDS = CheckupRollup.STAT_FIELDS
+QUANTILES = {"p10": 0.1, "p50": 0.5, "p90": 0.9}
+CACHE_TIMEOUT = 60 * 60
+
+
+def size_bucket(household_size):
+    if household_size <= 1:
+        return "1"
+    if household_size == 2:
+        return "2"
+    if household_size <= 4:
+        return "3-4"
+    return "5+"
+
+
+def cohort_of(profile):
+    return profile.house_type, size_bucket(profile.household_size)
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _month_bounds(month):
+    return tuple(
+        timezone.make_aware(datetime.combine(day, time.min))
+        for day in (month, next_month(month))
+    )
+
+
+def cohort_digests(month, chunk_size=10000):
+    """``{cohort: {field: TDigest}}`` of the checkups submitted in ``month``.
+
+    Checkups are read in chunks and each chunk's digests merged into the
+    running ones, so memory stays bounded however many checkups there are.
+    """
+    start, end = _month_bounds(month)
+    rows = (
+        WeeklyCheckupResult.objects.filter(
+            date_submitted__gte=start,
+            date_submitted__lt=end,
+            user__userprofile__isnull=False,
+        )
+        .values_list(
+            "user__userprofile__house_type",
+            "user__userprofile__household_size",
+            *STAT_FIELDS,
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    digests = {}
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        values = {}
+        for house_type, household_size, *stats in chunk:
+            cohort = (house_type, size_bucket(household_size))
+            values.setdefault(cohort, []).append(stats)
+        for cohort, stats in values.items():
+            columns = dict(zip(STAT_FIELDS, zip(*stats)))
+            merged = digests.setdefault(cohort, {})
+            for field in STAT_FIELDS:
+                digest = TDigest.from_values(columns[field])
+                merged[field] = (
+                    merged[field].merge(digest) if field in merged else digest
+                )
+    return digests
+
+
+def stats_from_digests(digests):
+    """``CohortStats`` field values from one cohort's digests."""
+    values = {"count": int(digests[STAT_FIELDS[0]].count)}
+    for field in STAT_FIELDS:
+        digest = digests[field]
+        values[f"{field}_mean"] = digest.mean()
+        for name, q in QUANTILES.items():
+            values[f"{field}_{name}"] = digest.quantile(q)
+    return values
+
+
+def compute_month(month, chunk_size=10000):
+    """Store the cohort statistics of ``month``; returns the number of cohorts."""
+    computed_at = timezone.now()
+    rows = [
+        CohortStats(
+            month=month,
+            house_type=house_type,
+            size_bucket=bucket,
+            digests={field: digest.to_dict() for field, digest in digests.items()},
+            computed_at=computed_at,
+            **stats_from_digests(digests),
+        )
+        for (house_type, bucket), digests in cohort_digests(month, chunk_size).items()
+    ]
+    with transaction.atomic():
+        if rows:
+            CohortStats.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["month", "house_type", "size_bucket"],
+                update_fields=[
+                    field.name
+                    for field in CohortStats._meta.concrete_fields
+                    if field.name not in ("id", "month", "house_type", "size_bucket")
+                ],
+            )
+        # Cohorts that no longer have checkups in the month
+        CohortStats.objects.filter(month=month, computed_at__lt=computed_at).delete()
+    cache.delete(_cache_key(month))
+    return len(rows)
+
+
+def _cache_key(month):
+    return f"cohort-stats:{month.isoformat()}"
+
+
+def _load(months):
+    stats = {month: {} for month in months}
+    for row in CohortStats.objects.filter(month__in=months).defer("digests"):
+        stats[row.month][(row.house_type, row.size_bucket)] = row
+    return stats
+
+
+def month_stats(months):
+    """``{month: {cohort: CohortStats}}`` for ``months``, read through the cache."""
+    keys = {_cache_key(month): month for month in months}
+    cached = cache.get_many(keys)
+    stats = {keys[key]: value for key, value in cached.items()}
+    missing = [month for month in months if month not in stats]
+    if missing:
+        loaded = _load(missing)
+        cache.set_many(
+            {_cache_key(month): value for month, value in loaded.items()},
+            CACHE_TIMEOUT,
+        )
+        stats.update(loaded)
+    return stats
+
+
+def cohort_stats(profile, months):
+    """The profile's cohort's ``CohortStats`` for each of ``months``, or None."""
+    cohort = cohort_of(profile)
+    stats = month_stats(months)
+    return [stats[month].get(cohort) for month in months]
+
+
+def combined_stats(month, house_type=None, bucket=None):
+    """Statistics of several cohorts of ``month`` combined, from their digests.
+
+    Leaving ``house_type`` or ``bucket`` out combines across it. Returns None
+    when no cohort matches.
+    """
+    rows = CohortStats.objects.filter(month=month)
+    if house_type is not None:
+        rows = rows.filter(house_type=house_type)
+    if bucket is not None:
+        rows = rows.filter(size_bucket=bucket)
+    digests = [
+        {field: TDigest.from_dict(data) for field, data in row.digests.items()}
+        for row in rows.only("digests")
+    ]
+    if not digests:
+        return None
+    return stats_from_digests(
+        {
+            field: digests[0][field].merge(*(d[field] for d in digests[1:]))
+            for field in STAT_FIELDS
+        }
+    )
@@ -0,0 +1,110 @@
+"""Goal progress updates.
+
+``CarbonGoal.current_amount`` follows the user's latest monthly estimate.
+It is only written here, on the events that change it: a checkup being
+submitted, a goal being edited and a new month starting, and in bulk after
+checkups are re-scored, imported or generated. Pages that show goals only
+read them.
+"""
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from apps.charts.models import CarbonGoal
+from apps.pages.models import WeeklyCheckupResult
+
+
+def current_month():
+    """First day of the current month, as stored on ``CarbonGoal.month``."""
+    return timezone.localdate().replace(day=1)
+
+
+def goal_for_month(user, month=None):
+    """The user's goal for ``month`` (default: this month), or None."""
+    return CarbonGoal.objects.filter(user=user, month=month or current_month()).first()
+
+
+def update_goal_progress(user, month=None):
+    """Bring the user's goal for ``month`` up to date with their latest checkup.
+
+    If the month has no goal yet (the month rolled over), the most recent
+    earlier goal's target is carried forward. Returns the goal, or None if
+    the user has never set one.
+    """
+    month = month or current_month()
+    goal = goal_for_month(user, month)
+    if goal is None:
+        previous = (
+            CarbonGoal.objects.filter(user=user, month__lt=month)
+            .order_by("-month", "id")
+            .first()
+        )
+        if previous is None:
+            return None
+        # A concurrent submission may start the month's goal first
+        goal, _ = CarbonGoal.objects.get_or_create(
+            user=user, month=month, defaults={"target_amount": previous.target_amount}
+        )
+
+    latest_checkup = (
+        WeeklyCheckupResult.objects.filter(user=user)
+        .order_by("-date_submitted", "-id")
+        .only("monthly_estimate")
+        .first()
+    )
+    if latest_checkup is not None:
+        goal.current_amount = latest_checkup.monthly_estimate
+    goal.save()
+    return goal
+
+
+def bulk_update_goal_progress(user_ids, month=None):
+    """``update_goal_progress`` for many users, in a fixed number of queries.
+
+    Returns the number of goals written.
+    """
+    month = month or current_month()
+    goals = {
+        goal.user_id: goal
+        for goal in CarbonGoal.objects.filter(user_id__in=user_ids, month=month)
+    }
+    # Users without a goal this month carry their latest earlier target forward
+    for goal in CarbonGoal.objects.filter(
+        user_id__in=set(user_ids) - set(goals), month__lt=month
+    ).order_by("user_id", "-month", "id"):
+        goals.setdefault(
+            goal.user_id,
+            CarbonGoal(
+                user_id=goal.user_id, month=month, target_amount=goal.target_amount
+            ),
+        )
+
+    latest = (
+        WeeklyCheckupResult.objects.filter(user_id__in=list(goals))
+        .annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=[F("user_id")],
+                order_by=[F("date_submitted").desc(), F("id").desc()],
+            )
+        )
+        .filter(recency=1)
+        .values_list("user_id", "monthly_estimate")
+    )
+    for user_id, monthly_estimate in latest:
+        goals[user_id].current_amount = monthly_estimate
+
+    CarbonGoal.objects.bulk_update(
+        [goal for goal in goals.values() if goal.pk],
+        ["current_amount"],
+        batch_size=500,
+    )
+    # A concurrent submission may start the month's goal first
+    CarbonGoal.objects.bulk_create(
+        [goal for goal in goals.values() if not goal.pk],
+        update_conflicts=True,
+        unique_fields=["user", "month"],
+        update_fields=["current_amount"],
+    )
+    return len(goals)
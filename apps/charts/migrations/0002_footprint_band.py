@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-18 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('charts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FootprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('initial', 'Initial survey (kg CO2 per month)'), ('weekly', 'Weekly checkup (kg CO2 per week)')], max_length=7)),
+                ('p5', models.FloatField()),
+                ('p50', models.FloatField()),
+                ('p95', models.FloatField()),
+                ('samples', models.PositiveIntegerField()),
+                ('factors_region', models.CharField(default='default', max_length=32)),
+                ('factors_version', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='footprintband',
+            constraint=models.UniqueConstraint(fields=('user', 'source'), name='unique_footprint_band'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.25 on 2026-10-18 04:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('charts', '0002_footprint_band'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('weekly_total_sum', models.FloatField()),
+                ('weekly_total_min', models.FloatField()),
+                ('weekly_total_max', models.FloatField()),
+                ('monthly_estimate_sum', models.FloatField()),
+                ('monthly_estimate_min', models.FloatField()),
+                ('monthly_estimate_max', models.FloatField()),
+                ('month', models.DateField(unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserWeekRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('weekly_total_sum', models.FloatField()),
+                ('weekly_total_min', models.FloatField()),
+                ('weekly_total_max', models.FloatField()),
+                ('monthly_estimate_sum', models.FloatField()),
+                ('monthly_estimate_min', models.FloatField()),
+                ('monthly_estimate_max', models.FloatField()),
+                ('week', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserMonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('weekly_total_sum', models.FloatField()),
+                ('weekly_total_min', models.FloatField()),
+                ('weekly_total_max', models.FloatField()),
+                ('monthly_estimate_sum', models.FloatField()),
+                ('monthly_estimate_min', models.FloatField()),
+                ('monthly_estimate_max', models.FloatField()),
+                ('month', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='userweekrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'week'), name='unique_user_week'),
+        ),
+        migrations.AddConstraint(
+            model_name='usermonthrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_user_month'),
+        ),
+    ]
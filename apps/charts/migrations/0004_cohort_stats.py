@@ -0,0 +1,38 @@
+# Generated by Django 4.2.25 on 2026-10-18 04:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0003_checkup_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('house_type', models.CharField(max_length=10)),
+                ('size_bucket', models.CharField(choices=[('1', '1 person'), ('2', '2 people'), ('3-4', '3-4 people'), ('5+', '5 or more people')], max_length=3)),
+                ('count', models.PositiveIntegerField()),
+                ('weekly_total_mean', models.FloatField()),
+                ('weekly_total_p10', models.FloatField()),
+                ('weekly_total_p50', models.FloatField()),
+                ('weekly_total_p90', models.FloatField()),
+                ('monthly_estimate_mean', models.FloatField()),
+                ('monthly_estimate_p10', models.FloatField()),
+                ('monthly_estimate_p50', models.FloatField()),
+                ('monthly_estimate_p90', models.FloatField()),
+                ('digests', models.JSONField(help_text='t-digest of each statistic, for merging cohorts')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='cohortstats',
+            constraint=models.UniqueConstraint(fields=('month', 'house_type', 'size_bucket'), name='unique_cohort_stats'),
+        ),
+    ]
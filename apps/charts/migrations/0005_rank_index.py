@@ -0,0 +1,51 @@
+# Generated by Django 4.2.25 on 2026-10-18 04:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('charts', '0004_cohort_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('house_type', models.CharField(max_length=10)),
+                ('size_bucket', models.CharField(max_length=3)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('house_type', models.CharField(max_length=10)),
+                ('size_bucket', models.CharField(max_length=3)),
+                ('score', models.FloatField()),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rankbucket',
+            constraint=models.UniqueConstraint(fields=('month', 'house_type', 'size_bucket', 'bucket'), name='unique_rank_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='rankentry',
+            index=models.Index(fields=['month', 'house_type', 'size_bucket', 'score'], name='rank_entry_cohort_score'),
+        ),
+        migrations.AddConstraint(
+            model_name='rankentry',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_rank_entry'),
+        ),
+    ]
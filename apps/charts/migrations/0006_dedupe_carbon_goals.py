@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-18 05:06
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def dedupe_carbon_goals(apps, schema_editor):
+    # Keep the oldest goal of each user and month, the one the app has been
+    # reading and updating, and drop the duplicates created alongside it
+    CarbonGoal = apps.get_model("charts", "CarbonGoal")
+    duplicates = (
+        CarbonGoal.objects.filter(user__isnull=False)
+        .values("user", "month")
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        CarbonGoal.objects.filter(user=row["user"], month=row["month"]).exclude(
+            id=row["keep"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0005_rank_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_carbon_goals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0006_dedupe_carbon_goals'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='carbongoal',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_carbon_goal'),
+        ),
+    ]
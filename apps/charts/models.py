@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import datetime
 
 # Create your models here.
@@ -29,6 +30,23 @@ class CarbonUsage(models.Model):
         ordering = ["-date"]
 
 
+class CarbonGoalQuerySet(models.QuerySet):
+    def with_baseline(self):
+        """Annotate each goal with its user's baseline ``monthly_total``.
+
+        ``progress_percentage`` uses the annotation instead of querying the
+        baseline survey once per goal.
+        """
+        from apps.pages.models import InitialSurveyResult
+
+        latest = (
+            InitialSurveyResult.objects.filter(user=models.OuterRef("user"))
+            .order_by("-date_submitted", "-id")
+            .values("monthly_total")[:1]
+        )
+        return self.annotate(baseline_total=models.Subquery(latest))
+
+
 class CarbonGoal(models.Model):
     """Model to track user carbon reduction goals"""
 
@@ -42,18 +60,29 @@ class CarbonGoal(models.Model):
     month = models.DateField()
     achieved = models.BooleanField(default=False)
 
+    objects = CarbonGoalQuerySet.as_manager()
+
     def __str__(self):
         return f"Goal for {self.month.strftime('%B %Y')}: {self.target_amount}kg CO2"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="unique_carbon_goal")
+        ]
+
     @property
     def progress_percentage(self):
-        # Get the user's initial survey for baseline
-        from apps.pages.models import InitialSurveyResult
+        # The user's initial survey is the baseline; see with_baseline()
+        if hasattr(self, "baseline_total"):
+            baseline = self.baseline_total
+        else:
+            from apps.pages.user_context import latest_baseline
 
-        baseline_survey = InitialSurveyResult.objects.filter(user=self.user).first()
+            survey = latest_baseline(self.user_id) if self.user_id else None
+            baseline = survey.monthly_total if survey else None
 
-        if baseline_survey and self.target_amount > 0 and self.current_amount >= 0:
-            baseline = float(baseline_survey.monthly_total)
+        if baseline is not None and self.target_amount > 0 and self.current_amount >= 0:
+            baseline = float(baseline)
 
             # Validate the goal
             if self.target_amount >= baseline:
@@ -73,3 +102,190 @@ class CarbonGoal(models.Model):
                 progress = min(100, (reduction_achieved / total_reduction_needed) * 100)
                 return max(0, progress)
         return 0
+
+
+class FootprintBand(models.Model):
+    """Monte Carlo uncertainty band for a user's latest footprint estimate"""
+
+    SOURCE_CHOICES = [
+        ("initial", "Initial survey (kg CO2 per month)"),
+        ("weekly", "Weekly checkup (kg CO2 per week)"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    source = models.CharField(max_length=7, choices=SOURCE_CHOICES)
+    p5 = models.FloatField()
+    p50 = models.FloatField()
+    p95 = models.FloatField()
+    samples = models.PositiveIntegerField()
+    factors_region = models.CharField(max_length=32, default="default")
+    factors_version = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user} {self.source}: {self.p5:.1f}-{self.p95:.1f}kg CO2"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "source"], name="unique_footprint_band"
+            )
+        ]
+
+
+class CheckupRollup(models.Model):
+    """Count, sum, min and max of weekly checkup results over one period"""
+
+    STAT_FIELDS = ["weekly_total", "monthly_estimate"]
+
+    count = models.PositiveIntegerField()
+    weekly_total_sum = models.FloatField()
+    weekly_total_min = models.FloatField()
+    weekly_total_max = models.FloatField()
+    monthly_estimate_sum = models.FloatField()
+    monthly_estimate_min = models.FloatField()
+    monthly_estimate_max = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def weekly_total_mean(self):
+        return self.weekly_total_sum / self.count
+
+    @property
+    def monthly_estimate_mean(self):
+        return self.monthly_estimate_sum / self.count
+
+
+class UserWeekRollup(CheckupRollup):
+    """A user's checkups in the week starting on ``week`` (a Monday)"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    week = models.DateField()
+
+    def __str__(self):
+        return f"{self.user} week of {self.week}: {self.count} checkups"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "week"], name="unique_user_week")
+        ]
+
+
+class UserMonthRollup(CheckupRollup):
+    """A user's checkups in the month starting on ``month``"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+
+    def __str__(self):
+        return f"{self.user} {self.month.strftime('%B %Y')}: {self.count} checkups"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="unique_user_month")
+        ]
+
+
+class MonthRollup(CheckupRollup):
+    """All users' checkups in the month starting on ``month``"""
+
+    month = models.DateField(unique=True)
+
+    def __str__(self):
+        return f"{self.month.strftime('%B %Y')}: {self.count} checkups"
+
+
+class CohortStats(models.Model):
+    """Distribution of checkup results for one household cohort in one month"""
+
+    SIZE_BUCKET_CHOICES = [
+        ("1", "1 person"),
+        ("2", "2 people"),
+        ("3-4", "3-4 people"),
+        ("5+", "5 or more people"),
+    ]
+
+    month = models.DateField()
+    house_type = models.CharField(max_length=10)
+    size_bucket = models.CharField(max_length=3, choices=SIZE_BUCKET_CHOICES)
+    count = models.PositiveIntegerField()
+    weekly_total_mean = models.FloatField()
+    weekly_total_p10 = models.FloatField()
+    weekly_total_p50 = models.FloatField()
+    weekly_total_p90 = models.FloatField()
+    monthly_estimate_mean = models.FloatField()
+    monthly_estimate_p10 = models.FloatField()
+    monthly_estimate_p50 = models.FloatField()
+    monthly_estimate_p90 = models.FloatField()
+    digests = models.JSONField(
+        help_text="t-digest of each statistic, for merging cohorts"
+    )
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return (
+            f"{self.month.strftime('%B %Y')} {self.house_type} "
+            f"{self.size_bucket}: {self.count} checkups"
+        )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "house_type", "size_bucket"],
+                name="unique_cohort_stats",
+            )
+        ]
+
+
+class RankEntry(models.Model):
+    """A user's score in their cohort's ranking for one month.
+
+    The score is the user's mean weekly total for the month; lower is better.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    house_type = models.CharField(max_length=10)
+    size_bucket = models.CharField(max_length=3)
+    score = models.FloatField()
+    bucket = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.user} {self.month.strftime('%B %Y')}: {self.score:.1f}kg CO2"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="unique_rank_entry")
+        ]
+        indexes = [
+            models.Index(
+                fields=["month", "house_type", "size_bucket", "score"],
+                name="rank_entry_cohort_score",
+            )
+        ]
+
+
+class RankBucket(models.Model):
+    """Number of a cohort's rank entries in one score bucket for one month"""
+
+    month = models.DateField()
+    house_type = models.CharField(max_length=10)
+    size_bucket = models.CharField(max_length=3)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return (
+            f"{self.month.strftime('%B %Y')} {self.house_type} {self.size_bucket} "
+            f"bucket {self.bucket}: {self.count}"
+        )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "house_type", "size_bucket", "bucket"],
+                name="unique_rank_bucket",
+            )
+        ]
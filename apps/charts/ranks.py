@@ -0,0 +1,210 @@
+"""Percentile ranks of users within their household cohort, per month.
+
+Each user has one ``RankEntry`` per month holding their score, the mean of
+their weekly totals that month (lower is better). ``RankBucket`` counts a
+cohort's entries per log-spaced score bucket. A user's rank is the sum of
+the counts of the buckets below theirs plus an index range count inside
+their own bucket, so it costs the same for ten users as for millions.
+
+Scores are recorded on each checkup submission, inside its transaction;
+``manage.py rebuild_ranks`` rebuilds a month from the monthly rollups. Users
+deleted through the ORM or the admin have their entries taken out of the
+bucket counts by a ``pre_delete`` receiver (``apps/charts/signals.py``).
+"""
+
+import itertools
+import math
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .cohorts import size_bucket
+from .models import RankBucket, RankEntry, UserMonthRollup
+
+BUCKET_RATIO = 1.01
+# Buckets cover scores up to BUCKET_RATIO ** BUCKETS - 1 (about 21 tonnes)
+BUCKETS = 1000
+LEADERBOARD_SIZE = 10
+
+
+def score_bucket(score):
+    return min(int(math.log1p(max(score, 0.0)) / math.log(BUCKET_RATIO)), BUCKETS - 1)
+
+
+def _bucket_floor(bucket):
+    # Slightly below the bucket's lower bound, to be safe from rounding
+    return BUCKET_RATIO**bucket - 1 - 1e-6
+
+
+def _count(cohort, bucket, delta):
+    counts = RankBucket.objects.filter(**cohort, bucket=bucket)
+    if counts.update(count=F("count") + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            RankBucket.objects.create(**cohort, bucket=bucket, count=delta)
+    except IntegrityError:
+        counts.update(count=F("count") + delta)
+
+
+def record_score(user_id, month, house_type, household_size, score):
+    """Set a user's score for ``month``; call inside a transaction."""
+    cohort = {
+        "month": month,
+        "house_type": house_type,
+        "size_bucket": size_bucket(household_size),
+    }
+    bucket = score_bucket(score)
+    entry = (
+        RankEntry.objects.select_for_update()
+        .filter(user_id=user_id, month=month)
+        .first()
+    )
+    if entry is None:
+        RankEntry.objects.create(user_id=user_id, **cohort, score=score, bucket=bucket)
+    else:
+        _count(
+            {
+                "month": month,
+                "house_type": entry.house_type,
+                "size_bucket": entry.size_bucket,
+            },
+            entry.bucket,
+            -1,
+        )
+        RankEntry.objects.filter(id=entry.id).update(
+            **cohort, score=score, bucket=bucket
+        )
+    _count(cohort, bucket, 1)
+
+
+def remove_entries(entries):
+    """Take a ``RankEntry`` queryset out of its buckets' counts.
+
+    Call inside the transaction that deletes the entries.
+    """
+    counts = entries.values("month", "house_type", "size_bucket", "bucket").annotate(
+        entries=Count("id")
+    )
+    for row in counts:
+        RankBucket.objects.filter(
+            month=row["month"],
+            house_type=row["house_type"],
+            size_bucket=row["size_bucket"],
+            bucket=row["bucket"],
+        ).update(count=F("count") - row["entries"])
+
+
+def update_rank(checkup, profile):
+    """Record the score of a newly saved checkup's month, from its rollup."""
+    month = timezone.localdate(checkup.date_submitted).replace(day=1)
+    rollup = UserMonthRollup.objects.get(user_id=checkup.user_id, month=month)
+    record_score(
+        checkup.user_id,
+        month,
+        profile.house_type,
+        profile.household_size,
+        rollup.weekly_total_mean,
+    )
+
+
+def rank_of(user, month=None):
+    """The user's rank in their cohort for ``month`` (default: this month).
+
+    Returns None if the user has no score for the month.
+    """
+    month = month or timezone.localdate().replace(day=1)
+    entry = RankEntry.objects.filter(user=user, month=month).first()
+    if entry is None:
+        return None
+    cohort = {
+        "month": month,
+        "house_type": entry.house_type,
+        "size_bucket": entry.size_bucket,
+    }
+    counts = RankBucket.objects.filter(**cohort).aggregate(
+        total=Sum("count"), below=Sum("count", filter=Q(bucket__lt=entry.bucket))
+    )
+    same_bucket = RankEntry.objects.filter(
+        **cohort,
+        score__gte=_bucket_floor(entry.bucket),
+        score__lt=entry.score,
+        bucket=entry.bucket,
+    ).count()
+    better = (counts["below"] or 0) + same_bucket
+    total = counts["total"]
+    return {
+        "house_type": entry.house_type,
+        "size_bucket": entry.size_bucket,
+        "score": entry.score,
+        "rank": better + 1,
+        "total": total,
+        # Share of the cohort that did at least as badly as the user
+        "percentile": 100 * (total - better) / total,
+        # "In the best N%" of the cohort
+        "best_pct": math.ceil(100 * (better + 1) / total),
+    }
+
+
+def leaderboard(month, house_type, size_bucket, count=LEADERBOARD_SIZE):
+    """The cohort's ``count`` lowest-scoring entries for ``month``."""
+    return list(
+        RankEntry.objects.filter(
+            month=month, house_type=house_type, size_bucket=size_bucket
+        )
+        .select_related("user")
+        .order_by("score", "id")[:count]
+    )
+
+
+def rebuild_month(month, chunk_size=10000):
+    """Rebuild ``month``'s ranks from the monthly rollups; returns the entries."""
+    rollups = (
+        UserMonthRollup.objects.filter(month=month, user__userprofile__isnull=False)
+        .values_list(
+            "user_id",
+            "weekly_total_sum",
+            "count",
+            "user__userprofile__house_type",
+            "user__userprofile__household_size",
+        )
+        .order_by("user_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    buckets = Counter()
+    entries = 0
+    with transaction.atomic():
+        RankEntry.objects.filter(month=month).delete()
+        RankBucket.objects.filter(month=month).delete()
+        while chunk := list(itertools.islice(rollups, chunk_size)):
+            rows = []
+            for user_id, total, count, house_type, household_size in chunk:
+                score = total / count
+                row = RankEntry(
+                    user_id=user_id,
+                    month=month,
+                    house_type=house_type,
+                    size_bucket=size_bucket(household_size),
+                    score=score,
+                    bucket=score_bucket(score),
+                )
+                buckets[row.house_type, row.size_bucket, row.bucket] += 1
+                rows.append(row)
+            RankEntry.objects.bulk_create(rows)
+            entries += len(rows)
+        RankBucket.objects.bulk_create(
+            [
+                RankBucket(
+                    month=month,
+                    house_type=house_type,
+                    size_bucket=bucket_size,
+                    bucket=bucket,
+                    count=count,
+                )
+                for (house_type, bucket_size, bucket), count in buckets.items()
+            ],
+            batch_size=1000,
+        )
+    return entries
@@ -0,0 +1,191 @@
+"""Weekly and monthly rollups of weekly checkup results.
+
+Each checkup is added to its user's week and month and to the global month
+by ``add_checkup``, inside the transaction that saves it, so trend views read
+a handful of rollup rows instead of scanning a user's history. Bulk changes
+to checkups (re-scoring, deletions) are brought in line with a full rebuild
+by ``manage.py rebuild_rollups``, which can also verify the stored rows, and
+bulk imports rebuild just the users and months they touched.
+"""
+
+import math
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from apps.pages.bulk import insert_rows
+from apps.pages.models import WeeklyCheckupResult
+
+from .models import CheckupRollup, MonthRollup, UserMonthRollup, UserWeekRollup
+
+STAT_FIELDS = CheckupRollup.STAT_FIELDS
+STAT_COLUMNS = [
+    "count",
+    *(f"{field}_{stat}" for field in STAT_FIELDS for stat in ["sum", "min", "max"]),
+]
+
+# Rollup model, the fields it is grouped by and the truncation of its period
+ROLLUPS = [
+    (UserWeekRollup, ["user_id", "week"], TruncWeek),
+    (UserMonthRollup, ["user_id", "month"], TruncMonth),
+    (MonthRollup, ["month"], TruncMonth),
+]
+USER_ROLLUPS = ROLLUPS[:2]
+GLOBAL_ROLLUPS = ROLLUPS[2:]
+
+
+def week_start(day):
+    """The Monday starting ``day``'s week."""
+    return day - timedelta(days=day.weekday())
+
+
+def _keys(checkup):
+    day = timezone.localdate(checkup.date_submitted)
+    return {
+        "user_id": checkup.user_id,
+        "week": week_start(day),
+        "month": day.replace(day=1),
+    }
+
+
+def _add(model, keys, values):
+    updates = {"count": F("count") + 1}
+    for field, value in values.items():
+        updates[f"{field}_sum"] = F(f"{field}_sum") + value
+        updates[f"{field}_min"] = Least(F(f"{field}_min"), Value(value))
+        updates[f"{field}_max"] = Greatest(F(f"{field}_max"), Value(value))
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        # The savepoint keeps the caller's transaction usable if a concurrent
+        # submission created the row first
+        with transaction.atomic():
+            model.objects.create(
+                **keys,
+                count=1,
+                **{
+                    f"{field}_{stat}": value
+                    for field, value in values.items()
+                    for stat in ["sum", "min", "max"]
+                },
+            )
+    except IntegrityError:
+        model.objects.filter(**keys).update(**updates)
+
+
+def add_checkup(checkup):
+    """Add a newly saved checkup to its rollups; call in the same transaction."""
+    keys = _keys(checkup)
+    values = {field: getattr(checkup, field) for field in STAT_FIELDS}
+    for model, group, _ in ROLLUPS:
+        _add(model, {field: keys[field] for field in group}, values)
+
+
+def fresh_rollups(checkups, group, trunc):
+    """``{key: stats}`` aggregated from ``checkups``, keyed by ``group`` values."""
+    period = group[-1]
+    stats = {"count": Count("id")}
+    for field in STAT_FIELDS:
+        stats[f"{field}_sum"] = Sum(field)
+        stats[f"{field}_min"] = Min(field)
+        stats[f"{field}_max"] = Max(field)
+    rows = (
+        checkups.annotate(**{period: trunc("date_submitted", output_field=DateField())})
+        .values(*group)
+        .annotate(**stats)
+        .order_by()
+    )
+    return {tuple(row.pop(field) for field in group): row for row in rows}
+
+
+def _same(fresh, stored):
+    return all(
+        math.isclose(fresh[column], stored[column], rel_tol=1e-9, abs_tol=1e-9)
+        for column in STAT_COLUMNS
+    )
+
+
+def sync_rollups(model, group, fresh, stored_rows, check=False):
+    """Bring stored rollup rows in line with ``fresh`` ones.
+
+    ``stored_rows`` is the queryset of stored rows covering the same checkups.
+    Returns the number of missing, stale and orphaned rows; with ``check``,
+    nothing is written.
+    """
+    stored = {
+        tuple(row.pop(field) for field in group): row
+        for row in stored_rows.values("id", *group, *STAT_COLUMNS)
+    }
+    missing = [
+        (*key, *(stats[column] for column in STAT_COLUMNS))
+        for key, stats in fresh.items()
+        if key not in stored
+    ]
+    stale = [
+        model(**dict(zip(group, key)), **stats)
+        for key, stats in fresh.items()
+        if key in stored and not _same(stats, stored[key])
+    ]
+    orphaned = [row["id"] for key, row in stored.items() if key not in fresh]
+
+    if not check and (missing or stale or orphaned):
+        unique_fields = [field.removesuffix("_id") for field in group]
+        with transaction.atomic():
+            model.objects.filter(id__in=orphaned).delete()
+            if missing:
+                # Often every row after an import, so they skip the ORM
+                insert_rows(model, [*group, *STAT_COLUMNS], missing)
+            if stale:
+                model.objects.bulk_create(
+                    stale,
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=STAT_COLUMNS,
+                )
+    return len(missing), len(stale), len(orphaned)
+
+
+def _add_counts(counts, synced):
+    return [total + n for total, n in zip(counts, synced)]
+
+
+def rebuild_user_rollups(user_ids, check=False):
+    """Sync the week and month rollups of ``user_ids`` with their checkups.
+
+    Returns the number of missing, stale and orphaned rows, like
+    ``sync_rollups``.
+    """
+    checkups = WeeklyCheckupResult.objects.filter(user_id__in=user_ids)
+    counts = [0, 0, 0]
+    for model, group, trunc in USER_ROLLUPS:
+        fresh = fresh_rollups(checkups, group, trunc)
+        stored = model.objects.filter(user_id__in=user_ids)
+        counts = _add_counts(counts, sync_rollups(model, group, fresh, stored, check))
+    return counts
+
+
+def rebuild_global_rollups(first=None, last=None, check=False):
+    """Sync the global month rollups, or only those from month ``first`` to ``last``."""
+    checkups = WeeklyCheckupResult.objects.all()
+    counts = [0, 0, 0]
+    for model, group, trunc in GLOBAL_ROLLUPS:
+        stored = model.objects.all()
+        if first is not None:
+            checkups = checkups.filter(
+                date_submitted__gte=timezone.make_aware(datetime.combine(first, time()))
+            )
+            stored = stored.filter(month__gte=first)
+        if last is not None:
+            following = (last + timedelta(days=31)).replace(day=1)
+            checkups = checkups.filter(
+                date_submitted__lt=timezone.make_aware(
+                    datetime.combine(following, time())
+                )
+            )
+            stored = stored.filter(month__lte=last)
+        fresh = fresh_rollups(checkups, group, trunc)
+        counts = _add_counts(counts, sync_rollups(model, group, fresh, stored, check))
+    return counts
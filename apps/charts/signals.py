@@ -0,0 +1,18 @@
+"""Keep derived chart rows in step with deletes made through the ORM.
+
+``manage.py delete_user`` deletes with raw SQL and rebuilds the affected
+months itself, so these receivers only see deletes from the admin or code.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import RankEntry
+from .ranks import remove_entries
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_ranks(sender, instance, **kwargs):
+    # The entries themselves go with the user's cascade
+    remove_entries(RankEntry.objects.filter(user=instance))
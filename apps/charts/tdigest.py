@@ -0,0 +1,105 @@
+"""A small merging t-digest for approximate quantiles.
+
+A digest summarises a distribution as a few hundred weighted centroids,
+kept small in the tails and larger around the median, so quantiles are
+accurate where they are read (p10, p90) and digests of disjoint groups can
+be merged without going back to the raw values. See Dunning & Ertl,
+"Computing Extremely Accurate Quantiles Using t-Digests".
+"""
+
+import math
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 100
+
+
+class TDigest:
+    def __init__(self, means=(), weights=(), minimum=None, maximum=None):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def from_values(cls, values, compression=DEFAULT_COMPRESSION):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return cls()
+        return cls(
+            values, np.ones(len(values)), float(values.min()), float(values.max())
+        ).compress(compression)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["means"], data["weights"], data["min"], data["max"])
+
+    def to_dict(self):
+        return {
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def mean(self):
+        if not self.count:
+            return None
+        return float(np.dot(self.means, self.weights) / self.count)
+
+    def merge(self, *others, compression=DEFAULT_COMPRESSION):
+        """A new digest of this digest's values and ``others``'."""
+        digests = [d for d in (self, *others) if len(d.weights)]
+        if not digests:
+            return TDigest()
+        return TDigest(
+            np.concatenate([d.means for d in digests]),
+            np.concatenate([d.weights for d in digests]),
+            min(d.minimum for d in digests),
+            max(d.maximum for d in digests),
+        ).compress(compression)
+
+    def compress(self, compression=DEFAULT_COMPRESSION):
+        """Merge neighbouring centroids while they fit the k1 scale function."""
+        order = np.argsort(self.means, kind="stable")
+        means, weights = self.means[order], self.weights[order]
+        total = weights.sum()
+        scale = compression / (2 * math.pi)
+
+        def k(q):
+            return scale * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+        new_means, new_weights = [], []
+        mean, weight = means[0], weights[0]
+        done = 0.0
+        k_left = k(0.0)
+        for m, w in zip(means[1:].tolist(), weights[1:].tolist()):
+            if k((done + weight + w) / total) - k_left <= 1:
+                mean += (m - mean) * w / (weight + w)
+                weight += w
+            else:
+                new_means.append(mean)
+                new_weights.append(weight)
+                done += weight
+                k_left = k(done / total)
+                mean, weight = m, w
+        new_means.append(mean)
+        new_weights.append(weight)
+        return TDigest(new_means, new_weights, self.minimum, self.maximum)
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile (0-1), interpolating between centroids."""
+        if not len(self.weights):
+            return None
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(
+            np.interp(
+                q * self.count,
+                [0.0, *centers, self.count],
+                [self.minimum, *self.means, self.maximum],
+            )
+        )
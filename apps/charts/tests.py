@@ -1 +1,450 @@
-# Create your tests here.
+import io
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.charts.cohorts import combined_stats, size_bucket
+from apps.charts.goals import bulk_update_goal_progress
+from apps.charts.models import (
+    CarbonGoal,
+    CohortStats,
+    FootprintBand,
+    MonthRollup,
+    RankBucket,
+    RankEntry,
+    UserWeekRollup,
+)
+from apps.charts.ranks import leaderboard, rank_of, record_score
+from apps.charts.rollups import add_checkup, week_start
+from apps.charts.tdigest import TDigest
+from apps.charts.views import get_monthly_trend
+from apps.pages.carbon_calculator import CarbonCalculator
+from apps.pages.emission_factors import BUILTIN_FACTORS
+from apps.pages.models import InitialSurveyResult, UserProfile, WeeklyCheckupResult
+
+INITIAL_ANSWERS = {
+    "primary_heating": "ELEC",
+    "appliance_use": "DAILY",
+    "lighting_type": "LED",
+    "air_conditioning": "NO",
+    "car_type": "PETROL",
+    "device_time": "2-4",
+    "renewable_pct": 25,
+    "flights_per_year": "NONE",
+    "public_transport": "WEEKLY",
+    "compost_waste": "YES",
+    "clothes_drying": "LINE",
+    "buy_secondhand": "SOME",
+}
+WEEKLY_ANSWERS = {
+    "heating_usage": "MOST",
+    "appliance_usage": "HEAVY",
+    "daily_transport": "CAR",
+    "weekly_travel": "LONG",
+    "vehicle_type": "HYBRID",
+    "energy_source": "GREEN_OPT",
+    "water_usage": "MINIMAL",
+    "waste_generation": "MEDIUM",
+    "weekly_consumption": "MODERATE",
+}
+
+
+class FootprintBandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("bands", password="x")
+        UserProfile.objects.create(
+            user=self.user, house_type="SMALL", onboarding_completed=True
+        )
+        results = CarbonCalculator.calculate_initial_survey(
+            {**INITIAL_ANSWERS, "home_type": "SMALL", "household_size": 1}
+        )
+        InitialSurveyResult.objects.create(user=self.user, **INITIAL_ANSWERS, **results)
+        self.expected = BUILTIN_FACTORS.uncertainty.initial_bands(
+            {**INITIAL_ANSWERS, "home_type": "SMALL"}
+        )
+
+    def test_command_stores_latest_bands(self):
+        for _ in range(2):
+            call_command("compute_footprint_bands", stdout=io.StringIO())
+        band = FootprintBand.objects.get(user=self.user)
+        self.assertEqual(band.source, "initial")
+        self.assertEqual(
+            {"p5": band.p5, "p50": band.p50, "p95": band.p95}, self.expected
+        )
+
+    def test_charts_page_computes_missing_band(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get("/detailed/"), "Likely range")
+        response = self.client.get("/detailed/data/band/")
+        self.assertEqual(response.json()["footprint_band"], self.expected)
+
+    def test_charts_page_reads_stored_weekly_band(self):
+        self.client.force_login(self.user)
+        self.assertIsNone(self.client.get("/detailed/data/band/").json()["weekly_band"])
+        WeeklyCheckupResult.objects.create(
+            user=self.user,
+            **WEEKLY_ANSWERS,
+            **CarbonCalculator.calculate_weekly_checkup(WEEKLY_ANSWERS),
+        )
+        expected = BUILTIN_FACTORS.uncertainty.weekly_bands(WEEKLY_ANSWERS)
+        self.assertEqual(
+            self.client.get("/detailed/data/band/").json()["weekly_band"], expected
+        )
+
+        call_command("compute_footprint_bands", stdout=io.StringIO())
+        FootprintBand.objects.filter(source="weekly").update(p5=1, p50=2, p95=3)
+        # Session, user, profile with baseline, and both stored bands at once
+        with self.assertNumQueries(4):
+            response = self.client.get("/detailed/data/band/")
+        self.assertEqual(response.json()["weekly_band"], {"p5": 1, "p50": 2, "p95": 3})
+
+    def test_chart_data_endpoints_revalidate(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/detailed/data/category/")
+        data = response.json()
+        self.assertEqual(
+            [row["amount"] for row in data["carbon_by_category"]],
+            data["carbon_data"]["values"],
+        )
+        self.assertAlmostEqual(
+            sum(data["carbon_data"]["values"]),
+            InitialSurveyResult.objects.get(user=self.user).monthly_total,
+            delta=0.5,
+        )
+        self.assertEqual(
+            self.client.get(
+                "/detailed/data/category/", HTTP_IF_NONE_MATCH=response["ETag"]
+            ).status_code,
+            304,
+        )
+        self.assertEqual(self.client.get("/detailed/data/trend/").status_code, 200)
+        self.assertEqual(self.client.get("/detailed/data/other/").status_code, 404)
+
+
+class GoalProgressTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("goals", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        self.this_month = timezone.localdate().replace(day=1)
+        last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+        CarbonGoal.objects.create(
+            user=self.user, month=last_month, target_amount=250, current_amount=300
+        )
+        self.checkup = WeeklyCheckupResult.objects.create(
+            user=self.user,
+            **WEEKLY_ANSWERS,
+            **CarbonCalculator.calculate_weekly_checkup(WEEKLY_ANSWERS),
+        )
+
+    def test_month_rollover_carries_target_forward(self):
+        call_command("roll_over_goals", stdout=io.StringIO())
+        goal = CarbonGoal.objects.get(user=self.user, month=self.this_month)
+        self.assertEqual(goal.target_amount, 250)
+        self.assertEqual(goal.current_amount, self.checkup.monthly_estimate)
+
+        call_command("roll_over_goals", stdout=io.StringIO())
+        self.assertEqual(CarbonGoal.objects.filter(month=self.this_month).count(), 1)
+
+    def test_bulk_update_matches_per_user_update(self):
+        other = User.objects.create_user("other", password="x")
+        CarbonGoal.objects.create(
+            user=other, month=self.this_month, target_amount=100, current_amount=999
+        )
+        checkup = WeeklyCheckupResult.objects.create(
+            user=other,
+            **WEEKLY_ANSWERS,
+            **CarbonCalculator.calculate_weekly_checkup(WEEKLY_ANSWERS),
+        )
+        self.assertEqual(bulk_update_goal_progress([self.user.id, other.id]), 2)
+        goal = CarbonGoal.objects.get(user=self.user, month=self.this_month)
+        self.assertEqual(goal.target_amount, 250)
+        self.assertEqual(goal.current_amount, self.checkup.monthly_estimate)
+        self.assertEqual(
+            CarbonGoal.objects.get(user=other).current_amount, checkup.monthly_estimate
+        )
+
+    def test_progress_reads_annotated_baselines_without_a_query_per_goal(self):
+        results = CarbonCalculator.calculate_initial_survey(
+            {**INITIAL_ANSWERS, "home_type": "SMALL", "household_size": 1}
+        )
+        InitialSurveyResult.objects.create(user=self.user, **INITIAL_ANSWERS, **results)
+        for i in range(3):
+            CarbonGoal.objects.create(
+                user=self.user,
+                month=self.this_month.replace(year=self.this_month.year - 1 - i),
+                target_amount=results["monthly_total"] * 0.8,
+                current_amount=results["monthly_total"] * 0.9,
+            )
+        expected = [goal.progress_percentage for goal in CarbonGoal.objects.all()]
+        self.assertIn(50, [round(progress) for progress in expected])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [
+                    goal.progress_percentage
+                    for goal in CarbonGoal.objects.with_baseline()
+                ],
+                expected,
+            )
+
+        # The admin changelist's queries do not grow with the goals shown
+        self.client.force_login(User.objects.create_superuser("admin", password="x"))
+        counts = []
+        for year in (2001, 2002):
+            CarbonGoal.objects.create(
+                user=self.user,
+                month=self.this_month.replace(year=year),
+                target_amount=1,
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/admin/charts/carbongoal/")
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_goal_page_get_does_not_create_goal(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/detailed/manage-goal/").status_code, 200)
+        self.assertFalse(CarbonGoal.objects.filter(month=self.this_month).exists())
+
+        self.client.post("/detailed/manage-goal/", {"target_amount": 200})
+        goal = CarbonGoal.objects.get(month=self.this_month)
+        self.assertEqual(goal.target_amount, 200)
+        self.assertEqual(goal.current_amount, self.checkup.monthly_estimate)
+
+
+class MonthlyTrendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("trend", password="x")
+        self.now = timezone.now()
+
+    def add_checkup(self, days_ago, monthly_estimate, user=None):
+        checkup = WeeklyCheckupResult.objects.create(
+            user=user or self.user,
+            **WEEKLY_ANSWERS,
+            **CarbonCalculator.calculate_weekly_checkup(WEEKLY_ANSWERS),
+        )
+        # date_submitted is set on insert, so backdate it before rolling it up
+        checkup.date_submitted = self.now - timedelta(days=days_ago)
+        checkup.monthly_estimate = monthly_estimate
+        checkup.save()
+        add_checkup(checkup)
+        return checkup
+
+    def test_trend_reads_monthly_rollups(self):
+        other = User.objects.create_user("other", password="x")
+        expected = {}
+        for days_ago in range(0, 400, 3):
+            month = timezone.localdate(self.now - timedelta(days=days_ago))
+            value = float(days_ago % 7)
+            self.add_checkup(days_ago, value)
+            self.add_checkup(days_ago, value + 10, user=other)
+            expected.setdefault(month.replace(day=1), []).append(value)
+        months = sorted(expected)[-6:]
+
+        with self.assertNumQueries(2):
+            trend = get_monthly_trend(self.user)
+        self.assertEqual(trend["months"], [month.strftime("%b") for month in months])
+        self.assertEqual(
+            trend["your_usage"],
+            [round(sum(expected[m]) / len(expected[m]), 1) for m in months],
+        )
+        self.assertEqual(
+            trend["average_usage"],
+            [round(sum(expected[m]) / len(expected[m]) + 5, 1) for m in months],
+        )
+
+    def test_separates_same_month_of_different_years(self):
+        self.add_checkup(1, 100.0)
+        self.add_checkup(366, 500.0)
+        self.assertEqual(get_monthly_trend(self.user)["your_usage"], [100.0])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        checkups = [
+            self.add_checkup(days_ago, days_ago) for days_ago in range(0, 60, 4)
+        ]
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+
+        WeeklyCheckupResult.objects.filter(id=checkups[0].id).update(weekly_total=0)
+        checkups[-1].delete()
+        MonthRollup.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "stale"):
+            call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+        call_command("rebuild_rollups", stdout=io.StringIO())
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+
+        week = UserWeekRollup.objects.get(week=week_start(timezone.localdate()))
+        self.assertEqual(week.weekly_total_min, 0)
+
+
+class TDigestTests(SimpleTestCase):
+    def test_quantiles_of_merged_digests_match_the_data(self):
+        values = np.random.default_rng(0).lognormal(5, 0.5, 50_000)
+        parts = [TDigest.from_values(part) for part in np.array_split(values, 7)]
+        merged = TDigest.from_dict(parts[0].merge(*parts[1:]).to_dict())
+        for q in [0.1, 0.5, 0.9]:
+            self.assertAlmostEqual(
+                merged.quantile(q), np.quantile(values, q), delta=values.std() * 0.01
+            )
+        self.assertAlmostEqual(merged.mean(), values.mean())
+        self.assertEqual(merged.count, len(values))
+        self.assertLess(len(merged.means), 100)
+
+
+class CohortStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.month = timezone.localdate().replace(day=1)
+        self.estimates = {}
+        for i, (house_type, size) in enumerate(
+            [("APT", 1), ("APT", 1), ("APT", 2), ("LARGE", 4)]
+        ):
+            user = User.objects.create_user(f"cohort{i}", password="x")
+            UserProfile.objects.create(
+                user=user, house_type=house_type, household_size=size
+            )
+            for j in range(3):
+                checkup = WeeklyCheckupResult.objects.create(
+                    user=user,
+                    **WEEKLY_ANSWERS,
+                    **CarbonCalculator.calculate_weekly_checkup(WEEKLY_ANSWERS),
+                )
+                checkup.monthly_estimate = 100 * (i + 1) + j
+                checkup.save()
+                add_checkup(checkup)
+                self.estimates.setdefault((house_type, size_bucket(size)), []).append(
+                    checkup.monthly_estimate
+                )
+        self.user = user
+
+    def test_command_stores_cohort_quantiles(self):
+        call_command("compute_cohort_stats", stdout=io.StringIO())
+        rows = CohortStats.objects.filter(month=self.month)
+        self.assertEqual(
+            {(row.house_type, row.size_bucket) for row in rows}, set(self.estimates)
+        )
+        apartments = rows.get(house_type="APT", size_bucket="1")
+        self.assertEqual(apartments.count, 6)
+        self.assertAlmostEqual(
+            apartments.monthly_estimate_mean, np.mean(self.estimates[("APT", "1")])
+        )
+        self.assertEqual(apartments.monthly_estimate_p50, 151)
+
+        everyone = combined_stats(self.month)
+        self.assertEqual(everyone["count"], 12)
+        self.assertAlmostEqual(
+            everyone["monthly_estimate_mean"],
+            np.mean(np.concatenate(list(self.estimates.values()))),
+        )
+
+    def test_trend_compares_with_cohort(self):
+        call_command("compute_cohort_stats", stdout=io.StringIO())
+        trend = get_monthly_trend(self.user, self.user.userprofile)
+        self.assertEqual(trend["average_usage"][-1], 401.0)
+
+
+class RankTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.month = timezone.localdate().replace(day=1)
+        self.users = []
+        for i, (house_type, size) in enumerate(
+            [("APT", 1), ("APT", 1), ("APT", 1), ("APT", 1), ("LARGE", 4)]
+        ):
+            user = User.objects.create_user(f"rank{i}", password="x")
+            UserProfile.objects.create(
+                user=user,
+                house_type=house_type,
+                household_size=size,
+                onboarding_completed=True,
+            )
+            self.users.append(user)
+
+    def record(self, user, score):
+        profile = user.userprofile
+        record_score(
+            user.id, self.month, profile.house_type, profile.household_size, score
+        )
+
+    def test_rank_within_cohort(self):
+        for user, score in zip(self.users, [150, 100, 100.5, 50, 10]):
+            self.record(user, score)
+        self.assertEqual(
+            [(rank["rank"], rank["total"]) for rank in map(rank_of, self.users)],
+            [(4, 4), (2, 4), (3, 4), (1, 4), (1, 1)],
+        )
+        self.assertEqual(rank_of(self.users[1])["best_pct"], 50)
+
+        # A new score moves the user between buckets
+        self.record(self.users[0], 20)
+        self.assertEqual(rank_of(self.users[0])["rank"], 1)
+        self.assertEqual(rank_of(self.users[3])["rank"], 2)
+        buckets = RankBucket.objects.filter(house_type="APT")
+        self.assertEqual(buckets.aggregate(total=Sum("count"))["total"], 4)
+        self.assertEqual(
+            [entry.user for entry in leaderboard(self.month, "APT", "1", 2)],
+            [self.users[0], self.users[3]],
+        )
+
+    def test_deleting_a_user_updates_bucket_counts(self):
+        for user, score in zip(self.users, [150, 100, 100.5, 50, 10]):
+            self.record(user, score)
+        self.users[3].delete()
+        self.assertEqual(
+            [(rank["rank"], rank["total"]) for rank in map(rank_of, self.users[:3])],
+            [(3, 3), (1, 3), (2, 3)],
+        )
+        buckets = RankBucket.objects.filter(house_type="APT")
+        self.assertEqual(buckets.aggregate(total=Sum("count"))["total"], 3)
+
+    def test_admin_cannot_add_change_or_delete_derived_rows(self):
+        self.client.force_login(self.users[0])
+        self.client.post("/survey/weekly/", WEEKLY_ANSWERS)
+        self.client.force_login(User.objects.create_superuser("admin", password="x"))
+        entry = RankEntry.objects.get()
+        rollup = UserWeekRollup.objects.get()
+        for url in [
+            f"/admin/charts/rankentry/{entry.id}/delete/",
+            f"/admin/charts/userweekrollup/{rollup.id}/delete/",
+            "/admin/charts/monthrollup/add/",
+        ]:
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.client.post(
+            "/admin/charts/rankentry/",
+            {
+                "action": "delete_selected",
+                "_selected_action": [entry.id],
+                "post": "yes",
+            },
+        )
+        self.assertTrue(RankEntry.objects.filter(id=entry.id).exists())
+
+    def test_checkups_update_rank_and_rebuild_agrees(self):
+        self.client.force_login(self.users[0])
+        response = self.client.post("/survey/weekly/", WEEKLY_ANSWERS)
+        self.assertEqual(response.status_code, 302)
+        entry = RankEntry.objects.get(user=self.users[0])
+        self.assertAlmostEqual(
+            entry.score,
+            WeeklyCheckupResult.objects.get(user=self.users[0]).weekly_total,
+        )
+        rank = self.client.get("/detailed/data/rank/").json()["rank"]
+        self.assertEqual(rank["best_pct"], 100)
+        self.assertEqual(rank["cohort"], "apartment households of 1 person")
+
+        stored = list(RankEntry.objects.values_list("user", "score", "bucket"))
+        call_command("rebuild_ranks", stdout=io.StringIO())
+        self.assertEqual(
+            list(RankEntry.objects.values_list("user", "score", "bucket")), stored
+        )
+        self.assertEqual(RankBucket.objects.get().count, 1)
+        self.assertIsNone(rank_of(self.users[1]))
@@ -5,4 +5,5 @@ from apps.charts import views
 urlpatterns = [
     path("", views.index, name="charts"),
     path("manage-goal/", views.manage_carbon_goal, name="manage_carbon_goal"),
+    path("data/<str:chart>/", views.chart_data, name="chart_data"),
 ]
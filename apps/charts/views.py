@@ -1,13 +1,29 @@
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib import messages
-from apps.charts.models import CarbonGoal
-from apps.pages.models import InitialSurveyResult, WeeklyCheckupResult, UserProfile
+from apps.charts.cohorts import cohort_stats
+from apps.charts.goals import current_month, goal_for_month, update_goal_progress
+from apps.charts.models import (
+    CarbonGoal,
+    FootprintBand,
+    MonthRollup,
+    UserMonthRollup,
+)
+from apps.charts.ranks import rank_of
 from .forms import CarbonGoalForm
+import hashlib
 import json
 from django.contrib.auth.decorators import login_required
+from apps.pages.dashboard import rebuild_snapshot
 from apps.pages.decorators import onboarding_required
+from apps.pages.emission_factors import factors_for
+from apps.pages.models import UserProfile, WeeklyCheckupResult
+from apps.pages.recompute import INITIAL_ANSWER_FIELDS, WEEKLY_ANSWER_FIELDS
+from apps.pages.user_context import user_context
 
 # Create your views here.
 
@@ -15,18 +31,21 @@ from apps.pages.decorators import onboarding_required
 @login_required
 @onboarding_required
 def manage_carbon_goal(request):
-    # Get or create current month's goal
-    current_month = timezone.now().replace(day=1)
-    goal, created = CarbonGoal.objects.get_or_create(
-        user=request.user,
-        month=current_month,
-        defaults={"target_amount": 0, "current_amount": 0},
+    # The current month's goal; it is only created when the form is saved
+    goal = goal_for_month(request.user) or CarbonGoal(
+        user=request.user, month=current_month(), target_amount=0, current_amount=0
     )
+    # Progress is measured against the baseline this request already loaded
+    baseline = user_context(request).baseline
+    goal.baseline_total = baseline.monthly_total if baseline else None
 
     if request.method == "POST":
         form = CarbonGoalForm(request.POST, instance=goal)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                update_goal_progress(request.user)
+                rebuild_snapshot(request.user)
             messages.success(request, "Carbon goal updated successfully!")
             return redirect("index")
     else:
@@ -44,92 +63,127 @@ def manage_carbon_goal(request):
 @login_required
 @onboarding_required
 def index(request):
-    # Get carbon usage data for the current user
-    current_user = request.user if request.user.is_authenticated else None
-
-    # Get real user data instead of sample data
-    carbon_data = get_carbon_usage_data(current_user)
-    carbon_by_category = get_carbon_by_category(current_user)
-    monthly_trend = get_monthly_trend(current_user)
-
-    # Get current goal
-    current_month = timezone.now().replace(day=1)
-    current_goal = CarbonGoal.objects.filter(
-        user=current_user, month=current_month
-    ).first()
-
+    # The charts are fetched from chart_data once the page has loaded
     context = {
         "parent": "apps",
         "segment": "charts",
-        "carbon_data": json.dumps(carbon_data),
-        "carbon_by_category": json.dumps(carbon_by_category),
-        "monthly_trend": json.dumps(monthly_trend),
-        "current_goal": current_goal,
     }
     return render(request, "charts/index.html", context)
 
 
-def get_carbon_usage_data(user=None):
-    """Get carbon usage data for charts based on user's initial survey"""
-    if user and user.is_authenticated:
-        try:
-            # Get the user's most recent initial survey
-            initial_survey = InitialSurveyResult.objects.filter(user=user).latest(
-                "date_submitted"
-            )
-
-            # Calculate category breakdowns based on survey data
-            # These are estimated breakdowns based on the total monthly footprint
-            total_monthly = initial_survey.monthly_total
-
-            # Estimate category breakdown (simplified calculation)
-            categories = ["Transportation", "Energy", "Food", "Waste", "Other"]
-
-            # Transportation: car type and flights influence
-            transport_factor = 0.3  # Default 30%
-            if initial_survey.car_type == "NONE":
-                transport_factor = 0.15
-            elif initial_survey.car_type in ["HYBRID", "ELEC"]:
-                transport_factor = 0.25
-            elif initial_survey.flights_per_year in ["1LONG", "MULTLONG"]:
-                transport_factor = 0.4
-
-            # Energy: home type and heating influence
-            energy_factor = 0.35  # Default 35%
-            try:
-                profile = UserProfile.objects.get(user=user)
-                if profile.house_type == "APT":
-                    energy_factor = 0.25
-                elif profile.house_type == "LARGE":
-                    energy_factor = 0.4
-            except UserProfile.DoesNotExist:
-                # Use default energy factor if profile doesn't exist
-                pass
-
-            if initial_survey.renewable_pct >= 50:
-                energy_factor *= 0.7  # Reduce if using renewables
-
-            # Adjust other categories proportionally
-            remaining = 1.0 - transport_factor - energy_factor
-            food_factor = remaining * 0.4
-            waste_factor = remaining * 0.3
-            other_factor = remaining * 0.3
-
-            values = [
-                round(total_monthly * transport_factor, 1),
-                round(total_monthly * energy_factor, 1),
-                round(total_monthly * food_factor, 1),
-                round(total_monthly * waste_factor, 1),
-                round(total_monthly * other_factor, 1),
-            ]
+def category_chart(request):
+    """Category breakdown for the bar and pie charts, from one computation."""
+    user_data = user_context(request)
+    carbon_data = get_carbon_usage_data(user_data)
+    return {
+        "carbon_data": carbon_data,
+        "carbon_by_category": get_carbon_by_category(user_data, carbon_data),
+    }
 
-            return {
-                "categories": categories,
-                "values": values,
-                "colors": ["#FF6384", "#36A2EB", "#FFCE56", "#4BC0C0", "#9966FF"],
-            }
-        except InitialSurveyResult.DoesNotExist:
-            pass
+
+def trend_chart(request):
+    return get_monthly_trend(request.user, user_context(request).profile)
+
+
+def band_chart(request):
+    context = user_context(request)
+    stored = stored_bands(request.user)
+    return {
+        "footprint_band": get_footprint_band(context, stored),
+        "weekly_band": get_weekly_band(context, stored),
+    }
+
+
+def rank_chart(request):
+    rank = rank_of(request.user)
+    if rank is not None:
+        house_types = dict(UserProfile.HOUSE_TYPE_CHOICES)
+        size = rank["size_bucket"]
+        people = "1 person" if size == "1" else f"{size} people"
+        rank["cohort"] = (
+            f"{house_types.get(rank['house_type'], rank['house_type']).lower()} "
+            f"households of {people}"
+        )
+    return {"rank": rank}
+
+
+CHARTS = {
+    "category": category_chart,
+    "trend": trend_chart,
+    "band": band_chart,
+    "rank": rank_chart,
+}
+
+
+@login_required
+@onboarding_required
+def chart_data(request, chart):
+    """One chart's dataset as JSON, revalidated with an ETag of its content."""
+    if chart not in CHARTS:
+        return JsonResponse({"error": f"unknown chart {chart!r}"}, status=404)
+
+    body = json.dumps(CHARTS[chart](request))
+    etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag) or HttpResponse(
+        body, content_type="application/json"
+    )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def get_carbon_usage_data(context=None):
+    """Get carbon usage data for charts based on user's initial survey"""
+    # The user's most recent initial survey, from the request's user context
+    initial_survey = context.baseline if context else None
+    if initial_survey is not None:
+        # Calculate category breakdowns based on survey data
+        # These are estimated breakdowns based on the total monthly footprint
+        total_monthly = initial_survey.monthly_total
+
+        # Estimate category breakdown (simplified calculation)
+        categories = ["Transportation", "Energy", "Food", "Waste", "Other"]
+
+        # Transportation: car type and flights influence
+        transport_factor = 0.3  # Default 30%
+        if initial_survey.car_type == "NONE":
+            transport_factor = 0.15
+        elif initial_survey.car_type in ["HYBRID", "ELEC"]:
+            transport_factor = 0.25
+        elif initial_survey.flights_per_year in ["1LONG", "MULTLONG"]:
+            transport_factor = 0.4
+
+        # Energy: home type and heating influence
+        energy_factor = 0.35  # Default 35%
+        profile = context.profile
+        if profile is not None:
+            if profile.house_type == "APT":
+                energy_factor = 0.25
+            elif profile.house_type == "LARGE":
+                energy_factor = 0.4
+
+        if initial_survey.renewable_pct >= 50:
+            energy_factor *= 0.7  # Reduce if using renewables
+
+        # Adjust other categories proportionally
+        remaining = 1.0 - transport_factor - energy_factor
+        food_factor = remaining * 0.4
+        waste_factor = remaining * 0.3
+        other_factor = remaining * 0.3
+
+        values = [
+            round(total_monthly * transport_factor, 1),
+            round(total_monthly * energy_factor, 1),
+            round(total_monthly * food_factor, 1),
+            round(total_monthly * waste_factor, 1),
+            round(total_monthly * other_factor, 1),
+        ]
+
+        return {
+            "categories": categories,
+            "values": values,
+            "colors": ["#FF6384", "#36A2EB", "#FFCE56", "#4BC0C0", "#9966FF"],
+        }
 
     # Fallback to sample data if no user data available
     sample_data = {
@@ -140,9 +194,80 @@ def get_carbon_usage_data(user=None):
     return sample_data
 
 
-def get_carbon_by_category(user=None):
+def stored_bands(user):
+    """The user's bands stored by ``compute_footprint_bands``, by source."""
+    return {band.source: band for band in FootprintBand.objects.filter(user=user)}
+
+
+def get_footprint_band(context=None, stored=None):
+    """Get the 90% uncertainty band of the user's monthly footprint.
+
+    Uses the band stored by ``compute_footprint_bands`` and computes it on
+    the fly for users the nightly run has not reached yet. ``stored`` is
+    the result of ``stored_bands``, read here if not given.
+    """
+    initial_survey = context.baseline if context else None
+    if initial_survey is None:
+        return None
+    if stored is None:
+        stored = stored_bands(context.user)
+    band = stored.get("initial")
+    if band:
+        return {"p5": band.p5, "p50": band.p50, "p95": band.p95}
+
+    profile = context.profile
+    answers = {field: getattr(initial_survey, field) for field in INITIAL_ANSWER_FIELDS}
+    answers["home_type"] = profile.house_type
+    return factors_for(profile).uncertainty.initial_bands(answers)
+
+
+def get_weekly_band(context, stored=None):
+    """Get the 90% uncertainty band of the user's latest weekly checkup.
+
+    Like ``get_footprint_band``, but in kg CO2 per week.
+    """
+    if stored is None:
+        stored = stored_bands(context.user)
+    band = stored.get("weekly")
+    if band:
+        return {"p5": band.p5, "p50": band.p50, "p95": band.p95}
+    checkup = (
+        WeeklyCheckupResult.objects.filter(user=context.user)
+        .order_by("-date_submitted", "-id")
+        .values(*WEEKLY_ANSWER_FIELDS)
+        .first()
+    )
+    if checkup is None:
+        return None
+    return factors_for(context.profile).uncertainty.weekly_bands(checkup)
+
+
+def population_averages(months, profile=None):
+    """Average monthly estimate of households like the profile's, per month.
+
+    Reads the cohort statistics, and all users' rollups for months whose
+    cohort has none yet; None where neither exists.
+    """
+    cohorts = cohort_stats(profile, months) if profile else [None] * len(months)
+    averages = [cohort and cohort.monthly_estimate_mean for cohort in cohorts]
+    if None in averages:
+        population = MonthRollup.objects.in_bulk(
+            [month for month, average in zip(months, averages) if average is None],
+            field_name="month",
+        )
+        averages = [
+            population[month].monthly_estimate_mean
+            if average is None and month in population
+            else average
+            for month, average in zip(months, averages)
+        ]
+    return averages
+
+
+def get_carbon_by_category(context=None, carbon_data=None):
     """Get carbon usage breakdown by category for pie chart"""
-    carbon_data = get_carbon_usage_data(user)
+    if carbon_data is None:
+        carbon_data = get_carbon_usage_data(context)
 
     total = sum(carbon_data["values"])
     sample_data = []
@@ -157,44 +282,34 @@ def get_carbon_by_category(user=None):
     return sample_data
 
 
-def get_monthly_trend(user=None):
+def get_monthly_trend(user=None, profile=None):
     """Get monthly carbon usage trend from weekly checkups"""
     if user and user.is_authenticated:
-        try:
-            # Get user's weekly checkups from last 6 months
-            six_months_ago = timezone.now() - timedelta(days=180)
-            weekly_checkups = WeeklyCheckupResult.objects.filter(
-                user=user, date_submitted__gte=six_months_ago
-            ).order_by("date_submitted")
-
-            if weekly_checkups.exists():
-                # Group by month and calculate averages
-                monthly_data = {}
-                for checkup in weekly_checkups:
-                    month_key = checkup.date_submitted.strftime("%b")
-                    if month_key not in monthly_data:
-                        monthly_data[month_key] = []
-                    monthly_data[month_key].append(checkup.monthly_estimate)
-
-                months = list(monthly_data.keys())[-6:]  # Last 6 months
-                your_usage = []
-
-                for month in months:
-                    if month in monthly_data:
-                        avg_usage = sum(monthly_data[month]) / len(monthly_data[month])
-                        your_usage.append(round(avg_usage, 1))
-                    else:
-                        your_usage.append(0)
-
-                average_usage = [40.0] * len(months)
-
-                return {
-                    "months": months,
-                    "your_usage": your_usage,
-                    "average_usage": average_usage,
-                }
-        except Exception:
-            pass
+        # The user's average monthly estimate for each of their last 6 months
+        # with checkups, read from the rollups
+        first_month = (timezone.localdate() - timedelta(days=180)).replace(day=1)
+        monthly_data = list(
+            UserMonthRollup.objects.filter(user=user, month__gte=first_month).order_by(
+                "-month"
+            )[:6]
+        )[::-1]
+
+        if monthly_data:
+            months = [rollup.month for rollup in monthly_data]
+            your_usage = [
+                round(rollup.monthly_estimate_mean, 1) for rollup in monthly_data
+            ]
+            average_usage = [
+                None if average is None else round(average, 1)
+                for average in population_averages(months, profile)
+            ]
+            months = [month.strftime("%b") for month in months]
+
+            return {
+                "months": months,
+                "your_usage": your_usage,
+                "average_usage": average_usage,
+            }
 
     # Fallback to sample data
     months = ["Jun", "Jul", "Aug", "Sep", "Oct", "Nov"]
@@ -1 +1,110 @@
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .checkup_import import InvalidRecord, import_csv
+from .models import WeeklyCheckupResult
+
 # Register your models here.
+
+
+class CheckupImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV with username, date_submitted and the checkup answer codes"
+    )
+    skip_invalid = forms.BooleanField(
+        required=False, help_text="Skip invalid records instead of stopping"
+    )
+
+
+@admin.register(WeeklyCheckupResult)
+class WeeklyCheckupResultAdmin(admin.ModelAdmin):
+    """Read-only view of checkups, which rollups, ranks and snapshots derive from"""
+
+    list_display = [
+        "user",
+        "date_submitted",
+        "weekly_total",
+        "monthly_estimate",
+        "pct_change_from_last",
+        "factors_region",
+        "factors_version",
+    ]
+    list_select_related = ["user"]
+    list_filter = ["factors_region"]
+    search_fields = ["user__username"]
+    date_hierarchy = "date_submitted"
+    ordering = ["-date_submitted", "-id"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_import_permission(self, request):
+        return super().has_add_permission(request)
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            **(extra_context or {}),
+            "has_import_permission": self.has_import_permission(request),
+        }
+        return super().changelist_view(request, extra_context)
+
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="pages_weeklycheckupresult_import",
+            ),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        """Upload a CSV of historical checkups, as ``manage.py import_checkups``."""
+        if not self.has_import_permission(request):
+            return redirect("admin:pages_weeklycheckupresult_changelist")
+        form = CheckupImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            reports = []
+            stream = io.TextIOWrapper(
+                form.cleaned_data["file"], encoding="utf-8-sig", newline=""
+            )
+            try:
+                run = import_csv(
+                    stream,
+                    skip_invalid=form.cleaned_data["skip_invalid"],
+                    report=reports.append,
+                )
+            except (InvalidRecord, UnicodeDecodeError) as e:
+                self.message_user(request, f"Import stopped: {e}", messages.ERROR)
+            else:
+                summary = (
+                    f"Imported {run.imported} checkups for {len(run.user_ids)} users"
+                )
+                if run.skipped:
+                    summary += f", skipped {run.skipped} invalid records"
+                self.message_user(request, summary, messages.SUCCESS)
+                skipped = [m for m in reports if m.startswith("Skipping")]
+                for message in skipped[:20]:
+                    self.message_user(request, message, messages.WARNING)
+                return redirect("admin:pages_weeklycheckupresult_changelist")
+        return TemplateResponse(
+            request,
+            "admin/pages/weeklycheckupresult/import_form.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "title": "Import weekly checkups",
+                "form": form,
+            },
+        )
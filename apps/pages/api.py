@@ -0,0 +1,138 @@
+"""Stateless scoring API for partner integrations.
+
+``POST /api/score/<initial|weekly>/`` scores answers without storing them or
+requiring an account. The body is either records::
+
+    {"records": [{"heating_usage": "MOST", ...}, ...], "region": "north"}
+
+(a bare array of records also works) or columns::
+
+    {"columns": {"heating_usage": ["MOST", "LOW", ...], ...}}
+
+Results come back in the same shape and order. Every row is validated before
+anything is scored; if any row is invalid the response is a 400 listing the
+problems by row number.
+"""
+
+import io
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    parser_classes,
+    permission_classes,
+)
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from . import scoring
+from .emission_factors import DEFAULT_REGION, factor_registry
+
+
+def _error(message, status_code=status.HTTP_400_BAD_REQUEST):
+    return Response({"detail": message}, status=status_code)
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "request_too_large"
+
+
+class LimitedJSONParser(JSONParser):
+    """JSON parser that reads at most ``SCORING_API_MAX_BYTES`` of the body.
+
+    Chunked requests have no Content-Length, so the limit applies to the
+    bytes actually read rather than to the header.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        max_bytes = settings.SCORING_API_MAX_BYTES
+        body = stream.read(max_bytes + 1)
+        if len(body) > max_bytes:
+            raise RequestTooLarge(f"Request body is larger than {max_bytes} bytes")
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+def _parse_body(data):
+    """Return ``(answers, count, columnar)``.
+
+    Raises ``TypeError`` or ``ValueError`` if the body is malformed.
+    """
+    if isinstance(data, list):
+        data = {"records": data}
+    if not isinstance(data, dict):
+        raise TypeError("Expected an object with 'records' or 'columns'")
+
+    if "columns" in data:
+        columns = data["columns"]
+        if not isinstance(columns, dict) or not all(
+            isinstance(values, list) for values in columns.values()
+        ):
+            raise TypeError("'columns' must map field names to arrays")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All columns must have the same length")
+        return columns, lengths.pop() if lengths else 0, True
+
+    records = data.get("records")
+    if not isinstance(records, list):
+        raise TypeError("Expected an object with 'records' or 'columns'")
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise TypeError(f"Record {i} is not an object")
+    return records, len(records), False
+
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@parser_classes([LimitedJSONParser])
+def score(request, kind):
+    """Score initial survey or weekly checkup answers in bulk."""
+    if kind not in scoring.KINDS:
+        return _error("Unknown survey kind", status.HTTP_404_NOT_FOUND)
+    max_bytes = settings.SCORING_API_MAX_BYTES
+    if int(request.META.get("CONTENT_LENGTH") or 0) > max_bytes:
+        return _error(
+            f"Request body is larger than {max_bytes} bytes",
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    try:
+        answers, count, columnar = _parse_body(request.data)
+    except (TypeError, ValueError) as e:
+        return _error(str(e))
+    max_records = settings.SCORING_API_MAX_RECORDS
+    if count > max_records:
+        return _error(
+            f"At most {max_records} records can be scored per request",
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    region = DEFAULT_REGION
+    if isinstance(request.data, dict):
+        region = request.data.get("region", DEFAULT_REGION)
+    if region not in factor_registry().regions():
+        return _error(f"Unknown region {region!r}")
+    factors = factor_registry().get(region)
+
+    if not columnar:
+        answers = scoring.records_to_columns(kind, answers)
+    answers = {
+        field: answers.get(field, [None] * count)
+        for field in scoring.INPUT_FIELDS[kind]
+    }
+    encoded, errors = scoring.validate(kind, answers, factors)
+    if errors:
+        return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = scoring.score(kind, encoded, factors)
+    if columnar:
+        body = scoring.result_columns(kind, results)
+    else:
+        body = scoring.result_rows(kind, results)
+    return Response({"results": body, **factors.stamp})
@@ -0,0 +1,496 @@
+"""Microbenchmarks for EcoTrack hot paths, run with ``manage.py benchmark``.
+
+Each suite is a function that takes the command options and returns a list
+of ``Case`` objects. A case is a callable doing one unit of work (one survey
+for scalar paths, one batch for columnar paths) and the number of rows that
+unit covers, so results can be compared per call and per row. Cases that
+need rows in the database remove them again through ``cleanup``.
+"""
+
+import itertools
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import numpy as np
+
+from .carbon_calculator import CarbonCalculator, compiled_weekly_calculator
+from .emission_factors import BUILTIN_FACTORS, FactorRegistry
+from .sample_data import (
+    INITIAL_SURVEY_CHOICES,
+    WEEKLY_CHECKUP_CHOICES,
+    random_answer_columns,
+    random_answers,
+)
+
+SUITES = {}
+# Rank suite users and export suite rows at ``--scale 1``
+SCALE_ROWS = 10_000
+
+
+@dataclass
+class Case:
+    name: str
+    func: object
+    rows: int = 1
+    batch: bool = False
+    cleanup: object = None
+    # Timed calls, for cases too slow for the command's --calls/--batch-calls
+    calls: int = None
+
+
+def suite(name):
+    """Register a benchmark suite under ``name``."""
+
+    def register(func):
+        SUITES[name] = func
+        return func
+
+    return register
+
+
+def _cycle(items):
+    """Return a no-argument callable handing out ``items`` round-robin."""
+    return itertools.cycle(items).__next__
+
+
+@suite("calculator")
+def calculator_cases(options):
+    rng = random.Random(options["seed"])
+    np_rng = np.random.default_rng(options["seed"])
+    batch_size = options["batch_size"]
+    compiled = compiled_weekly_calculator()
+
+    initial = []
+    for _ in range(1000):
+        answers = random_answers(INITIAL_SURVEY_CHOICES, rng)
+        answers["home_type"] = rng.choice(["APT", "SMALL", "LARGE"])
+        answers["household_size"] = rng.randint(1, 5)
+        initial.append(answers)
+    weekly = [random_answers(WEEKLY_CHECKUP_CHOICES, rng) for _ in range(1000)]
+    last_totals = [rng.uniform(20, 160) for _ in range(1000)]
+    next_initial, next_weekly = _cycle(initial), _cycle(zip(weekly, last_totals))
+
+    initial_columns = random_answer_columns(INITIAL_SURVEY_CHOICES, batch_size, np_rng)
+    initial_columns["home_type"] = np_rng.choice(["APT", "SMALL", "LARGE"], batch_size)
+    initial_columns["household_size"] = np_rng.integers(1, 6, batch_size)
+    weekly_columns = random_answer_columns(WEEKLY_CHECKUP_CHOICES, batch_size, np_rng)
+    batch_last = np_rng.uniform(20, 160, batch_size)
+
+    return [
+        Case(
+            "calculator.initial.scalar",
+            lambda: CarbonCalculator.calculate_initial_survey(next_initial()),
+        ),
+        Case(
+            "calculator.weekly.scalar",
+            lambda: CarbonCalculator.calculate_weekly_checkup(*next_weekly(), 2),
+        ),
+        Case(
+            "calculator.weekly.compiled",
+            lambda: compiled.calculate(*next_weekly(), 2),
+        ),
+        Case(
+            "calculator.initial.batch",
+            lambda: CarbonCalculator.calculate_initial_survey_batch(initial_columns),
+            rows=batch_size,
+            batch=True,
+        ),
+        Case(
+            "calculator.weekly.batch",
+            lambda: CarbonCalculator.calculate_weekly_checkup_batch(
+                weekly_columns, batch_last, 2
+            ),
+            rows=batch_size,
+            batch=True,
+        ),
+        Case(
+            "calculator.weekly.compiled_batch",
+            lambda: compiled.calculate_batch(weekly_columns, batch_last, 2),
+            rows=batch_size,
+            batch=True,
+        ),
+    ]
+
+
+@suite("factors")
+def factor_cases(options):
+    """Regional factor lookup against the built-in weights on the submit path."""
+    rng = random.Random(options["seed"])
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, "north.json"), "w") as f:
+        json.dump({"version": 1, "weekly": {"energy_source": {"STANDARD": 20.0}}}, f)
+    registry = FactorRegistry(directory)
+    profile = SimpleNamespace(region="north", household_size=2)
+
+    weekly = [random_answers(WEEKLY_CHECKUP_CHOICES, rng) for _ in range(1000)]
+    last_totals = [rng.uniform(20, 160) for _ in range(1000)]
+    next_weekly = _cycle(zip(weekly, last_totals))
+
+    return [
+        Case(
+            "factors.builtin_dict_access",
+            lambda: CarbonCalculator.WEEKLY_WEIGHTS["energy_source"],
+        ),
+        Case("factors.registry_lookup", lambda: registry.get(profile.region)),
+        Case(
+            "submit.weekly.builtin",
+            lambda: BUILTIN_FACTORS.calculate_weekly_checkup(
+                *next_weekly(), profile.household_size
+            ),
+        ),
+        Case(
+            "submit.weekly.regional",
+            lambda: registry.get(profile.region).calculate_weekly_checkup(
+                *next_weekly(), profile.household_size
+            ),
+        ),
+    ]
+
+
+@suite("uncertainty")
+def uncertainty_cases(options):
+    """Monte Carlo bands; interactive calls must stay well under 20 ms.
+
+    Each call samples thousands of values per row, so every case is timed
+    with the batch call count.
+    """
+    rng = random.Random(options["seed"])
+    uncertainty = BUILTIN_FACTORS.uncertainty
+    initial = []
+    for _ in range(100):
+        answers = random_answers(INITIAL_SURVEY_CHOICES, rng)
+        answers["home_type"] = rng.choice(["APT", "SMALL", "LARGE"])
+        initial.append(answers)
+    weekly = [random_answers(WEEKLY_CHECKUP_CHOICES, rng) for _ in range(100)]
+    next_initial, next_weekly = _cycle(initial), _cycle(weekly)
+    weekly_columns = {field: [row[field] for row in weekly] for field in weekly[0]}
+
+    return [
+        Case(
+            "uncertainty.initial",
+            lambda: uncertainty.initial_bands(next_initial()),
+            batch=True,
+        ),
+        Case(
+            "uncertainty.weekly",
+            lambda: uncertainty.weekly_bands(next_weekly()),
+            batch=True,
+        ),
+        Case(
+            "uncertainty.weekly.batch",
+            lambda: uncertainty.weekly_bands_batch(weekly_columns),
+            rows=len(weekly),
+            batch=True,
+        ),
+    ]
+
+
+@suite("api")
+def api_cases(options):
+    """The scoring API end to end (parse, validate, score, render) at 10k rows."""
+    from django.test import RequestFactory
+
+    from .api import score
+
+    rng = random.Random(options["seed"])
+    factory = RequestFactory()
+    records = [random_answers(WEEKLY_CHECKUP_CHOICES, rng) for _ in range(10_000)]
+    columns = {field: [row[field] for row in records] for field in records[0]}
+
+    def post(body):
+        # A fresh request per call, since a request body can only be read once
+        payload = json.dumps(body).encode()
+        return lambda: score(
+            factory.generic("POST", "/api/score/weekly/", payload, "application/json"),
+            kind="weekly",
+        ).render()
+
+    return [
+        Case("api.weekly.records", post({"records": records}), rows=10_000, batch=True),
+        Case("api.weekly.columns", post({"columns": columns}), rows=10_000, batch=True),
+    ]
+
+
+@suite("trend")
+def trend_cases(options):
+    """The charts monthly trend for users with growing checkup history.
+
+    The trend reads the monthly rollups, so the time per call should stay
+    flat from a hundred to thousands of checkups. Each case creates its own
+    throwaway user and deletes it afterwards.
+    """
+    from datetime import timedelta
+
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from apps.charts.rollups import USER_ROLLUPS, fresh_rollups, sync_rollups
+    from apps.charts.views import get_monthly_trend
+
+    from .models import WeeklyCheckupResult
+
+    rng = random.Random(options["seed"])
+    now = timezone.now()
+    scored = []
+    for _ in range(50):
+        answers = random_answers(WEEKLY_CHECKUP_CHOICES, rng)
+        scored.append({**answers, **CarbonCalculator.calculate_weekly_checkup(answers)})
+
+    # Left behind if an earlier run was interrupted
+    User.objects.filter(username__startswith="benchmark-trend-").delete()
+    cases = []
+    for history in [100, 1000, 5000]:
+        user = User.objects.create_user(f"benchmark-trend-{history}")
+        # Spread the history over the last year
+        WeeklyCheckupResult.objects.bulk_create(
+            [
+                WeeklyCheckupResult(
+                    user=user,
+                    date_submitted=now - timedelta(minutes=i * 525_600 // history),
+                    **scored[i % len(scored)],
+                )
+                for i in range(history)
+            ],
+            batch_size=1000,
+        )
+        # Only the user's own rollups, so the run leaves the global ones alone
+        for model, group, trunc in USER_ROLLUPS:
+            sync_rollups(
+                model,
+                group,
+                fresh_rollups(user.weeklycheckupresult_set.all(), group, trunc),
+                model.objects.filter(user=user),
+            )
+        cases.append(
+            Case(
+                f"trend.checkups.{history}",
+                lambda user=user: get_monthly_trend(user),
+                rows=history,
+                batch=True,
+                cleanup=user.delete,
+            )
+        )
+    return cases
+
+
+@suite("rank")
+def rank_cases(options):
+    """Cohort rank lookups, leaderboards and score updates for ``--scale`` users.
+
+    Rank entries are spread over every cohort of the current month. They are
+    created in a transaction that the last case's cleanup rolls back, as
+    deleting a million users one cascade at a time would take far longer
+    than the run.
+    """
+    from collections import Counter
+
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from apps.charts.goals import current_month
+    from apps.charts.models import RankBucket, RankEntry
+    from apps.charts.ranks import leaderboard, rank_of, record_score, score_bucket
+
+    from .models import UserProfile
+
+    rng = random.Random(options["seed"])
+    month = current_month()
+    house_types = [key for key, _ in UserProfile.HOUSE_TYPE_CHOICES]
+    households = [1, 2, 3, 5]
+    size_buckets = ["1", "2", "3-4", "5+"]
+
+    rank_users = SCALE_ROWS * options["scale"]
+    atomic = transaction.atomic()
+    atomic.__enter__()
+    user_ids = []
+    buckets = Counter()
+    for start in range(0, rank_users, 10_000):
+        users = User.objects.bulk_create(
+            [
+                User(username=f"benchmark-rank-{i}", password="!")
+                for i in range(start, min(start + 10_000, rank_users))
+            ]
+        )
+        entries = []
+        for user in users:
+            score = rng.lognormvariate(4.5, 0.5)
+            entry = RankEntry(
+                user=user,
+                month=month,
+                house_type=rng.choice(house_types),
+                size_bucket=rng.choice(size_buckets),
+                score=score,
+                bucket=score_bucket(score),
+            )
+            buckets[entry.house_type, entry.size_bucket, entry.bucket] += 1
+            entries.append(entry)
+        RankEntry.objects.bulk_create(entries)
+        user_ids.extend(user.id for user in users)
+    RankBucket.objects.bulk_create(
+        RankBucket(
+            month=month,
+            house_type=house_type,
+            size_bucket=size,
+            bucket=bucket,
+            count=count,
+        )
+        for (house_type, size, bucket), count in buckets.items()
+    )
+
+    def rollback():
+        transaction.set_rollback(True)
+        atomic.__exit__(None, None, None)
+
+    users = rank_users
+    next_user = _cycle(rng.sample(user_ids, min(len(user_ids), 1000)))
+    return [
+        Case("rank.lookup", lambda: rank_of(next_user(), month), rows=users),
+        Case(
+            "rank.leaderboard",
+            lambda: leaderboard(
+                month, rng.choice(house_types), rng.choice(size_buckets)
+            ),
+            rows=users,
+        ),
+        Case(
+            "rank.update",
+            lambda: record_score(
+                next_user(),
+                month,
+                rng.choice(house_types),
+                rng.choice(households),
+                rng.lognormvariate(4.5, 0.5),
+            ),
+            rows=users,
+            cleanup=rollback,
+        ),
+    ]
+
+
+@suite("export")
+def export_cases(options):
+    """Streaming CSV export of a weekly checkup history, 10 rows up to ``--scale``.
+
+    The peak bytes column is the peak traced memory of one whole export, so
+    it should stay flat as the history grows. Histories are created in a
+    transaction that the last case's cleanup rolls back.
+    """
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from .export import csv_response
+    from .models import WeeklyCheckupResult
+
+    rng = random.Random(options["seed"])
+    scored = []
+    for _ in range(50):
+        answers = random_answers(WEEKLY_CHECKUP_CHOICES, rng)
+        scored.append({**answers, **CarbonCalculator.calculate_weekly_checkup(answers)})
+
+    atomic = transaction.atomic()
+    atomic.__enter__()
+    users = {}
+    for history in sorted({10, 1_000, SCALE_ROWS * options["scale"]}):
+        user = users[history] = User.objects.create_user(f"benchmark-export-{history}")
+        for start in range(0, history, 10_000):
+            WeeklyCheckupResult.objects.bulk_create(
+                WeeklyCheckupResult(user=user, **scored[i % len(scored)])
+                for i in range(start, min(start + 10_000, history))
+            )
+
+    def export(user):
+        for _ in csv_response(user, "weekly").streaming_content:
+            pass
+
+    def rollback():
+        transaction.set_rollback(True)
+        atomic.__exit__(None, None, None)
+
+    cases = [
+        Case(
+            f"export.weekly.{history}",
+            lambda user=user: export(user),
+            rows=history,
+            batch=True,
+            # A handful of calls is plenty once an export takes seconds
+            calls=max(3, min(options["batch_calls"], 100_000 // history)),
+        )
+        for history, user in users.items()
+    ]
+    cases[-1].cleanup = rollback
+    return cases
+
+
+def run_case(case, calls, warmup=100):
+    """Time ``calls`` calls of a case and sample its peak traced memory."""
+    for _ in range(min(warmup, calls)):
+        case.func()
+
+    durations = np.empty(calls, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(calls):
+        start = clock()
+        case.func()
+        durations[i] = clock() - start
+
+    # Memory sampling runs separately because tracing slows every call
+    samples = min(calls, 200)
+    peaks = np.empty(samples, dtype=np.int64)
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            case.func()
+            peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+    ops_per_sec = calls / (durations.sum() / 1e9)
+    return {
+        "calls": calls,
+        "rows_per_call": case.rows,
+        "ops_per_sec": ops_per_sec,
+        "rows_per_sec": ops_per_sec * case.rows,
+        "p50_us": float(np.percentile(durations, 50)) / 1e3,
+        "p99_us": float(np.percentile(durations, 99)) / 1e3,
+        # Peak traced memory above the starting point, not an allocation count
+        "peak_bytes_per_call": float(peaks.mean()),
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Compare results against a baseline run.
+
+    Returns ``(name, ratio)`` pairs for every case present in both, where
+    ratio is current/baseline throughput, and the subset that regressed by
+    more than ``tolerance``.
+    """
+    ratios = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous:
+            ratios.append((name, result["ops_per_sec"] / previous["ops_per_sec"]))
+    regressions = [(name, ratio) for name, ratio in ratios if ratio < 1 - tolerance]
+    return ratios, regressions
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -1,4 +1,19 @@
+import hashlib
+import json
+from array import array
+from itertools import repeat
+from operator import getitem, itemgetter
+from pathlib import Path
+
+import numpy as np
+
+
 class CarbonCalculator:
+    # Version of the weights below. Every stored result is stamped with the
+    # version it was calculated with; bump this whenever a weight changes and
+    # run ``manage.py recompute_results`` to bring stored results up to date.
+    FACTORS_VERSION = 1
+
     MONTHLY_WEIGHTS = {
         "home_type": {"APT": 4, "SMALL": 6, "LARGE": 8},
         "primary_heating": {"ELEC": 6, "GAS": 10, "OIL": 14, "NONE": 0},
@@ -85,49 +100,44 @@ class CarbonCalculator:
     }
 
     @staticmethod
-    def calculate_initial_survey(data):
-        """Calculate CO2 emissions from initial survey data."""
+    def calculate_initial_survey(data, weights=None):
+        """Calculate CO2 emissions from initial survey data.
+
+        ``weights`` defaults to ``MONTHLY_WEIGHTS``; pass a region's factor
+        set to score with its weights instead.
+        """
+        if weights is None:
+            weights = CarbonCalculator.MONTHLY_WEIGHTS
+
         monthly_raw_total = 0
         home_electric_subtotal = 0
 
         # Calculate home-electric subtotal first
         if data["primary_heating"] == "ELEC":
-            home_electric_subtotal += CarbonCalculator.MONTHLY_WEIGHTS[
-                "primary_heating"
-            ]["ELEC"]
+            home_electric_subtotal += weights["primary_heating"]["ELEC"]
 
         # Add other electric components
         home_electric_subtotal += (
-            CarbonCalculator.MONTHLY_WEIGHTS["appliance_use"][data["appliance_use"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["lighting_type"][data["lighting_type"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["air_conditioning"][
-                data["air_conditioning"]
-            ]
-            + CarbonCalculator.MONTHLY_WEIGHTS["device_time"][data["device_time"]]
+            weights["appliance_use"][data["appliance_use"]]
+            + weights["lighting_type"][data["lighting_type"]]
+            + weights["air_conditioning"][data["air_conditioning"]]
+            + weights["device_time"][data["device_time"]]
         )
 
         # Calculate raw total from all sources
         monthly_raw_total = (
-            CarbonCalculator.MONTHLY_WEIGHTS["home_type"][data["home_type"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["primary_heating"][
-                data["primary_heating"]
-            ]
-            + CarbonCalculator.MONTHLY_WEIGHTS["appliance_use"][data["appliance_use"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["lighting_type"][data["lighting_type"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["air_conditioning"][
-                data["air_conditioning"]
-            ]
-            + CarbonCalculator.MONTHLY_WEIGHTS["car_type"][data["car_type"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["device_time"][data["device_time"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["flights_per_year"][
-                data["flights_per_year"]
-            ]
-            + CarbonCalculator.MONTHLY_WEIGHTS["public_transport"][
-                data["public_transport"]
-            ]
-            + CarbonCalculator.MONTHLY_WEIGHTS["compost_waste"][data["compost_waste"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["clothes_drying"][data["clothes_drying"]]
-            + CarbonCalculator.MONTHLY_WEIGHTS["buy_secondhand"][data["buy_secondhand"]]
+            weights["home_type"][data["home_type"]]
+            + weights["primary_heating"][data["primary_heating"]]
+            + weights["appliance_use"][data["appliance_use"]]
+            + weights["lighting_type"][data["lighting_type"]]
+            + weights["air_conditioning"][data["air_conditioning"]]
+            + weights["car_type"][data["car_type"]]
+            + weights["device_time"][data["device_time"]]
+            + weights["flights_per_year"][data["flights_per_year"]]
+            + weights["public_transport"][data["public_transport"]]
+            + weights["compost_waste"][data["compost_waste"]]
+            + weights["clothes_drying"][data["clothes_drying"]]
+            + weights["buy_secondhand"][data["buy_secondhand"]]
         )
 
         # Calculate renewable discount
@@ -146,27 +156,24 @@ class CarbonCalculator:
         }
 
     @staticmethod
-    def calculate_weekly_checkup(data, last_week_total=None, household_size=1):
+    def calculate_weekly_checkup(
+        data, last_week_total=None, household_size=1, weights=None
+    ):
         """Calculate carbon emissions (in kg CO2e) from weekly checkup data."""
+        if weights is None:
+            weights = CarbonCalculator.WEEKLY_WEIGHTS
+
         # Calculate base emissions from each category
         weekly_raw_total = (
-            CarbonCalculator.WEEKLY_WEIGHTS["heating_usage"][data["heating_usage"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["appliance_usage"][
-                data["appliance_usage"]
-            ]
-            + CarbonCalculator.WEEKLY_WEIGHTS["daily_transport"][
-                data["daily_transport"]
-            ]
-            + CarbonCalculator.WEEKLY_WEIGHTS["weekly_travel"][data["weekly_travel"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["vehicle_type"][data["vehicle_type"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["energy_source"][data["energy_source"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["water_usage"][data["water_usage"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["waste_generation"][
-                data["waste_generation"]
-            ]
-            + CarbonCalculator.WEEKLY_WEIGHTS["weekly_consumption"][
-                data["weekly_consumption"]
-            ]
+            weights["heating_usage"][data["heating_usage"]]
+            + weights["appliance_usage"][data["appliance_usage"]]
+            + weights["daily_transport"][data["daily_transport"]]
+            + weights["weekly_travel"][data["weekly_travel"]]
+            + weights["vehicle_type"][data["vehicle_type"]]
+            + weights["energy_source"][data["energy_source"]]
+            + weights["water_usage"][data["water_usage"]]
+            + weights["waste_generation"][data["waste_generation"]]
+            + weights["weekly_consumption"][data["weekly_consumption"]]
         )
 
         # Apply efficiency bonuses
@@ -181,12 +188,8 @@ class CarbonCalculator:
         # Electric vehicle bonus (15% reduction on transport emissions)
         if data["vehicle_type"] == "ELECTRIC":
             transport_component = (
-                CarbonCalculator.WEEKLY_WEIGHTS["daily_transport"][
-                    data["daily_transport"]
-                ]
-                + CarbonCalculator.WEEKLY_WEIGHTS["weekly_travel"][
-                    data["weekly_travel"]
-                ]
+                weights["daily_transport"][data["daily_transport"]]
+                + weights["weekly_travel"][data["weekly_travel"]]
             )
             weekly_total -= transport_component * 0.15
 
@@ -198,12 +201,10 @@ class CarbonCalculator:
         monthly_estimate = weekly_total * 4
 
         home_electric_subtotal = (
-            CarbonCalculator.WEEKLY_WEIGHTS["heating_usage"][data["heating_usage"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["appliance_usage"][
-                data["appliance_usage"]
-            ]
-            + CarbonCalculator.WEEKLY_WEIGHTS["energy_source"][data["energy_source"]]
-            + CarbonCalculator.WEEKLY_WEIGHTS["water_usage"][data["water_usage"]]
+            weights["heating_usage"][data["heating_usage"]]
+            + weights["appliance_usage"][data["appliance_usage"]]
+            + weights["energy_source"][data["energy_source"]]
+            + weights["water_usage"][data["water_usage"]]
         )
 
         renewable_discount = 0
@@ -225,3 +226,427 @@ class CarbonCalculator:
             "monthly_estimate": monthly_estimate,
             "monthly_estimate_per_person": monthly_estimate_per_person,
         }
+
+    @staticmethod
+    def calculate_initial_survey_batch(columns, weights=None):
+        """Calculate CO2 emissions for many initial surveys at once.
+
+        ``columns`` maps each survey field (plus ``home_type``,
+        ``renewable_pct`` and ``household_size``) to a column of answers,
+        e.g. a dict of lists/NumPy arrays or a pandas DataFrame. Choice
+        columns may hold the choice codes or integer indices into the
+        weight table (see ``encode_choices``). Returns a dict of NumPy
+        arrays with the same keys and values as ``calculate_initial_survey``.
+        """
+        if weights is None:
+            weights = CarbonCalculator.MONTHLY_WEIGHTS
+        indices = {
+            field: encode_choices(weights, field, columns[field]) for field in weights
+        }
+        values = {
+            field: _weight_vector(weights, field)[indices[field]] for field in weights
+        }
+        heating_is_elec = indices["primary_heating"] == _choice_index(
+            weights, "primary_heating", "ELEC"
+        )
+        return _initial_survey_totals(
+            values,
+            heating_is_elec,
+            np.asarray(columns["renewable_pct"], dtype=np.float64),
+            np.asarray(columns["household_size"], dtype=np.float64),
+        )
+
+    @staticmethod
+    def calculate_weekly_checkup_batch(
+        columns, last_week_total=None, household_size=1, weights=None
+    ):
+        """Calculate carbon emissions for many weekly checkups at once.
+
+        Works like ``calculate_initial_survey_batch``. ``last_week_total`` and
+        ``household_size`` may be scalars or per-row arrays; a missing (NaN)
+        or zero last week total gives a NaN ``pct_change_from_last``.
+        """
+        if weights is None:
+            weights = CarbonCalculator.WEEKLY_WEIGHTS
+        indices = {
+            field: encode_choices(weights, field, columns[field]) for field in weights
+        }
+        values = {
+            field: _weight_vector(weights, field)[indices[field]] for field in weights
+        }
+        energy = indices["energy_source"]
+        return _weekly_checkup_totals(
+            values,
+            full_green=energy == _choice_index(weights, "energy_source", "FULL_GREEN"),
+            partial=energy == _choice_index(weights, "energy_source", "PARTIAL"),
+            green_opt=energy == _choice_index(weights, "energy_source", "GREEN_OPT"),
+            electric_vehicle=indices["vehicle_type"]
+            == _choice_index(weights, "vehicle_type", "ELECTRIC"),
+            last_week_total=last_week_total,
+            household_size=household_size,
+        )
+
+
+class CompiledWeeklyCalculator:
+    """Weekly checkup calculator backed by a table of every possible answer.
+
+    The weekly answer space is small (one row per combination of choices),
+    so the answer-dependent results are computed once with the batch path
+    and scoring becomes a single index into the table. That pays off for
+    batches and scenarios; a single answer is scored faster by
+    ``calculate_weekly_checkup``, which stays the reference implementation.
+    ``verify`` cross-checks the table against it.
+    """
+
+    COLUMNS = (
+        "weekly_raw_total",
+        "weekly_total",
+        "home_electric_subtotal",
+        "renewable_discount",
+    )
+
+    def __init__(self, weights=None, table=None):
+        if weights is None:
+            weights = CarbonCalculator.WEEKLY_WEIGHTS
+        self.weights = weights
+        self.fields = list(weights)
+        self.sizes = [len(weights[field]) for field in self.fields]
+        # Mixed-radix strides, first field most significant
+        self.strides = np.cumprod([1] + self.sizes[:0:-1])[::-1].tolist()
+        self.choice_offsets = {
+            field: {code: i * stride for i, code in enumerate(weights[field])}
+            for field, stride in zip(self.fields, self.strides)
+        }
+
+        if table is None:
+            table = self._build()
+        elif table.shape != (self.size, len(self.COLUMNS)):
+            raise ValueError(f"Lookup table has shape {table.shape}")
+        self.table = table
+        # Flat copy for the one-answer path: indexing an array.array hands back
+        # Python floats without going through NumPy scalars.
+        self._flat = array("d", table.ravel().tolist())
+        self._offsets = tuple(self.choice_offsets[field] for field in self.fields)
+        self._answers = itemgetter(*self.fields)
+
+    @property
+    def size(self):
+        return int(np.prod(self.sizes))
+
+    def _build(self):
+        indices = np.indices(self.sizes).reshape(len(self.sizes), -1)
+        results = CarbonCalculator.calculate_weekly_checkup_batch(
+            dict(zip(self.fields, indices)), weights=self.weights
+        )
+        return np.column_stack([results[column] for column in self.COLUMNS])
+
+    def pack(self, data):
+        """Return the table index for one set of weekly answers."""
+        return sum(map(getitem, self._offsets, self._answers(data)))
+
+    def pack_batch(self, columns):
+        """Return table indices for columnar weekly answers."""
+        index = np.zeros(len(columns[self.fields[0]]), dtype=np.intp)
+        for field, stride in zip(self.fields, self.strides):
+            index += encode_choices(self.weights, field, columns[field]) * stride
+        return index
+
+    def calculate(self, data, last_week_total=None, household_size=1):
+        """Drop-in replacement for ``CarbonCalculator.calculate_weekly_checkup``."""
+        start = self.pack(data) * len(self.COLUMNS)
+        weekly_raw_total, weekly_total, home_electric_subtotal, renewable_discount = (
+            self._flat[start : start + len(self.COLUMNS)]
+        )
+
+        pct_change = None
+        if last_week_total is not None and last_week_total != 0:
+            pct_change = ((weekly_total - last_week_total) / last_week_total) * 100
+
+        monthly_estimate = weekly_total * 4
+
+        return {
+            "weekly_raw_total": weekly_raw_total,
+            "home_electric_subtotal": home_electric_subtotal,
+            "renewable_discount": renewable_discount,
+            "weekly_total": weekly_total,
+            "pct_change_from_last": pct_change,
+            "monthly_estimate": monthly_estimate,
+            "monthly_estimate_per_person": monthly_estimate / household_size,
+        }
+
+    def calculate_batch(self, columns, last_week_total=None, household_size=1):
+        """Table-backed version of ``calculate_weekly_checkup_batch``."""
+        rows = self.table[self.pack_batch(columns)]
+        weekly_total = rows[:, 1]
+
+        pct_change = percentage_change(weekly_total, last_week_total)
+        monthly_estimate = weekly_total * 4
+
+        return {
+            "weekly_raw_total": rows[:, 0],
+            "home_electric_subtotal": rows[:, 2],
+            "renewable_discount": rows[:, 3],
+            "weekly_total": weekly_total,
+            "pct_change_from_last": pct_change,
+            "monthly_estimate": monthly_estimate,
+            "monthly_estimate_per_person": monthly_estimate
+            / np.asarray(household_size, dtype=np.float64),
+        }
+
+    def verify(self, indices=None):
+        """Cross-check table rows against the scalar calculator.
+
+        Checks every row unless ``indices`` is given and returns the indices
+        whose results differ.
+        """
+        if indices is None:
+            indices = range(self.size)
+        codes = {field: list(self.weights[field]) for field in self.fields}
+
+        mismatches = []
+        for index in indices:
+            data = {
+                field: codes[field][(index // stride) % size]
+                for field, stride, size in zip(self.fields, self.strides, self.sizes)
+            }
+            expected = CarbonCalculator.calculate_weekly_checkup(
+                data, weights=self.weights
+            )
+            if any(
+                expected[column] != value
+                for column, value in zip(self.COLUMNS, self.table[index].tolist())
+            ):
+                mismatches.append(index)
+        return mismatches
+
+    @staticmethod
+    def fingerprint(weights):
+        """Short hash of a set of weekly weights, used to name saved tables."""
+        payload = json.dumps(weights, sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+    def save(self, directory):
+        path = Path(directory) / f"weekly_table_{self.fingerprint(self.weights)}.npy"
+        np.save(path, self.table)
+        return path
+
+    @classmethod
+    def load(cls, directory, weights=None):
+        """Load a saved table for the given weights, or build and save one."""
+        if weights is None:
+            weights = CarbonCalculator.WEEKLY_WEIGHTS
+        path = Path(directory) / f"weekly_table_{cls.fingerprint(weights)}.npy"
+        try:
+            return cls(weights, table=np.load(path))
+        except (OSError, ValueError):
+            compiled = cls(weights)
+            compiled.save(directory)
+            return compiled
+
+
+_compiled_weekly = None
+
+
+def compile_weekly(weights=None):
+    """Build the compiled weekly calculator for a set of weights.
+
+    If ``CARBON_TABLE_DIR`` is set the table is kept there as a ``.npy`` file
+    and loaded instead of rebuilt.
+    """
+    from django.conf import settings
+
+    directory = getattr(settings, "CARBON_TABLE_DIR", None)
+    if directory:
+        return CompiledWeeklyCalculator.load(directory, weights)
+    return CompiledWeeklyCalculator(weights)
+
+
+def compiled_weekly_calculator():
+    """Return the process-wide compiled calculator for the built-in weights."""
+    global _compiled_weekly
+    if _compiled_weekly is None:
+        _compiled_weekly = compile_weekly()
+    return _compiled_weekly
+
+
+def encode_choices(weights, field, column):
+    """Encode a column of choice codes as indices into ``weights[field]``.
+
+    Integer columns are taken to be encoded already and are only range
+    checked. Unknown codes raise ``KeyError`` like the scalar calculator.
+    """
+    import pandas as pd
+
+    choices = pd.Index(list(weights[field]))
+    if hasattr(column, "cat"):
+        column = column.cat  # pandas Series with a categorical dtype
+    if hasattr(column, "categories") and hasattr(column, "codes"):
+        # Re-map the categorical's own categories rather than every row;
+        # missing values (code -1) pick up the trailing -1.
+        remap = np.append(choices.get_indexer(column.categories), -1)
+        codes = np.asarray(column.codes)
+        indices = remap[codes]
+        labels = np.append(np.asarray(column.categories, dtype=object), None)[
+            codes[indices < 0]
+        ]
+    else:
+        if not isinstance(column, np.ndarray) or column.dtype == object:
+            # Lists of codes: one dict lookup per row, without first building
+            # a fixed-width string array. Anything unmatched (including
+            # already encoded integers) takes the array path below.
+            lookup = {code: i for i, code in enumerate(weights[field])}
+            indices = np.fromiter(
+                map(lookup.get, column, repeat(-1)), dtype=np.intp, count=len(column)
+            )
+            if indices.min(initial=0) >= 0:
+                return indices
+        array = np.asarray(column)
+        if array.dtype.kind in "iu":
+            if array.size and (array.min() < 0 or array.max() >= len(choices)):
+                raise KeyError(f"{field}: choice index out of range")
+            return array.astype(np.intp, copy=False)
+        if array.dtype.kind == "U":
+            # One binary search per row over the sorted codes, in C; cheaper
+            # than hashing each row or comparing the column once per choice
+            codes = np.array(list(weights[field]))
+            order = np.argsort(codes)
+            position = np.minimum(np.searchsorted(codes[order], array), len(codes) - 1)
+            indices = order[position]
+            indices[codes[indices] != array] = -1
+        else:
+            indices = choices.get_indexer(array)
+        labels = array[indices < 0]
+
+    if len(labels):
+        unknown = sorted({str(label) for label in labels})
+        raise KeyError(f"{field}: unknown choice(s) {', '.join(unknown)}")
+    return indices
+
+
+def _weight_vector(weights, field):
+    return np.fromiter(weights[field].values(), dtype=np.float64)
+
+
+def _choice_index(weights, field, code):
+    return list(weights[field]).index(code)
+
+
+def _initial_survey_totals(values, heating_is_elec, renewable_pct, household_size):
+    """Array form of ``calculate_initial_survey`` on gathered weight values.
+
+    The additions run in the same order as the scalar version so the
+    results match it bit for bit.
+    """
+    home_electric_subtotal = np.where(
+        heating_is_elec, values["primary_heating"], 0.0
+    ) + (
+        values["appliance_use"]
+        + values["lighting_type"]
+        + values["air_conditioning"]
+        + values["device_time"]
+    )
+
+    monthly_raw_total = (
+        values["home_type"]
+        + values["primary_heating"]
+        + values["appliance_use"]
+        + values["lighting_type"]
+        + values["air_conditioning"]
+        + values["car_type"]
+        + values["device_time"]
+        + values["flights_per_year"]
+        + values["public_transport"]
+        + values["compost_waste"]
+        + values["clothes_drying"]
+        + values["buy_secondhand"]
+    )
+
+    renewable_discount = home_electric_subtotal * (renewable_pct / 100)
+    monthly_total = monthly_raw_total - renewable_discount
+    monthly_per_person = monthly_total / household_size
+
+    return {
+        "monthly_raw_total": monthly_raw_total,
+        "home_electric_subtotal": home_electric_subtotal,
+        "renewable_discount": renewable_discount,
+        "monthly_total": monthly_total,
+        "monthly_per_person": monthly_per_person,
+    }
+
+
+def _weekly_checkup_totals(
+    values,
+    full_green,
+    partial,
+    green_opt,
+    electric_vehicle,
+    last_week_total=None,
+    household_size=1,
+):
+    """Array form of ``calculate_weekly_checkup`` on gathered weight values."""
+    weekly_raw_total = (
+        values["heating_usage"]
+        + values["appliance_usage"]
+        + values["daily_transport"]
+        + values["weekly_travel"]
+        + values["vehicle_type"]
+        + values["energy_source"]
+        + values["water_usage"]
+        + values["waste_generation"]
+        + values["weekly_consumption"]
+    )
+
+    # Renewable energy and electric vehicle bonuses
+    weekly_total = np.where(
+        full_green,
+        weekly_raw_total * 0.8,
+        np.where(partial, weekly_raw_total * 0.9, weekly_raw_total),
+    )
+    transport_component = values["daily_transport"] + values["weekly_travel"]
+    weekly_total = np.where(
+        electric_vehicle, weekly_total - transport_component * 0.15, weekly_total
+    )
+
+    pct_change = percentage_change(weekly_total, last_week_total)
+
+    monthly_estimate = weekly_total * 4
+
+    home_electric_subtotal = (
+        values["heating_usage"]
+        + values["appliance_usage"]
+        + values["energy_source"]
+        + values["water_usage"]
+    )
+    renewable_discount = np.where(
+        full_green,
+        home_electric_subtotal * 0.8,
+        np.where(
+            partial,
+            home_electric_subtotal * 0.4,
+            np.where(green_opt, home_electric_subtotal * 0.2, 0.0),
+        ),
+    )
+
+    monthly_estimate_per_person = monthly_estimate / np.asarray(
+        household_size, dtype=np.float64
+    )
+
+    return {
+        "weekly_raw_total": weekly_raw_total,
+        "home_electric_subtotal": home_electric_subtotal,
+        "renewable_discount": renewable_discount,
+        "weekly_total": weekly_total,
+        "pct_change_from_last": pct_change,
+        "monthly_estimate": monthly_estimate,
+        "monthly_estimate_per_person": monthly_estimate_per_person,
+    }
+
+
+def percentage_change(weekly_total, last_week_total):
+    """Array percentage change from last week, NaN where there is nothing to compare."""
+    if last_week_total is None:
+        return np.full(weekly_total.shape, np.nan)
+    last = np.asarray(last_week_total, dtype=np.float64)
+    valid = ~np.isnan(last) & (last != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid, ((weekly_total - last) / last) * 100, np.nan)
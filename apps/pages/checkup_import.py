@@ -0,0 +1,336 @@
+"""Bulk import of historical weekly checkups from CSV.
+
+Used by ``manage.py import_checkups`` and the checkup admin's upload page.
+Each CSV row is a ``username``, a ``date_submitted`` (an ISO date or date
+and time, in the site's time zone unless it has an offset) and the checkup
+answers as choice codes. Rows are read in batches: a batch's answers are
+validated a column at a time, scored with the batch calculator of each
+user's emission factor region and household size, and inserted in one
+transaction with ``bulk.insert_rows``.
+
+``pct_change_from_last`` follows each user's stored and imported checkups
+merged in date order, so rows may come in any order. Before a batch is
+inserted, the stored checkups around and between each user's imported dates
+are read with a few queries per chunk of users. The imported rows are
+chained to them, and stored rows whose previous checkup changed are updated
+in the same transaction. Once the rows are in, ``finish`` rebuilds the
+rollups, ranks, goals and dashboard snapshots of the users and months the
+import touched.
+"""
+
+import csv
+import itertools
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from apps.charts.goals import bulk_update_goal_progress
+from apps.charts.ranks import rebuild_month
+from apps.charts.rollups import rebuild_global_rollups, rebuild_user_rollups
+
+from . import scoring
+from .bulk import insert_rows
+from .dashboard import rebuild_snapshots
+from .emission_factors import factor_registry
+from .models import WeeklyCheckupResult
+from .recompute import WEEKLY_ANSWER_FIELDS
+
+COLUMNS = ["username", "date_submitted", *WEEKLY_ANSWER_FIELDS]
+# Table columns in the order prepared rows hold them; all of them are set
+INSERT_COLUMNS = [
+    "user_id",
+    "date_submitted",
+    *(
+        field.column
+        for field in WeeklyCheckupResult._meta.concrete_fields
+        if field.column not in ("id", "user_id", "date_submitted")
+    ),
+]
+BATCH_SIZE = 5000
+USERS_PER_CHUNK = 500
+# Up to three query parameters per user, within SQLite's limit of 999
+CHAIN_USERS = 300
+CHAIN_FIELDS = [
+    "id",
+    "user_id",
+    "date_submitted",
+    "weekly_total",
+    "pct_change_from_last",
+]
+PCT_CHANGE = INSERT_COLUMNS.index("pct_change_from_last")
+WEEKLY_TOTAL = INSERT_COLUMNS.index("weekly_total")
+
+
+class InvalidRecord(ValueError):
+    """The CSV file has no usable header, or a record is invalid and not skipped."""
+
+
+def parse_date(value):
+    """An aware datetime from an ISO date or date and time; raises ``ValueError``."""
+    date_submitted = datetime.fromisoformat(value.strip())
+    if timezone.is_naive(date_submitted):
+        date_submitted = timezone.make_aware(date_submitted)
+    return date_submitted
+
+
+class CheckupImport:
+    """One import run; feed it the CSV records a batch at a time, in file order."""
+
+    def __init__(self):
+        self.profiles = {}  # username -> UserProfile, None if it has none
+        self.user_ids = set()
+        self.months = set()
+        self.imported = 0
+        self.skipped = 0
+
+    def _load_profiles(self, usernames):
+        new = set(usernames) - set(self.profiles)
+        users = User.objects.filter(username__in=new).select_related("userprofile")
+        for user in users:
+            self.profiles[user.username] = getattr(user, "userprofile", None)
+        for username in new - {user.username for user in users}:
+            self.profiles[username] = None
+
+    def prepare(self, start, records):
+        """Validate and score one batch of records (dicts keyed by column).
+
+        ``start`` is the record number of the first one. Returns the rows to
+        insert, as lists of ``INSERT_COLUMNS`` values, and a sorted list of
+        ``(record number, message)`` errors. ``pct_change_from_last`` is set
+        when the batch is saved.
+        """
+        errors = []
+        self._load_profiles(record.get("username") or "" for record in records)
+
+        now = timezone.now()
+        dates = {}  # Imports repeat the same few dates, so parse each once
+        rows = []  # (record number, record, profile, date_submitted)
+        for number, record in enumerate(records, start):
+            profile = self.profiles[record.get("username") or ""]
+            if profile is None:
+                errors.append(
+                    (number, f"username: unknown user {record.get('username')!r}")
+                )
+                continue
+            text = record.get("date_submitted") or ""
+            if text not in dates:
+                try:
+                    dates[text] = parse_date(text)
+                except ValueError:
+                    dates[text] = None
+            date_submitted = dates[text]
+            if date_submitted is None:
+                errors.append(
+                    (number, "date_submitted: must be an ISO date or date and time")
+                )
+                continue
+            if date_submitted > now:
+                errors.append((number, "date_submitted: is in the future"))
+                continue
+            rows.append((number, record, profile, date_submitted))
+
+        # Answers are validated and scored per emission factor region
+        registry = factor_registry()
+        results = {}  # record number -> (factor set, result dict)
+        by_region = itertools.groupby(
+            sorted(rows, key=lambda row: row[2].region), key=lambda row: row[2].region
+        )
+        for region, group in by_region:
+            group = list(group)
+            factors = registry.get(region)
+            columns = scoring.records_to_columns(
+                "weekly",
+                [
+                    {**record, "household_size": profile.household_size}
+                    for _, record, profile, _ in group
+                ],
+            )
+            encoded, invalid = scoring.validate("weekly", columns, factors)
+            for row, messages in invalid.items():
+                errors.extend((group[row][0], message) for message in messages)
+            valid = np.ones(len(group), dtype=bool)
+            valid[list(invalid)] = False
+            scored = scoring.result_rows(
+                "weekly",
+                scoring.score("weekly", scoring.select_rows(encoded, valid), factors),
+            )
+            for (number, *_), result in zip(itertools.compress(group, valid), scored):
+                results[number] = (factors, result)
+
+        checkups = []
+        for number, record, profile, date_submitted in sorted(
+            (row for row in rows if row[0] in results),
+            key=lambda row: (row[2].user_id, row[3], row[0]),
+        ):
+            factors, result = results[number]
+            values = {
+                **{field: record[field] for field in WEEKLY_ANSWER_FIELDS},
+                **result,
+                "factors_region": factors.region,
+                "factors_version": factors.version,
+                "updated_at": now,
+            }
+            checkups.append(
+                [
+                    profile.user_id,
+                    date_submitted,
+                    *(values[column] for column in INSERT_COLUMNS[2:]),
+                ]
+            )
+        errors.sort()
+        return checkups, errors
+
+    def _stored(self, spans):
+        """Stored checkups around each user's ``(first, last)`` imported dates.
+
+        Returns ``{user id: latest checkup before first}`` and ``{user id:
+        [checkups from first to last, then the first one after last]}``.
+        """
+        before, following = {}, defaultdict(list)
+        user_ids = iter(sorted(spans))
+        while chunk := list(itertools.islice(user_ids, CHAIN_USERS)):
+            earlier, within, later = Q(), Q(), Q()
+            for user_id in chunk:
+                first, last = spans[user_id]
+                earlier |= Q(user_id=user_id, date_submitted__lt=first)
+                within |= Q(user_id=user_id, date_submitted__range=(first, last))
+                later |= Q(user_id=user_id, date_submitted__gt=last)
+            checkups = WeeklyCheckupResult.objects.only(*CHAIN_FIELDS)
+            for checkup in _nearest(checkups.filter(earlier), latest=True):
+                before[checkup.user_id] = checkup
+            for checkup in itertools.chain(
+                checkups.filter(within), _nearest(checkups.filter(later))
+            ):
+                following[checkup.user_id].append(checkup)
+        return before, following
+
+    def _chain(self, checkups):
+        """Set the prepared checkups' ``pct_change_from_last``.
+
+        Returns the stored checkups whose previous checkup changed, with
+        their new ``pct_change_from_last``. On the same date, imported rows
+        come after stored ones, as their ids will.
+        """
+        spans = {}
+        for user_id, date_submitted, *_ in checkups:
+            first, last = spans.get(user_id, (date_submitted, date_submitted))
+            spans[user_id] = (min(first, date_submitted), max(last, date_submitted))
+        before, following = self._stored(spans)
+
+        merged = defaultdict(list)  # user id -> [(sort key, total, row)]
+        for user_id, stored in following.items():
+            for checkup in stored:
+                key = (checkup.date_submitted, 0, checkup.id)
+                merged[user_id].append((key, checkup.weekly_total, checkup))
+        for i, checkup in enumerate(checkups):
+            key = (checkup[1], 1, i)
+            merged[checkup[0]].append((key, checkup[WEEKLY_TOTAL], checkup))
+
+        stale = []
+        now = timezone.now()
+        for user_id, rows in merged.items():
+            previous = before.get(user_id)
+            last_total = previous.weekly_total if previous else None
+            for _, weekly_total, row in sorted(rows, key=lambda row: row[0]):
+                pct_change = None
+                if last_total is not None and last_total != 0:
+                    pct_change = ((weekly_total - last_total) / last_total) * 100
+                if isinstance(row, list):
+                    row[PCT_CHANGE] = pct_change
+                elif row.pct_change_from_last != pct_change:
+                    row.pct_change_from_last = pct_change
+                    # bulk_update does not apply auto_now
+                    row.updated_at = now
+                    stale.append(row)
+                last_total = weekly_total
+        return stale
+
+    def save(self, checkups):
+        """Chain and insert prepared checkups in one transaction."""
+        with transaction.atomic():
+            stale = self._chain(checkups)
+            insert_rows(WeeklyCheckupResult, INSERT_COLUMNS, checkups)
+            WeeklyCheckupResult.objects.bulk_update(
+                stale, ["pct_change_from_last", "updated_at"], batch_size=500
+            )
+        dates = {checkup[1] for checkup in checkups}
+        self.user_ids.update(checkup[0] for checkup in checkups)
+        self.months.update(timezone.localdate(date).replace(day=1) for date in dates)
+        self.imported += len(checkups)
+
+    def finish(self):
+        """Rebuild what is derived from the imported users' checkups."""
+        if not self.user_ids:
+            return
+        user_ids = sorted(self.user_ids)
+        for i in range(0, len(user_ids), USERS_PER_CHUNK):
+            rebuild_user_rollups(user_ids[i : i + USERS_PER_CHUNK])
+        rebuild_global_rollups(min(self.months), max(self.months))
+        for month in sorted(self.months):
+            rebuild_month(month)
+        for i in range(0, len(user_ids), USERS_PER_CHUNK):
+            with transaction.atomic():
+                bulk_update_goal_progress(user_ids[i : i + USERS_PER_CHUNK])
+                rebuild_snapshots(user_ids[i : i + USERS_PER_CHUNK])
+
+
+def _nearest(queryset, latest=False):
+    """Each user's first checkup of ``queryset`` by date, or latest one."""
+    order = [F("date_submitted"), F("id")]
+    if latest:
+        order = [field.desc() for field in order]
+    return queryset.annotate(
+        nearest=Window(RowNumber(), partition_by=[F("user_id")], order_by=order)
+    ).filter(nearest=1)
+
+
+def read_batches(stream, batch_size=BATCH_SIZE):
+    """``(start, records)`` batches of a CSV stream's records, as dicts."""
+    rows = csv.reader(stream)
+    header = next(rows, None)
+    if header is None:
+        raise InvalidRecord("The CSV file is empty")
+    missing = set(COLUMNS) - set(header)
+    if missing:
+        raise InvalidRecord(f"The CSV file is missing {', '.join(sorted(missing))}")
+    start = 1
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield start, [dict(zip(header, row)) for row in batch]
+        start += len(batch)
+
+
+def import_csv(stream, batch_size=BATCH_SIZE, skip_invalid=False, report=None):
+    """Import the checkups of a CSV stream; returns the finished ``CheckupImport``.
+
+    Without ``skip_invalid`` the first invalid record raises ``InvalidRecord``;
+    batches before it stay imported. ``report`` is called with progress and
+    skipped record messages.
+    """
+    report = report or (lambda message: None)
+    run = CheckupImport()
+    started = time.monotonic()
+    try:
+        for start, records in read_batches(stream, batch_size):
+            checkups, errors = run.prepare(start, records)
+            if errors and not skip_invalid:
+                number, message = errors[0]
+                raise InvalidRecord(
+                    f"Record {number}: {message}; {run.imported} earlier records "
+                    "were imported"
+                )
+            for number, message in errors:
+                report(f"Skipping record {number}: {message}")
+            run.skipped += len({number for number, _ in errors})
+            run.save(checkups)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            report(f"  {run.imported} rows ({run.imported / elapsed:,.0f} rows/s)")
+    finally:
+        run.finish()
+    return run
@@ -0,0 +1,362 @@
+"""Dashboard data and the per-user snapshots it is served from.
+
+The dashboard only changes when a user submits a survey or checkup or edits
+a goal, so ``rebuild_snapshot`` derives everything it shows from the user's
+rows at write time and stores it in ``DashboardSnapshot``; the page renders
+from the snapshot in one query. Only what depends on the clock (days since
+the last checkup, whether the stored goal is this month's) is worked out at
+render time.
+
+``survey_dashboard_context`` is built per request in a fixed number of
+queries.
+"""
+
+import json
+from datetime import datetime
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from apps.charts.goals import current_month, goal_for_month
+from apps.charts.models import CarbonGoal, UserWeekRollup
+
+from .history import encode_cursor
+from .models import DashboardSnapshot, InitialSurveyResult, WeeklyCheckupResult
+
+SNAPSHOT_VERSION = 2
+RECENT_CHECKUPS = 12
+RECENT_WEEKS = 6
+
+
+def latest_initial_survey(user):
+    return (
+        InitialSurveyResult.objects.filter(user=user)
+        .order_by("-date_submitted", "-id")
+        .first()
+    )
+
+
+def recent_checkups(user, count=RECENT_CHECKUPS):
+    """The user's latest weekly checkups, newest first, as a list."""
+    return list(
+        WeeklyCheckupResult.objects.filter(user=user).order_by(
+            "-date_submitted", "-id"
+        )[:count]
+    )
+
+
+def recent_weeks(user, count=RECENT_WEEKS):
+    """The user's latest weekly rollups, newest first, as a list."""
+    return list(UserWeekRollup.objects.filter(user=user).order_by("-week")[:count])
+
+
+def week_over_week(checkups):
+    """Percentage change of each checkup from the one before it.
+
+    ``checkups`` are newest first; the oldest one, and any following a zero
+    total, has no change.
+    """
+    changes = []
+    for checkup, previous in zip(checkups, [*checkups[1:], None]):
+        pct_change = None
+        if previous is not None and previous.weekly_total > 0:
+            pct_change = (
+                (checkup.weekly_total - previous.weekly_total) / previous.weekly_total
+            ) * 100
+        changes.append(pct_change)
+    return changes
+
+
+def goal_progress(current, target, baseline):
+    """Progress from the baseline towards the goal's target, 0-100.
+
+    ``target`` is None without a goal for the month and ``baseline`` is None
+    without an initial survey.
+    """
+    progress = 0
+    if target and target > 0 and current >= 0 and baseline is not None:
+        # Check if current usage is at or below target (achieved goal)
+        if current <= target:
+            progress = 100
+        # Check if current usage exceeds baseline (no progress)
+        elif current >= baseline:
+            progress = 0
+        # Calculate progress for values between baseline and target
+        else:
+            total_reduction_needed = baseline - target
+            reduction_achieved = baseline - current
+            progress = (reduction_achieved / total_reduction_needed) * 100
+            progress = max(0, min(100, progress))
+    elif baseline is not None and current > 0:
+        # Fall back to simple baseline comparison if no goal is set
+        if current >= baseline:
+            progress = 0
+        else:
+            reduction = baseline - current
+            progress = min(100, (reduction / baseline) * 100)
+    return progress
+
+
+def _relative_week(weeks_ago):
+    if weeks_ago == 0:
+        return "This Week"
+    if weeks_ago == 1:
+        return "Last Week"
+    return f"{weeks_ago} Weeks Ago"
+
+
+def dashboard_data(initial_survey, checkups, weeks, current_goal):
+    """JSON-serializable dashboard data from a user's rows.
+
+    ``checkups`` are the latest ``RECENT_CHECKUPS`` checkups and ``weeks``
+    the latest ``RECENT_WEEKS`` weekly rollups, both newest first, and
+    ``current_goal`` the goal for the current month, if any.
+    """
+    latest_checkup = checkups[0] if checkups else None
+
+    # Area chart data - last 7 weekly checkups in chronological order
+    last_7_checkups = checkups[:7][::-1]
+    area_chart_data = None
+    if last_7_checkups:
+        area_chart_data = {
+            "labels": [
+                checkup.date_submitted.strftime("%b %d") for checkup in last_7_checkups
+            ],
+            "weekly_totals": [
+                float(checkup.weekly_total) for checkup in last_7_checkups
+            ],
+            "monthly_estimates": [
+                float(checkup.monthly_estimate) for checkup in last_7_checkups
+            ],
+        }
+
+    # Previous results for table, with the change from the checkup before each
+    previous_results = [
+        {
+            "date": checkup.date_submitted.isoformat(),
+            "carbon": checkup.weekly_total,
+            "pct_change": pct_change,
+            "monthly_est": checkup.monthly_estimate,
+        }
+        for checkup, pct_change in zip(checkups, week_over_week(checkups))
+    ]
+
+    # Carbon usage chart - the average of the most recent 6 weeks with checkups
+    recent = weeks[::-1]
+    monthly_data = [
+        {
+            "month": _relative_week(len(recent) - i - 1),
+            "average": float(week.weekly_total_mean),
+        }
+        for i, week in enumerate(recent)
+    ]
+
+    goal = None
+    if current_goal:
+        goal = {
+            "month": current_goal.month.isoformat(),
+            "target_amount": current_goal.target_amount,
+            "current_amount": current_goal.current_amount,
+        }
+
+    return {
+        "baseline": float(initial_survey.monthly_total) if initial_survey else None,
+        "latest_checkup_at": latest_checkup.date_submitted.isoformat()
+        if latest_checkup
+        else None,
+        "area_chart_data": area_chart_data,
+        "previous_results": previous_results,
+        "current_usage": {
+            "weekly_total": latest_checkup.weekly_total if latest_checkup else 0,
+            "monthly_estimate": latest_checkup.monthly_estimate
+            if latest_checkup
+            else 0,
+            "pct_change": previous_results[0]["pct_change"]
+            if previous_results
+            else None,
+        },
+        "monthly_data": monthly_data,
+        "goal": goal,
+    }
+
+
+def load_dashboard_data(user):
+    """Build a user's dashboard data from their rows (four queries)."""
+    return dashboard_data(
+        latest_initial_survey(user),
+        recent_checkups(user),
+        recent_weeks(user),
+        goal_for_month(user),
+    )
+
+
+def bulk_dashboard_data(user_ids):
+    """Dashboard data for many users at once, in four queries."""
+    initial_surveys = {}
+    for survey in InitialSurveyResult.objects.filter(user_id__in=user_ids).order_by(
+        "user_id", "-date_submitted", "-id"
+    ):
+        initial_surveys.setdefault(survey.user_id, survey)
+
+    checkups = {user_id: [] for user_id in user_ids}
+    for checkup in (
+        WeeklyCheckupResult.objects.filter(user_id__in=user_ids)
+        .annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=[F("user_id")],
+                # Same order as recent_checkups, ties included
+                order_by=[F("date_submitted").desc(), F("id").desc()],
+            )
+        )
+        .filter(recency__lte=RECENT_CHECKUPS)
+        .order_by("user_id", "-date_submitted", "-id")
+    ):
+        checkups[checkup.user_id].append(checkup)
+
+    weeks = {user_id: [] for user_id in user_ids}
+    for week in (
+        UserWeekRollup.objects.filter(user_id__in=user_ids)
+        .annotate(
+            recency=Window(
+                RowNumber(), partition_by=[F("user_id")], order_by=F("week").desc()
+            )
+        )
+        .filter(recency__lte=RECENT_WEEKS)
+        .order_by("user_id", "-week")
+    ):
+        weeks[week.user_id].append(week)
+
+    goals = {
+        goal.user_id: goal
+        for goal in CarbonGoal.objects.filter(
+            user_id__in=user_ids, month=current_month()
+        )
+    }
+
+    return {
+        user_id: dashboard_data(
+            initial_surveys.get(user_id),
+            checkups[user_id],
+            weeks[user_id],
+            goals.get(user_id),
+        )
+        for user_id in user_ids
+    }
+
+
+def rebuild_snapshot(user):
+    """Rebuild a user's dashboard snapshot; call after writing its inputs."""
+    data = load_dashboard_data(user)
+    DashboardSnapshot.objects.update_or_create(
+        user=user, defaults={"version": SNAPSHOT_VERSION, "data": data}
+    )
+    return data
+
+
+def rebuild_snapshots(user_ids):
+    """Rebuild many users' dashboard snapshots in a fixed number of queries."""
+    data = bulk_dashboard_data(user_ids)
+    DashboardSnapshot.objects.bulk_create(
+        [
+            DashboardSnapshot(
+                user_id=user_id, version=SNAPSHOT_VERSION, data=data[user_id]
+            )
+            for user_id in user_ids
+        ],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["version", "data", "built_at"],
+    )
+
+
+def snapshot_data(user):
+    """The user's stored dashboard data, or freshly built data without storing it.
+
+    Users without a current snapshot get one from the consistency command;
+    building here would turn a read into a write.
+    """
+    snapshot = (
+        DashboardSnapshot.objects.filter(user=user, version=SNAPSHOT_VERSION)
+        .only("data")
+        .first()
+    )
+    if snapshot is not None:
+        return snapshot.data
+    return load_dashboard_data(user)
+
+
+def index_context(data, now=None, cohort=None):
+    """Template context for the dashboard from its (snapshot) data.
+
+    ``cohort`` is the ``CohortStats`` of the user's cohort this month, if any.
+    """
+    now = now or timezone.now()
+    latest_checkup_at = data["latest_checkup_at"] and datetime.fromisoformat(
+        data["latest_checkup_at"]
+    )
+    time_since_last = (now - latest_checkup_at).days if latest_checkup_at else None
+
+    # A goal for an earlier month no longer counts after the month rolls over
+    goal = data["goal"]
+    if goal and goal["month"] != current_month().isoformat():
+        goal = None
+
+    current = (
+        float(data["current_usage"]["monthly_estimate"]) if latest_checkup_at else 0
+    )
+    progress = goal_progress(
+        current, goal["target_amount"] if goal else None, data["baseline"]
+    )
+    baseline = data["baseline"]
+
+    return {
+        "initial_survey": {"monthly_total": baseline} if baseline is not None else None,
+        "area_chart_data": json.dumps(data["area_chart_data"])
+        if data["area_chart_data"]
+        else None,
+        "previous_results": [
+            {**result, "date": datetime.fromisoformat(result["date"])}
+            for result in data["previous_results"]
+        ],
+        "current_usage": data["current_usage"],
+        "time_since_last": time_since_last or 0,
+        "days_until_next": max(0, 7 - (time_since_last or 0)),
+        "monthly_data": json.dumps(data["monthly_data"])
+        if data["monthly_data"]
+        else None,
+        "cohort_average": json.dumps(cohort.weekly_total_mean) if cohort else None,
+        "goal_progress": round(progress, 1),
+        "show_estimator": baseline is None or not latest_checkup_at,
+        "current_goal": goal,
+    }
+
+
+def survey_dashboard_context(user):
+    """Context for the survey dashboard: two queries."""
+    initial_survey = latest_initial_survey(user)
+    checkups = recent_checkups(user)
+    chronological = checkups[::-1]
+    return {
+        "initial_survey": initial_survey,
+        "weekly_checkups": checkups,
+        # Older checkups are fetched from the history endpoint on scroll
+        "history_cursor": (
+            encode_cursor(checkups[-1]) if len(checkups) == RECENT_CHECKUPS else None
+        ),
+        "chart_data": {
+            "labels": json.dumps(
+                [
+                    checkup.date_submitted.strftime("%Y-%m-%d")
+                    for checkup in chronological
+                ]
+            ),
+            "weekly_totals": json.dumps(
+                [float(checkup.weekly_total or 0) for checkup in chronological]
+            ),
+            "monthly_estimates": json.dumps(
+                [float(checkup.monthly_estimate or 0) for checkup in chronological]
+            ),
+        },
+    }
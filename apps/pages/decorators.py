@@ -1,16 +1,14 @@
 from django.shortcuts import redirect
 from functools import wraps
-from .models import UserProfile
+from .user_context import user_context
 
 
 def onboarding_required(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        try:
-            profile = UserProfile.objects.get(user=request.user)
-            if not profile.onboarding_completed:
-                return redirect("onboarding")
-        except UserProfile.DoesNotExist:
+        # Loads the profile and baseline survey once for the whole request
+        profile = user_context(request).profile
+        if profile is None or not profile.onboarding_completed:
             return redirect("onboarding")
         return view_func(request, *args, **kwargs)
 
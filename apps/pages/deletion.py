@@ -0,0 +1,146 @@
+"""Bulk deletion of users and everything stored for them.
+
+Used by ``manage.py delete_user``. The preview counts the rows of each
+user-owned table with one grouped query per chunk of users, not a few
+queries per user. Deletion runs a raw ``DELETE ... WHERE <user column> IN
+(...)`` per table and chunk of users, one short transaction per chunk. The
+ORM cascade would load every related row into memory first.
+
+The global month rollups, rank buckets and cohort statistics aggregate over
+all users, so the months the deleted users contributed to are rebuilt
+afterwards with ``rebuild_aggregates``.
+"""
+
+import itertools
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from apps.charts.cohorts import compute_month
+from apps.charts.models import CohortStats, RankEntry
+from apps.charts.ranks import rebuild_month
+from apps.charts.rollups import rebuild_global_rollups
+
+from .models import WeeklyCheckupResult
+
+CHUNK_SIZE = 500
+
+
+def user_tables():
+    """``(model, user column)`` of every table with rows belonging to a user.
+
+    Found from the relations of ``User``, so tables added later are covered.
+    Rows are deleted directly, so the relations must cascade and nothing may
+    point at the rows in turn.
+    """
+    tables = []
+    for field in User._meta.get_fields():
+        if field.many_to_many and field.concrete:
+            through = field.remote_field.through
+            tables.append(
+                (through, through._meta.get_field(field.m2m_field_name()).column)
+            )
+        elif (field.one_to_many or field.one_to_one) and field.auto_created:
+            if field.on_delete is not models.CASCADE or any(
+                related.auto_created and not related.concrete
+                for related in field.related_model._meta.get_fields()
+            ):
+                raise ValueError(
+                    f"{field.related_model.__name__} rows cannot be deleted directly"
+                )
+            tables.append((field.related_model, field.field.column))
+    return tables
+
+
+def chunks(user_ids, chunk_size):
+    """Lists of up to ``chunk_size`` of ``user_ids``."""
+    user_ids = iter(user_ids)
+    while chunk := list(itertools.islice(user_ids, chunk_size)):
+        yield chunk
+
+
+def preview(user_ids, chunk_size=CHUNK_SIZE):
+    """``{model: {user id: rows}}`` of what deleting the users would remove."""
+    tables = user_tables()
+    counts = {model: Counter() for model, _ in tables}
+    for chunk in chunks(user_ids, chunk_size):
+        for model, column in tables:
+            rows = (
+                model.objects.filter(**{f"{column}__in": chunk})
+                .values_list(column)
+                .annotate(rows=Count("*"))
+                .order_by()
+            )
+            counts[model].update(dict(rows))
+    return counts
+
+
+def affected_months(user_ids, chunk_size=CHUNK_SIZE):
+    """The aggregates the users' rows count towards, to rebuild after deleting.
+
+    Returns the first and last month of their checkups (None without any)
+    and the months they are ranked in.
+    """
+    first = last = None
+    rank_months = set()
+    for chunk in chunks(user_ids, chunk_size):
+        span = WeeklyCheckupResult.objects.filter(user_id__in=chunk).aggregate(
+            first=Min("date_submitted"), last=Max("date_submitted")
+        )
+        if span["first"] is not None:
+            first = min(first or span["first"], span["first"])
+            last = max(last or span["last"], span["last"])
+        rank_months.update(
+            RankEntry.objects.filter(user_id__in=chunk)
+            .values_list("month", flat=True)
+            .distinct()
+        )
+    return first, last, rank_months
+
+
+def delete_users(user_ids, chunk_size=CHUNK_SIZE, progress=None):
+    """Delete the users and their rows a chunk at a time; returns ``{model: rows}``.
+
+    ``progress`` is called after each chunk with the users and rows deleted
+    so far and the seconds elapsed.
+    """
+    tables = [*user_tables(), (User, "id")]
+    quote = connection.ops.quote_name
+    deleted = Counter()
+    users = 0
+    started = time.monotonic()
+    for chunk in chunks(user_ids, chunk_size):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model, column in tables:
+                cursor.execute(
+                    f"DELETE FROM {quote(model._meta.db_table)} "
+                    f"WHERE {quote(column)} IN ({placeholders})",
+                    chunk,
+                )
+                deleted[model] += cursor.rowcount
+        users += len(chunk)
+        if progress:
+            progress(users, sum(deleted.values()), time.monotonic() - started)
+    return deleted
+
+
+def rebuild_aggregates(first, last, rank_months):
+    """Rebuild what aggregates over all users for the months from ``affected_months``."""
+    if first is not None:
+        first_month = timezone.localdate(first).replace(day=1)
+        last_month = timezone.localdate(last).replace(day=1)
+        rebuild_global_rollups(first_month, last_month)
+        # Only months whose statistics were computed before
+        for month in (
+            CohortStats.objects.filter(month__gte=first_month, month__lte=last_month)
+            .values_list("month", flat=True)
+            .distinct()
+        ):
+            compute_month(month)
+    for month in sorted(rank_months):
+        rebuild_month(month)
@@ -0,0 +1,228 @@
+"""Per-region emission factor sets.
+
+``CarbonCalculator.MONTHLY_WEIGHTS``/``WEEKLY_WEIGHTS`` are the built-in
+``default`` region. Other regions are JSON files in
+``settings.EMISSION_FACTORS_DIR`` named ``<region>.json``::
+
+    {
+        "version": 2,
+        "monthly": {"primary_heating": {"ELEC": 4.5}},
+        "weekly": {"energy_source": {"STANDARD": 12.0}}
+    }
+
+Files only need the weights that differ from the built-in ones; every field
+and choice code must exist in the built-in weights. ``default.json`` may
+override the built-in region itself. Bump a file's version whenever its
+weights change. A file's weights are merged over the built-in ones, so the
+version stamped on results combines both: ``FACTORS_VERSION * 1000 + file
+version``. Changing either re-scores the region's results.
+
+Sets are compiled once per process and reloaded when the file's mtime
+changes. The file is stat'ed at most every ``EMISSION_FACTORS_CHECK_INTERVAL``
+seconds, so a lookup on the request path is a dict access and a clock read.
+"""
+
+import copy
+import json
+import logging
+import time
+from functools import cached_property
+from pathlib import Path
+
+from .carbon_calculator import (
+    CarbonCalculator,
+    compile_weekly,
+    compiled_weekly_calculator,
+)
+from .uncertainty import FootprintUncertainty
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = "default"
+# File versions stay below this so they fit beside the built-in version
+FILE_VERSIONS = 1000
+
+
+class FactorSet:
+    """The monthly and weekly weights used for one region."""
+
+    def __init__(self, region, version, monthly, weekly):
+        self.region = region
+        self.version = version
+        self.monthly = monthly
+        self.weekly = weekly
+
+    def __repr__(self):
+        return f"<FactorSet {self.region} v{self.version}>"
+
+    @cached_property
+    def compiled_weekly(self):
+        if self.weekly is CarbonCalculator.WEEKLY_WEIGHTS:
+            return compiled_weekly_calculator()
+        return compile_weekly(self.weekly)
+
+    @cached_property
+    def uncertainty(self):
+        """Monte Carlo bands for totals scored with this set."""
+        return FootprintUncertainty(self)
+
+    @property
+    def stamp(self):
+        """Fields identifying this set on stored results."""
+        return {"factors_region": self.region, "factors_version": self.version}
+
+    def calculate_initial_survey(self, data):
+        return CarbonCalculator.calculate_initial_survey(data, self.monthly)
+
+    def calculate_weekly_checkup(self, data, last_week_total=None, household_size=1):
+        # One answer is scored faster by the scalar path than by the table
+        return CarbonCalculator.calculate_weekly_checkup(
+            data, last_week_total, household_size, self.weekly
+        )
+
+
+BUILTIN_FACTORS = FactorSet(
+    DEFAULT_REGION,
+    CarbonCalculator.FACTORS_VERSION,
+    CarbonCalculator.MONTHLY_WEIGHTS,
+    CarbonCalculator.WEEKLY_WEIGHTS,
+)
+
+
+def _merge_weights(base, overrides, name):
+    if not isinstance(overrides, dict):
+        raise TypeError(f"'{name}' must be an object")
+    merged = copy.deepcopy(base)
+    for field, choices in overrides.items():
+        if field not in base:
+            raise ValueError(f"Unknown {name} field '{field}'")
+        if not isinstance(choices, dict):
+            raise TypeError(f"'{name}.{field}' must be an object")
+        for code, weight in choices.items():
+            if code not in base[field]:
+                raise ValueError(f"Unknown choice '{code}' for {name} field '{field}'")
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                raise TypeError(f"Weight for {name}.{field}.{code} must be a number")
+            merged[field][code] = weight
+    return merged
+
+
+def region_version(file_version):
+    """The version stamped on results of a region file with ``file_version``."""
+    return CarbonCalculator.FACTORS_VERSION * FILE_VERSIONS + file_version
+
+
+def load_factor_set(region, path):
+    """Read and validate a region file.
+
+    Raises ``ValueError`` or ``TypeError`` if the file is not a valid set.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    version = data.get("version")
+    if (
+        isinstance(version, bool)
+        or not isinstance(version, int)
+        or not 1 <= version < FILE_VERSIONS
+    ):
+        raise ValueError(f"'version' must be an integer from 1 to {FILE_VERSIONS - 1}")
+    return FactorSet(
+        region,
+        region_version(version),
+        _merge_weights(
+            CarbonCalculator.MONTHLY_WEIGHTS, data.get("monthly", {}), "monthly"
+        ),
+        _merge_weights(
+            CarbonCalculator.WEEKLY_WEIGHTS, data.get("weekly", {}), "weekly"
+        ),
+    )
+
+
+class FactorRegistry:
+    """Loads region factor sets on demand and reloads them when files change."""
+
+    def __init__(self, directory=None, check_interval=2.0):
+        self.directory = Path(directory) if directory else None
+        self.check_interval = check_interval
+        # region -> (next_check, mtime, factor_set)
+        self._entries = {}
+
+    def get(self, region=DEFAULT_REGION):
+        """Return the factor set for ``region``.
+
+        Unknown regions fall back to the default set; a file that fails to
+        load keeps serving the last good version.
+        """
+        entry = self._entries.get(region)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[2]
+        return self._refresh(region or DEFAULT_REGION, entry)
+
+    def _refresh(self, region, entry):
+        path = self._path(region)
+        try:
+            mtime = path.stat().st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+
+        if entry is not None and entry[1] == mtime:
+            factor_set = entry[2]
+        elif mtime is None:
+            factor_set = BUILTIN_FACTORS
+            if region != DEFAULT_REGION:
+                factor_set = self.get(DEFAULT_REGION)
+                logger.warning(
+                    "No emission factors for region %r, using default", region
+                )
+        else:
+            try:
+                factor_set = load_factor_set(region, path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.error("Could not load emission factors from %s: %s", path, e)
+                if entry is not None:
+                    factor_set = entry[2]
+                elif region != DEFAULT_REGION:
+                    factor_set = self.get(DEFAULT_REGION)
+                else:
+                    factor_set = BUILTIN_FACTORS
+
+        self._entries[region] = (
+            time.monotonic() + self.check_interval,
+            mtime,
+            factor_set,
+        )
+        return factor_set
+
+    def _path(self, region):
+        if self.directory is None:
+            return None
+        return self.directory / f"{region}.json"
+
+    def regions(self):
+        """Names of all configured regions, default first."""
+        found = set()
+        if self.directory is not None and self.directory.is_dir():
+            found = {path.stem for path in self.directory.glob("*.json")}
+        found.discard(DEFAULT_REGION)
+        return [DEFAULT_REGION, *sorted(found)]
+
+
+_registry = None
+
+
+def factor_registry():
+    """Return the process-wide factor registry configured from settings."""
+    global _registry
+    if _registry is None:
+        from django.conf import settings
+
+        _registry = FactorRegistry(
+            getattr(settings, "EMISSION_FACTORS_DIR", None),
+            getattr(settings, "EMISSION_FACTORS_CHECK_INTERVAL", 2.0),
+        )
+    return _registry
+
+
+def factors_for(profile):
+    """Return the factor set for a ``UserProfile``'s region."""
+    return factor_registry().get(profile.region)
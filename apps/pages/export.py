@@ -0,0 +1,66 @@
+"""CSV export of a user's initial surveys and weekly checkups.
+
+Exports are streamed. The header is sent before any query runs, and rows
+are then read oldest first in keyset chunks of ``CHUNK_SIZE``, each a fresh
+query on the user's ``(date_submitted, id)`` index. Memory stays flat
+however long the history is, and no database cursor is held open while a
+slow client reads.
+"""
+
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import InitialSurveyResult, WeeklyCheckupResult
+
+EXPORTS = {"initial": InitialSurveyResult, "weekly": WeeklyCheckupResult}
+CHUNK_SIZE = 2000
+
+
+def export_fields(model):
+    """The exported columns: every field but the row and user ids."""
+    return [
+        field.name
+        for field in model._meta.concrete_fields
+        if field.name not in ("id", "user")
+    ]
+
+
+class _Echo:
+    """File-like object handing back what is written, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(user, kind, chunk_size=CHUNK_SIZE):
+    """Yield the CSV text of the user's results of ``kind``, a chunk at a time."""
+    model = EXPORTS[kind]
+    fields = export_fields(model)
+    date_column = fields.index("date_submitted")
+    writer = csv.writer(_Echo(), lineterminator="\n")
+    yield writer.writerow(fields)
+
+    rows = model.objects.filter(user=user).order_by("date_submitted", "id")
+    chunk = rows
+    while True:
+        page = list(chunk.values_list(*fields, "id")[:chunk_size])
+        if not page:
+            return
+        yield "".join(writer.writerow(row[:-1]) for row in page)
+        # The next chunk starts after the last row of this one
+        date_submitted, row_id = page[-1][date_column], page[-1][-1]
+        chunk = rows.filter(date_submitted__gte=date_submitted).exclude(
+            date_submitted=date_submitted, id__lte=row_id
+        )
+
+
+def csv_response(user, kind):
+    """A streaming download of the user's results of ``kind``."""
+    response = StreamingHttpResponse(
+        export_rows(user, kind), content_type="text/csv; charset=utf-8"
+    )
+    filename = f"ecotrack-{kind}-{timezone.localdate():%Y-%m-%d}.csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
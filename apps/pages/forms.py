@@ -1,11 +1,18 @@
 from django import forms
+from .emission_factors import DEFAULT_REGION, factor_registry
 from .models import InitialSurveyResult, WeeklyCheckupResult, UserProfile
 
 
 class UserOnboardingForm(forms.ModelForm):
     class Meta:
         model = UserProfile
-        fields = ["display_name", "household_size", "house_type", "carbon_goal"]
+        fields = [
+            "display_name",
+            "household_size",
+            "house_type",
+            "region",
+            "carbon_goal",
+        ]
         widgets = {
             "display_name": forms.TextInput(
                 attrs={"class": "form-control", "placeholder": "Name"}
@@ -27,6 +34,22 @@ class UserOnboardingForm(forms.ModelForm):
             ),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Regions come from the emission factor files, not fixed model choices
+        self.fields["region"] = forms.ChoiceField(
+            choices=[
+                (region, region.replace("_", " ").title())
+                for region in factor_registry().regions()
+            ],
+            initial=self.instance.region,
+            required=False,
+            widget=forms.Select(attrs={"class": "form-control"}),
+        )
+
+    def clean_region(self):
+        return self.cleaned_data.get("region") or DEFAULT_REGION
+
     def clean_household_size(self):
         household_size = self.cleaned_data.get("household_size")
         if household_size is None or household_size < 1:
@@ -46,6 +69,8 @@ class InitialSurveyForm(forms.ModelForm):
             "monthly_per_person",
             "household_size",
             "home_type",
+            "factors_region",
+            "factors_version",
         ]
         widgets = {
             "primary_heating": forms.Select(attrs={"class": "form-control"}),
@@ -89,6 +114,8 @@ class WeeklyCheckupForm(forms.ModelForm):
             "home_electric_subtotal",
             "renewable_discount",
             "monthly_estimate_per_person",
+            "factors_region",
+            "factors_version",
         ]
         widgets = {
             "heating_usage": forms.Select(attrs={"class": "form-control"}),
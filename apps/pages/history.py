@@ -0,0 +1,70 @@
+"""A user's full weekly checkup history, newest first, one page at a time.
+
+Pages are cut by keyset cursors: a cursor is the ``(date_submitted, id)``
+of the last checkup of the previous page, and the next page is read from
+the ``checkup_user_history`` index starting just below it. Page N therefore
+costs the same as page 1, however long the history.
+"""
+
+import base64
+from datetime import datetime
+
+from django.utils import timezone
+
+from .models import WeeklyCheckupResult
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+FIELDS = ["date", "weekly_total", "monthly_estimate", "pct_change_from_last"]
+
+
+def encode_cursor(checkup):
+    key = f"{checkup.date_submitted.isoformat()}|{checkup.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """``(date_submitted, id)`` from a cursor; raises ``ValueError`` if invalid."""
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_submitted, checkup_id = key.split("|")
+        return datetime.fromisoformat(date_submitted), int(checkup_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def history_page(user, cursor=None, size=PAGE_SIZE):
+    """One page of the user's checkups as compact JSON data.
+
+    Rows are arrays in ``FIELDS`` order; ``next`` is the cursor of the
+    following page, or None on the last one.
+    """
+    checkups = WeeklyCheckupResult.objects.filter(user=user).order_by(
+        "-date_submitted", "-id"
+    )
+    if cursor is not None:
+        date_submitted, checkup_id = decode_cursor(cursor)
+        checkups = checkups.filter(date_submitted__lte=date_submitted).exclude(
+            date_submitted=date_submitted, id__gte=checkup_id
+        )
+    # One extra row tells whether there is a next page
+    page = list(
+        checkups.only(
+            "date_submitted", "weekly_total", "monthly_estimate", "pct_change_from_last"
+        )[: size + 1]
+    )
+    more = len(page) > size
+    page = page[:size]
+    return {
+        "fields": FIELDS,
+        "rows": [
+            [
+                timezone.localtime(checkup.date_submitted).strftime("%Y-%m-%d"),
+                checkup.weekly_total,
+                checkup.monthly_estimate,
+                checkup.pct_change_from_last,
+            ]
+            for checkup in page
+        ],
+        "next": encode_cursor(page[-1]) if more else None,
+    }
@@ -0,0 +1,100 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Runs microbenchmarks and optionally compares them against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "suites",
+            nargs="*",
+            help=f"Suites to run (default: all). Available: {', '.join(benchmarks.SUITES)}",
+        )
+        parser.add_argument(
+            "--calls", type=int, default=20000, help="Timed calls per scalar case"
+        )
+        parser.add_argument(
+            "--batch-calls", type=int, default=50, help="Timed calls per batch case"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=10000, help="Rows per batch call"
+        )
+        parser.add_argument(
+            "--scale",
+            type=int,
+            default=1,
+            help=(
+                "Multiplies the rank suite's users and the export suite's longest "
+                "history, 10000 each at scale 1; use 100 for production size"
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--filter", default="", help="Only run cases whose name contains this"
+        )
+        parser.add_argument("--output", help="Write results as JSON to this file")
+        parser.add_argument("--baseline", help="JSON results file to compare against")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.10,
+            help="Allowed throughput drop against the baseline (default 0.10)",
+        )
+
+    def handle(self, *args, **options):
+        names = options["suites"] or list(benchmarks.SUITES)
+        unknown = [name for name in names if name not in benchmarks.SUITES]
+        if unknown:
+            raise CommandError(f"Unknown suite(s): {', '.join(unknown)}")
+
+        results = {}
+        for name in names:
+            for case in benchmarks.SUITES[name](options):
+                try:
+                    if options["filter"] not in case.name:
+                        continue
+                    calls = case.calls or (
+                        options["batch_calls"] if case.batch else options["calls"]
+                    )
+                    result = benchmarks.run_case(case, calls)
+                finally:
+                    if case.cleanup:
+                        case.cleanup()
+                results[case.name] = result
+                self.stdout.write(
+                    f"{case.name:<40} {result['ops_per_sec']:>12,.0f} ops/s "
+                    f"{result['rows_per_sec']:>14,.0f} rows/s "
+                    f"p50 {result['p50_us']:>10.2f}us p99 {result['p99_us']:>10.2f}us "
+                    f"peak {result['peak_bytes_per_call']:>12,.0f}B"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(
+                    {"environment": benchmarks.environment(), "results": results},
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options["baseline"]:
+            baseline = benchmarks.load_results(options["baseline"])
+            ratios, regressions = benchmarks.compare(
+                results, baseline, options["tolerance"]
+            )
+            for name, ratio in ratios:
+                style = (
+                    self.style.ERROR
+                    if ratio < 1 - options["tolerance"]
+                    else self.style.SUCCESS
+                )
+                self.stdout.write(style(f"{name:<40} {ratio:>6.2f}x baseline"))
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} case(s) regressed more than "
+                    f"{options['tolerance']:.0%} against the baseline"
+                )
@@ -0,0 +1,249 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages import scoring
+from apps.pages.emission_factors import DEFAULT_REGION, FactorSet, factor_registry
+
+STAMP_FIELDS = ["factors_region", "factors_version"]
+_worker_factors = {}
+
+
+def score_batch(kind, fmt, spec, header, start, items):
+    """Parse, validate and score one batch of records.
+
+    Runs in worker processes, so it only takes picklable arguments: the
+    factor set is passed as ``(region, version, monthly, weekly)``.
+    ``items`` are raw NDJSON lines or parsed CSV rows, ``start`` is the
+    record number of the first one. Returns the formatted output text, the
+    number of rows written and a list of ``(record number, message)`` errors.
+    """
+    factors = _worker_factors.get(spec[:2])
+    if factors is None:
+        factors = _worker_factors[spec[:2]] = FactorSet(*spec)
+
+    records, errors = [], []
+    if fmt == "csv":
+        records = [dict(zip(header, row)) for row in items]
+    else:
+        for number, line in enumerate(items, start):
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = None
+                errors.append((number, f"invalid JSON: {e}"))
+            else:
+                if not isinstance(record, dict):
+                    record = None
+                    errors.append((number, "expected a JSON object"))
+            records.append(record)
+
+    parsed = [record for record in records if record is not None]
+    numbers = [
+        number for number, record in enumerate(records, start) if record is not None
+    ]
+    encoded, invalid = scoring.validate(
+        kind, scoring.records_to_columns(kind, parsed), factors
+    )
+    for row, messages in invalid.items():
+        errors.extend((numbers[row], message) for message in messages)
+    errors.sort()
+
+    valid = np.ones(len(parsed), dtype=bool)
+    valid[list(invalid)] = False
+    results = scoring.result_rows(
+        kind, scoring.score(kind, scoring.select_rows(encoded, valid), factors)
+    )
+    stamp = {"factors_region": factors.region, "factors_version": factors.version}
+    scored = [
+        {**record, **result, **stamp}
+        for record, result in zip(itertools.compress(parsed, valid), results)
+    ]
+
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        fields = [*scoring.RESULT_FIELDS[kind], *STAMP_FIELDS]
+        writer.writerows(
+            [*(record.get(name) for name in header), *(record[name] for name in fields)]
+            for record in scored
+        )
+        text = out.getvalue()
+    else:
+        text = "".join(json.dumps(record) + "\n" for record in scored)
+    return text, len(scored), errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Scores survey answers streamed as NDJSON or CSV and writes them with "
+        "their results to stdout"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "kind",
+            choices=scoring.KINDS,
+            help="Whether records are initial survey or weekly checkup answers",
+        )
+        parser.add_argument(
+            "input",
+            nargs="?",
+            default="-",
+            help="Input file, optionally gzipped; '-' or omitted reads stdin",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "csv"],
+            help="Input and output format (default: from the file extension, "
+            "otherwise ndjson)",
+        )
+        parser.add_argument(
+            "--region",
+            default=DEFAULT_REGION,
+            help="Emission factor region to score with (default: default)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Records scored per batch (default 10000)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Scoring processes; 0 (default) scores in this process",
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Report invalid records on stderr and carry on instead of stopping",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        path = options["input"]
+        fmt = options["format"] or (
+            "csv" if path.removesuffix(".gz").endswith(".csv") else "ndjson"
+        )
+        factors = factor_registry().get(options["region"])
+        spec = (factors.region, factors.version, factors.monthly, factors.weekly)
+
+        stream = self.open(path)
+        try:
+            header, batches = self.batches(stream, fmt, options["kind"], options)
+            if fmt == "csv":
+                writer = csv.writer(self.stdout, lineterminator="\n")
+                writer.writerow(
+                    [*header, *scoring.RESULT_FIELDS[options["kind"]], *STAMP_FIELDS]
+                )
+            self.run(options["kind"], fmt, spec, header, batches, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def open(self, path):
+        try:
+            if path == "-":
+                return sys.stdin
+            if path.endswith(".gz"):
+                return gzip.open(path, "rt", newline="")
+            return open(path, newline="")
+        except OSError as e:
+            raise CommandError(f"Could not open {path}: {e}") from e
+
+    def batches(self, stream, fmt, kind, options):
+        """The CSV header (if any) and an iterator of ``(start, items)`` batches."""
+        header = None
+        if fmt == "csv":
+            rows = csv.reader(stream)
+            header = next(rows, None)
+            if header is None:
+                raise CommandError("CSV input has no header row")
+            missing = (
+                set(scoring.INPUT_FIELDS[kind])
+                - set(header)
+                - {
+                    "household_size",
+                    "last_week_total",
+                }
+            )
+            if missing:
+                raise CommandError(f"CSV input is missing {', '.join(sorted(missing))}")
+            items = rows
+        else:
+            items = (line for line in stream if line.strip())
+
+        def generate():
+            start = 1
+            while batch := list(itertools.islice(items, options["batch_size"])):
+                yield start, batch
+                start += len(batch)
+
+        return header, generate()
+
+    def run(self, kind, fmt, spec, header, batches, options):
+        started = last_report = time.monotonic()
+        rows = skipped = 0
+        for text, scored, errors in self.scored(
+            kind, fmt, spec, header, batches, options
+        ):
+            if errors and not options["skip_invalid"]:
+                number, message = errors[0]
+                raise CommandError(
+                    f"Record {number}: {message} (use --skip-invalid to skip "
+                    "invalid records)"
+                )
+            for number, message in errors:
+                self.report(f"Skipping record {number}: {message}")
+            skipped += len({number for number, _ in errors})
+            self.stdout.write(text, ending="")
+            rows += scored
+
+            now = time.monotonic()
+            if now - last_report >= 1:
+                last_report = now
+                self.report(f"  {rows} rows ({rows / (now - started):,.0f} rows/s)")
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        summary = f"Scored {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)"
+        if skipped:
+            summary += f", skipped {skipped} invalid"
+        self.stderr.write(self.style.SUCCESS(summary))
+
+    def report(self, message):
+        """Write a progress line to stderr without the error styling."""
+        self.stderr.write(message, style_func=lambda text: text)
+
+    def scored(self, kind, fmt, spec, header, batches, options):
+        """Yield scored batches in input order.
+
+        With workers, a bounded number of batches is in flight at once, so
+        memory stays flat however large the input is.
+        """
+        if options["workers"] <= 0:
+            for start, items in batches:
+                yield score_batch(kind, fmt, spec, header, start, items)
+            return
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            pending = deque()
+            for start, items in batches:
+                pending.append(
+                    executor.submit(score_batch, kind, fmt, spec, header, start, items)
+                )
+                if len(pending) >= options["workers"] * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.charts.cohorts import compute_month
+from apps.charts.goals import current_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregates weekly checkups into per-cohort monthly statistics "
+        "(mean, p10, p50, p90) for the population comparisons"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=2,
+            help="Months to compute, counting back from the current one (default 2)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Checkups read per chunk (default 10000)",
+        )
+
+    def handle(self, *args, **options):
+        month = current_month()
+        for _ in range(options["months"]):
+            started = time.monotonic()
+            cohorts = compute_month(month, options["chunk_size"])
+            self.stdout.write(
+                f"  {month:%B %Y}: {cohorts} cohorts "
+                f"({time.monotonic() - started:.1f}s)"
+            )
+            month = (month - timedelta(days=1)).replace(day=1)
+        self.stdout.write(self.style.SUCCESS("Cohort statistics computed"))
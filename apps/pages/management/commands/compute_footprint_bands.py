@@ -0,0 +1,123 @@
+import itertools
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from apps.charts.models import FootprintBand
+from apps.pages.emission_factors import DEFAULT_REGION, factor_registry
+from apps.pages.models import InitialSurveyResult, WeeklyCheckupResult
+from apps.pages.recompute import INITIAL_ANSWER_FIELDS, WEEKLY_ANSWER_FIELDS
+
+SOURCES = {
+    "initial": (InitialSurveyResult, INITIAL_ANSWER_FIELDS),
+    "weekly": (WeeklyCheckupResult, WEEKLY_ANSWER_FIELDS),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes Monte Carlo uncertainty bands for every user's latest "
+        "initial survey and weekly checkup and stores them for the charts page"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            choices=["initial", "weekly", "all"],
+            default="all",
+            help="Which results to compute bands for (default: all)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Users scored and stored per chunk (default 1000)",
+        )
+
+    def handle(self, *args, **options):
+        sources = list(SOURCES) if options["source"] == "all" else [options["source"]]
+        for source in sources:
+            model, fields = SOURCES[source]
+            latest = model.objects.filter(
+                pk=Subquery(
+                    model.objects.filter(user=OuterRef("user"))
+                    .order_by("-date_submitted", "-id")
+                    .values("pk")[:1]
+                ),
+                user__userprofile__isnull=False,
+            )
+            rows = (
+                latest.order_by("user_id")
+                .values_list(
+                    "user_id",
+                    "user__userprofile__region",
+                    "user__userprofile__house_type",
+                    *fields,
+                )
+                .iterator(chunk_size=options["chunk_size"])
+            )
+
+            started = time.monotonic()
+            stored = 0
+            while chunk := list(itertools.islice(rows, options["chunk_size"])):
+                stored += self.store(source, fields, chunk)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"  {source}: {stored} users ({stored / max(elapsed, 1e-9):,.0f} users/s)"
+                )
+            self.stdout.write(
+                self.style.SUCCESS(f"Stored {stored} {source} footprint bands")
+            )
+
+    def store(self, source, fields, chunk):
+        """Score one chunk of ``(user_id, region, house_type, *answers)`` rows."""
+        registry = factor_registry()
+        by_region = defaultdict(list)
+        for row in chunk:
+            by_region[row[1] or DEFAULT_REGION].append(row)
+
+        computed_at = timezone.now()
+        bands = []
+        for region, rows in by_region.items():
+            factors = registry.get(region)
+            columns = {
+                field: [row[i] for row in rows] for i, field in enumerate(fields, 3)
+            }
+            if source == "initial":
+                columns["home_type"] = [row[2] for row in rows]
+                percentiles = factors.uncertainty.initial_bands_batch(columns)
+            else:
+                percentiles = factors.uncertainty.weekly_bands_batch(columns)
+
+            for row, (p5, p50, p95) in zip(rows, percentiles.tolist()):
+                bands.append(
+                    FootprintBand(
+                        user_id=row[0],
+                        source=source,
+                        p5=p5,
+                        p50=p50,
+                        p95=p95,
+                        samples=factors.uncertainty.samples,
+                        computed_at=computed_at,
+                        **factors.stamp,
+                    )
+                )
+
+        FootprintBand.objects.bulk_create(
+            bands,
+            update_conflicts=True,
+            unique_fields=["user", "source"],
+            update_fields=[
+                "p5",
+                "p50",
+                "p95",
+                "samples",
+                "factors_region",
+                "factors_version",
+                "computed_at",
+            ],
+        )
+        return len(bands)
@@ -1,59 +1,78 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
-from apps.pages.models import UserProfile, InitialSurveyResult, WeeklyCheckupResult
-from apps.charts.models import CarbonUsage, CarbonGoal
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.deletion import (
+    CHUNK_SIZE,
+    affected_months,
+    chunks,
+    delete_users,
+    preview,
+    rebuild_aggregates,
+)
+
+# Names listed individually in the preview and missing-user warning
+LISTED = 10
 
 
 class Command(BaseCommand):
-    help = "Deletes specified users and all their associated data"
+    help = (
+        "Deletes users and all their associated data, in chunks of users "
+        "with one aggregated preview"
+    )
 
     def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Usernames to delete")
         parser.add_argument(
-            "usernames", nargs="+", type=str, help="Usernames to delete"
+            "--file",
+            help="File of usernames to delete, one per line; '#' starts a comment",
+        )
+        parser.add_argument(
+            "--prefix", help="Delete every user whose username starts with this"
         )
         parser.add_argument("--force", action="store_true", help="Skip confirmation")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"Users deleted per transaction (default {CHUNK_SIZE})",
+        )
 
     def handle(self, *args, **options):
-        User = get_user_model()
-        usernames = options["usernames"]
-        force = options["force"]
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        usernames = list(options["usernames"])
+        if options["file"]:
+            usernames.extend(self.read_usernames(options["file"]))
+        if not usernames and not options["prefix"]:
+            raise CommandError("Give usernames, --file or --prefix")
 
-        users_to_delete = []
-        for username in usernames:
-            try:
-                user = User.objects.get(username=username)
-                users_to_delete.append(user)
-            except User.DoesNotExist:
-                self.stdout.write(
-                    self.style.WARNING(f"User {username} does not exist - skipping")
+        users = self.resolve(usernames, options["chunk_size"])
+        if options["prefix"]:
+            users.update(
+                User.objects.filter(username__startswith=options["prefix"]).values_list(
+                    "id", "username"
                 )
-
-        if not users_to_delete:
+            )
+        if not users:
             self.stdout.write(self.style.ERROR("No valid users to delete"))
             return
+        user_ids = sorted(users)
 
-        for user in users_to_delete:
-            weekly_count = WeeklyCheckupResult.objects.filter(user=user).count()
-            carbon_usage_count = CarbonUsage.objects.filter(user=user).count()
-            goals_count = CarbonGoal.objects.filter(user=user).count()
-
-            self.stdout.write(f"\nWill delete for user {user.username}:")
-            self.stdout.write(f"- Weekly checkups: {weekly_count}")
-            self.stdout.write(f"- Carbon usage entries: {carbon_usage_count}")
-            self.stdout.write(f"- Carbon goals: {goals_count}")
-            try:
-                UserProfile.objects.get(user=user)
-                self.stdout.write("- User profile")
-            except UserProfile.DoesNotExist:
-                pass
-            try:
-                survey = InitialSurveyResult.objects.filter(user=user).exists()
-                if survey:
-                    self.stdout.write("- Initial survey")
-            except Exception:
-                pass
+        counts = preview(user_ids, options["chunk_size"])
+        names = ""
+        if len(users) <= LISTED:
+            names = f" ({', '.join(users[user_id] for user_id in user_ids)})"
+        self.stdout.write(f"\nWill delete {len(users)} users{names} and:")
+        for model, rows in counts.items():
+            total = sum(rows.values())
+            if total:
+                self.stdout.write(
+                    f"- {model._meta.verbose_name_plural.capitalize()}: {total}"
+                )
 
-        if not force:
+        if not options["force"]:
             confirm = input(
                 "\nAre you sure you want to delete these users and all their data? [y/N] "
             )
@@ -61,15 +80,47 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING("Operation cancelled"))
                 return
 
-        for user in users_to_delete:
-            try:
-                user.delete()
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Successfully deleted user {user.username} and all associated data"
-                    )
-                )
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f"Error deleting user {user.username}: {str(e)}")
-                )
+        started = time.monotonic()
+        months = affected_months(user_ids, options["chunk_size"])
+        deleted = delete_users(
+            user_ids,
+            options["chunk_size"],
+            progress=lambda done, rows, elapsed: self.stdout.write(
+                f"  {done}/{len(user_ids)} users, {rows} rows "
+                f"({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+            ),
+        )
+        rebuild_aggregates(*months)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {len(user_ids)} users and {sum(deleted.values())} rows "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def read_usernames(self, path):
+        try:
+            with open(path, encoding="utf-8-sig") as f:
+                lines = [line.strip() for line in f]
+        except OSError as e:
+            raise CommandError(f"Could not open {path}: {e}") from e
+        return [line for line in lines if line and not line.startswith("#")]
+
+    def resolve(self, usernames, chunk_size):
+        """``{user id: username}`` of the usernames; warns about missing ones."""
+        users = {}
+        for chunk in chunks(dict.fromkeys(usernames), chunk_size):
+            users.update(
+                User.objects.filter(username__in=chunk).values_list("id", "username")
+            )
+        found = set(users.values())
+        missing = [name for name in dict.fromkeys(usernames) if name not in found]
+        for name in missing[:LISTED]:
+            self.stdout.write(
+                self.style.WARNING(f"User {name} does not exist - skipping")
+            )
+        if len(missing) > LISTED:
+            self.stdout.write(
+                self.style.WARNING(f"... and {len(missing) - LISTED} more")
+            )
+        return users
@@ -0,0 +1,56 @@
+import importlib.util
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.warehouse import BATCH_SIZE, TABLES, Warehouse
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports surveys, checkups, goals and profiles to Parquet files for "
+        "analytics, writing only what changed since the previous run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Warehouse directory")
+        parser.add_argument(
+            "--tables",
+            nargs="+",
+            choices=list(TABLES),
+            default=list(TABLES),
+            help="Tables to export (default: all)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Rows read and written per batch (default {BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Discard earlier exports of the tables and write them in full",
+        )
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise CommandError("export_warehouse needs pyarrow: pip install pyarrow")
+
+        warehouse = Warehouse(options["directory"], options["batch_size"])
+        total_rows = total_bytes = 0
+        for table in options["tables"]:
+            if options["full"]:
+                warehouse.reset(table)
+            rows, size, seconds = warehouse.export(table)
+            self.stdout.write(
+                f"  {table:<16} {rows:>10,} rows {size:>14,} bytes "
+                f"{rows / max(seconds, 1e-9):>12,.0f} rows/s"
+            )
+            total_rows += rows
+            total_bytes += size
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported {total_rows:,} rows ({total_bytes:,} bytes) "
+                f"to {options['directory']}"
+            )
+        )
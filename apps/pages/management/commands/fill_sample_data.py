@@ -1,9 +1,16 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
 from apps.pages.models import WeeklyCheckupResult, UserProfile, InitialSurveyResult
+from apps.charts.ranks import update_rank
+from apps.charts.rollups import add_checkup
 from apps.pages.carbon_calculator import CarbonCalculator
-import random
+from apps.pages.sample_data import (
+    INITIAL_SURVEY_CHOICES,
+    WEEKLY_CHECKUP_CHOICES,
+    random_answers,
+)
 
 
 class Command(BaseCommand):
@@ -69,44 +76,7 @@ class Command(BaseCommand):
         survey_data = {
             "home_type": profile.house_type,
             "household_size": profile.household_size,
-            "primary_heating": random.choices(
-                ["ELEC", "GAS", "OIL", "NONE"], weights=[40, 30, 20, 10]
-            )[0],
-            "appliance_use": random.choices(
-                ["DAILY", "WEEKLY", "OCCAS", "NEVER"], weights=[40, 30, 20, 10]
-            )[0],
-            "lighting_type": random.choices(
-                ["LED", "CFL", "INC", "MIX"], weights=[40, 30, 10, 20]
-            )[0],  # Favor LED
-            "air_conditioning": random.choices(["YES", "NO"], weights=[30, 70])[
-                0
-            ],  # Favor no AC
-            "car_type": random.choices(
-                ["NONE", "PETROL", "DIESEL", "HYBRID", "ELEC"],
-                weights=[15, 25, 20, 25, 15],
-            )[0],
-            "device_time": random.choices(
-                ["LT2", "2-4", "4-8", "GT8"], weights=[20, 40, 30, 10]
-            )[0],
-            "flights_per_year": random.choices(
-                ["NONE", "1SHORT", "2-4SHORT", "1LONG", "MULTLONG"],
-                weights=[30, 35, 20, 10, 5],
-            )[0],
-            "public_transport": random.choices(
-                ["NEVER", "OCCAS", "WEEKLY", "DAILY"], weights=[20, 30, 30, 20]
-            )[0],
-            "compost_waste": random.choices(["YES", "NO"], weights=[60, 40])[
-                0
-            ],  # Favor composting
-            "clothes_drying": random.choices(
-                ["LINE", "MIXED", "DRYER"], weights=[40, 40, 20]
-            )[0],
-            "buy_secondhand": random.choices(
-                ["OFTEN", "SOME", "RARELY", "NEVER"], weights=[25, 35, 25, 15]
-            )[0],
-            "renewable_pct": random.choices(
-                [0, 25, 50, 75, 100], weights=[15, 25, 30, 20, 10]
-            )[0],
+            **random_answers(INITIAL_SURVEY_CHOICES),
         }
 
         results = CarbonCalculator.calculate_initial_survey(survey_data)
@@ -143,19 +113,6 @@ class Command(BaseCommand):
             self.style.SUCCESS(f"Created/updated initial survey for user {username}")
         )
 
-        # Choices for each field based on the model's choices
-        CHOICES = {
-            "heating_usage": ["OFF", "ECO", "SOME", "MOST"],
-            "appliance_usage": ["OPT", "REG", "FREQ", "HEAVY"],
-            "daily_transport": ["ACTIVE", "PUBLIC", "MIXED", "CAR"],
-            "weekly_travel": ["LOCAL", "REGION", "LONG", "FLIGHT"],
-            "vehicle_type": ["NONE", "ELECTRIC", "HYBRID", "STANDARD", "LARGE"],
-            "energy_source": ["FULL_GREEN", "PARTIAL", "GREEN_OPT", "STANDARD"],
-            "water_usage": ["MINIMAL", "MODERATE", "TYPICAL", "HIGH"],
-            "waste_generation": ["MINIMAL", "LOW", "MEDIUM", "HIGH"],
-            "weekly_consumption": ["NONE", "ESSENTIAL", "MODERATE", "HIGH"],
-        }
-
         from tqdm import tqdm
 
         # Generate 30 weeks of data
@@ -182,55 +139,15 @@ class Command(BaseCommand):
 
             # Create checkup data with a tendency towards moderate choices
             # but occasional variation to show improvements and setbacks
-            data = {
-                "heating_usage": random.choices(
-                    CHOICES["heating_usage"],
-                    weights=[15, 40, 30, 15],  # Favor ECO and SOME
-                )[0],
-                "appliance_usage": random.choices(
-                    CHOICES["appliance_usage"],
-                    weights=[30, 40, 20, 10],  # Favor OPT and REG
-                )[0],
-                "daily_transport": random.choices(
-                    CHOICES["daily_transport"],
-                    weights=[20, 30, 30, 20],  # Balanced mix
-                )[0],
-                "weekly_travel": random.choices(
-                    CHOICES["weekly_travel"],
-                    weights=[40, 30, 20, 10],  # Favor local travel
-                )[0],
-                "vehicle_type": random.choices(
-                    CHOICES["vehicle_type"],
-                    weights=[20, 20, 30, 20, 10],  # Favor hybrid/electric
-                )[0],
-                "energy_source": random.choices(
-                    CHOICES["energy_source"],
-                    weights=[25, 30, 25, 20],  # Favor green energy
-                )[0],
-                "water_usage": random.choices(
-                    CHOICES["water_usage"],
-                    weights=[25, 35, 25, 15],  # Favor moderate usage
-                )[0],
-                "waste_generation": random.choices(
-                    CHOICES["waste_generation"],
-                    weights=[20, 35, 30, 15],  # Favor low waste
-                )[0],
-                "weekly_consumption": random.choices(
-                    CHOICES["weekly_consumption"],
-                    weights=[15, 40, 35, 10],  # Favor essential/moderate
-                )[0],
-            }
+            data = random_answers(WEEKLY_CHECKUP_CHOICES)
 
             # Calculate carbon impact using the CarbonCalculator
             results = CarbonCalculator.calculate_weekly_checkup(
                 data, last_week_total, profile.household_size
             )
 
-            # Force auto_now_add to use our date by temporarily disabling it
-            WeeklyCheckupResult._meta.get_field("date_submitted").auto_now_add = False
-
             # Create the weekly checkup with the specific date
-            WeeklyCheckupResult.objects.create(
+            checkup = WeeklyCheckupResult.objects.create(
                 user=user,
                 date_submitted=date,
                 heating_usage=data["heating_usage"],
@@ -250,9 +167,9 @@ class Command(BaseCommand):
                 monthly_estimate=results["monthly_estimate"],
                 monthly_estimate_per_person=results["monthly_estimate_per_person"],
             )
-
-            # Re-enable auto_now_add for normal operation
-            WeeklyCheckupResult._meta.get_field("date_submitted").auto_now_add = True
+            with transaction.atomic():
+                add_checkup(checkup)
+                update_rank(checkup, profile)
 
             last_week_total = results["weekly_total"]
             weeks_created += 1
@@ -0,0 +1,138 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.charts.goals import current_month
+from apps.charts.ranks import rebuild_month
+from apps.charts.rollups import rebuild_global_rollups
+from apps.pages import synthetic
+from apps.pages.emission_factors import DEFAULT_REGION, factor_registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic users with weekly checkup histories for load "
+        "and capacity testing; the same seed gives the same dataset"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=1000, help="Users to create (default 1000)"
+        )
+        parser.add_argument(
+            "--weeks",
+            type=int,
+            default=52,
+            help="Weekly checkups per user (default 52)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--prefix",
+            default="synthetic-",
+            help="Username prefix, followed by the user's number (default synthetic-)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Users generated and written per transaction (default 500)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Generating processes; 0 generates in this process",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["weeks"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--users, --weeks and --chunk-size must be at least 1")
+        if User.objects.filter(username__startswith=options["prefix"]).exists():
+            raise CommandError(
+                f"Users named {options['prefix']}* already exist; pick another "
+                "--prefix or delete them first"
+            )
+
+        factors = factor_registry().get(DEFAULT_REGION)
+        end = synthetic.history_end()
+        chunks = (
+            (start, min(options["chunk_size"], options["users"] - start))
+            for start in range(0, options["users"], options["chunk_size"])
+        )
+        generate = (
+            options["seed"],
+            options["weeks"],
+            end,
+            factors.monthly,
+            factors.weekly,
+        )
+
+        started = time.monotonic()
+        users = checkups = 0
+        for start, chunk in self.generated(chunks, generate, options):
+            checkups += synthetic.write_chunk(options["prefix"], start, chunk, factors)
+            users += len(chunk["profile"]["house_type"])
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  {users} users, {checkups} checkups "
+                f"({checkups / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+
+        first = datetime.fromtimestamp(end - options["weeks"] * synthetic.WEEK, UTC)
+        rebuild_global_rollups(timezone.localdate(first).replace(day=1))
+        rebuild_month(current_month())
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {users} users and {checkups} checkups in {elapsed:.1f}s "
+                f"({checkups / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+        )
+
+    def generated(self, chunks, generate, options):
+        """Yield ``(start, chunk)`` in user order.
+
+        With a process pool, a bounded number of chunks is generated ahead
+        of the one being written.
+        """
+        seed, weeks, end, monthly, weekly = generate
+        if options["workers"] <= 0:
+            for start, count in chunks:
+                yield (
+                    start,
+                    synthetic.generate_chunk(
+                        seed, start, count, weeks, end, monthly, weekly
+                    ),
+                )
+            return
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            pending = deque()
+            for start, count in chunks:
+                pending.append(
+                    (
+                        start,
+                        executor.submit(
+                            synthetic.generate_chunk,
+                            seed,
+                            start,
+                            count,
+                            weeks,
+                            end,
+                            monthly,
+                            weekly,
+                        ),
+                    )
+                )
+                if len(pending) >= options["workers"] * 2:
+                    start, future = pending.popleft()
+                    yield start, future.result()
+            while pending:
+                start, future = pending.popleft()
+                yield start, future.result()
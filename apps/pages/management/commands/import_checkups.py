@@ -0,0 +1,74 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.checkup_import import BATCH_SIZE, InvalidRecord, import_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports historical weekly checkups from a CSV of usernames, dates "
+        "and answers, scoring them with each user's emission factors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input",
+            nargs="?",
+            default="-",
+            help="CSV file, optionally gzipped; '-' or omitted reads stdin",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Records scored and inserted per transaction (default {BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Report invalid records on stderr and carry on instead of stopping",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        stream = self.open(options["input"])
+        started = time.monotonic()
+        try:
+            run = import_csv(
+                stream,
+                options["batch_size"],
+                options["skip_invalid"],
+                report=lambda message: self.stderr.write(
+                    message, style_func=lambda text: text
+                ),
+            )
+        except InvalidRecord as e:
+            raise CommandError(
+                f"{e} (use --skip-invalid to skip invalid records)"
+            ) from e
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        summary = (
+            f"Imported {run.imported} checkups for {len(run.user_ids)} users in "
+            f"{elapsed:.1f}s ({run.imported / elapsed:,.0f} rows/s)"
+        )
+        if run.skipped:
+            summary += f", skipped {run.skipped} invalid"
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def open(self, path):
+        try:
+            if path == "-":
+                return sys.stdin
+            if path.endswith(".gz"):
+                return gzip.open(path, "rt", newline="", encoding="utf-8-sig")
+            return open(path, newline="", encoding="utf-8-sig")
+        except OSError as e:
+            raise CommandError(f"Could not open {path}: {e}") from e
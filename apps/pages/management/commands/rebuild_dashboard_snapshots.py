@@ -0,0 +1,69 @@
+import itertools
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.dashboard import SNAPSHOT_VERSION, bulk_dashboard_data
+from apps.pages.models import DashboardSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks every user's dashboard snapshot against their data and "
+        "rebuilds the missing and stale ones"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report missing and stale snapshots; fails if there are any",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Users checked per chunk (default 500)",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by("id").values_list("id", flat=True).iterator()
+        checked = missing = stale = 0
+        while chunk := list(itertools.islice(user_ids, options["chunk_size"])):
+            fresh = bulk_dashboard_data(chunk)
+            stored = dict(
+                DashboardSnapshot.objects.filter(
+                    user_id__in=chunk, version=SNAPSHOT_VERSION
+                ).values_list("user_id", "data")
+            )
+            rebuild = []
+            for user_id in chunk:
+                if user_id not in stored:
+                    missing += 1
+                elif stored[user_id] != fresh[user_id]:
+                    stale += 1
+                else:
+                    continue
+                rebuild.append(
+                    DashboardSnapshot(
+                        user_id=user_id, version=SNAPSHOT_VERSION, data=fresh[user_id]
+                    )
+                )
+            if rebuild and not options["check"]:
+                DashboardSnapshot.objects.bulk_create(
+                    rebuild,
+                    update_conflicts=True,
+                    unique_fields=["user"],
+                    update_fields=["version", "data", "built_at"],
+                )
+            checked += len(chunk)
+
+        summary = f"{checked} users checked: {missing} missing, {stale} stale"
+        if options["check"]:
+            if missing or stale:
+                raise CommandError(summary)
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"{summary}, {missing + stale} rebuilt")
+            )
@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.charts.goals import current_month
+from apps.charts.ranks import rebuild_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the cohort rank entries and score buckets of recent months "
+        "from the monthly checkup rollups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=1,
+            help="Months to rebuild, counting back from the current one (default 1)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Rollup rows read per chunk (default 10000)",
+        )
+
+    def handle(self, *args, **options):
+        month = current_month()
+        for _ in range(options["months"]):
+            started = time.monotonic()
+            entries = rebuild_month(month, options["chunk_size"])
+            self.stdout.write(
+                f"  {month:%B %Y}: {entries} users ranked "
+                f"({time.monotonic() - started:.1f}s)"
+            )
+            month = (month - timedelta(days=1)).replace(day=1)
+        self.stdout.write(self.style.SUCCESS("Ranks rebuilt"))
@@ -0,0 +1,53 @@
+import itertools
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.charts.rollups import rebuild_global_rollups, rebuild_user_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the weekly and monthly checkup rollups against the checkups "
+        "and rebuilds the missing, stale and orphaned rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report rollup rows that differ; fails if there are any",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Users rebuilt per chunk (default 500)",
+        )
+
+    def handle(self, *args, **options):
+        counts = [0, 0, 0]
+
+        def add(synced):
+            for i, n in enumerate(synced):
+                counts[i] += n
+
+        user_ids = User.objects.order_by("id").values_list("id", flat=True).iterator()
+        checked = 0
+        while chunk := list(itertools.islice(user_ids, options["chunk_size"])):
+            add(rebuild_user_rollups(chunk, options["check"]))
+            checked += len(chunk)
+
+        add(rebuild_global_rollups(check=options["check"]))
+
+        missing, stale, orphaned = counts
+        summary = (
+            f"{checked} users checked: {missing} missing, {stale} stale, "
+            f"{orphaned} orphaned rollup rows"
+        )
+        if options["check"]:
+            if any(counts):
+                raise CommandError(summary)
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary}, {sum(counts)} fixed"))
@@ -0,0 +1,200 @@
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.charts.goals import bulk_update_goal_progress
+from apps.pages import recompute
+from apps.pages.dashboard import rebuild_snapshots
+from apps.pages.models import InitialSurveyResult, WeeklyCheckupResult
+
+SNAPSHOT_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-scores stored survey results calculated with an older version "
+        "of their region's emission factors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=["initial", "weekly", "all"],
+            default="all",
+            help="Which results to recompute (default: all)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Initial surveys per chunk (default 2000)",
+        )
+        parser.add_argument(
+            "--users-per-chunk",
+            type=int,
+            default=200,
+            help="Users whose weekly history is scored per chunk (default 200)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Scoring processes; 0 scores in this process",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would change, without writing",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every row, not just rows with an older version",
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+        if options["model"] in ("initial", "all"):
+            factor_sets = recompute.current_factor_sets(InitialSurveyResult)
+            jobs.append(
+                (
+                    InitialSurveyResult,
+                    factor_sets,
+                    recompute.initial_chunks(
+                        factor_sets, options["chunk_size"], options["all"]
+                    ),
+                    recompute.score_initial,
+                    recompute.worker_factors(factor_sets, "initial"),
+                    recompute.INITIAL_RESULT_FIELDS,
+                )
+            )
+        if options["model"] in ("weekly", "all"):
+            factor_sets = recompute.current_factor_sets(WeeklyCheckupResult)
+            jobs.append(
+                (
+                    WeeklyCheckupResult,
+                    factor_sets,
+                    recompute.weekly_chunks(
+                        factor_sets, options["users_per_chunk"], options["all"]
+                    ),
+                    recompute.score_weekly,
+                    recompute.worker_factors(factor_sets, "weekly"),
+                    recompute.WEEKLY_RESULT_FIELDS,
+                )
+            )
+
+        # Users whose results were re-scored, for their goals and snapshots
+        self.user_ids = set()
+        executor = None
+        if options["workers"] > 0:
+            executor = ProcessPoolExecutor(max_workers=options["workers"])
+        try:
+            for model, factor_sets, chunks, score, factors, fields in jobs:
+                self.stdout.write(
+                    f"Recomputing {model._meta.verbose_name_plural} with "
+                    + ", ".join(
+                        f"{region}: {factor_set.region} v{factor_set.version}"
+                        for region, factor_set in sorted(factor_sets.items())
+                    )
+                )
+                self.run(
+                    model,
+                    chunks,
+                    partial(score, factors=factors),
+                    fields,
+                    executor,
+                    options,
+                )
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+        if self.user_ids:
+            self.rebuild_dashboards(sorted(self.user_ids))
+
+    def run(self, model, chunks, score, fields, executor, options):
+        name = model._meta.verbose_name_plural
+        started = time.monotonic()
+        rows = 0
+        summary = {field: [0, 0.0] for field in fields}
+
+        for ids, columns, results in self.scored(chunks, score, executor, options):
+            if options["dry_run"]:
+                for field, (changed, max_delta) in recompute.diff_summary(
+                    columns, results, fields
+                ).items():
+                    summary[field][0] += changed
+                    summary[field][1] = max(summary[field][1], max_delta)
+            else:
+                # One transaction per chunk: an interrupted run keeps the
+                # finished chunks, and a rerun only picks up stale rows.
+                with transaction.atomic():
+                    self.user_ids |= recompute.write_back(model, ids, results, fields)
+            rows += len(ids)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  {name}: {rows} rows ({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS(f"No stale {name}"))
+            return
+        if options["dry_run"]:
+            self.stdout.write(f"Dry run for {rows} {name}:")
+            for field, (changed, max_delta) in summary.items():
+                self.stdout.write(
+                    f"  {field:<28} {changed:>8} changed, max change {max_delta:.4f}"
+                )
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Recomputed {rows} {name}"))
+            if model is WeeklyCheckupResult:
+                # Rollup min and max cannot be updated in place, so rebuild;
+                # the current month's ranks are scored from the rollups
+                call_command("rebuild_rollups", stdout=self.stdout)
+                call_command("rebuild_ranks", stdout=self.stdout)
+
+    def rebuild_dashboards(self, user_ids):
+        """Bring goals and dashboards up to date with the re-scored results.
+
+        Goals follow the latest monthly estimate, and snapshots show the
+        totals, baseline and goal.
+        """
+        user_ids = iter(user_ids)
+        goals = rebuilt = 0
+        while chunk := list(itertools.islice(user_ids, SNAPSHOT_CHUNK_SIZE)):
+            with transaction.atomic():
+                goals += bulk_update_goal_progress(chunk)
+                rebuild_snapshots(chunk)
+            rebuilt += len(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {goals} goals and rebuilt {rebuilt} dashboard snapshots"
+            )
+        )
+
+    def scored(self, chunks, score, executor, options):
+        """Yield ``(ids, columns, results)`` in chunk order.
+
+        With a process pool, a bounded number of chunks is scored ahead of
+        the one being written back.
+        """
+        if executor is None:
+            for ids, columns in chunks:
+                yield ids, columns, score(columns)
+            return
+
+        pending = deque()
+        for ids, columns in chunks:
+            pending.append((ids, columns, executor.submit(score, columns)))
+            if len(pending) >= options["workers"] * 2:
+                ids, columns, future = pending.popleft()
+                yield ids, columns, future.result()
+        while pending:
+            ids, columns, future = pending.popleft()
+            yield ids, columns, future.result()
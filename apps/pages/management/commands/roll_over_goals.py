@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.charts.goals import current_month, update_goal_progress
+from apps.charts.models import CarbonGoal
+from apps.pages.dashboard import rebuild_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts this month's carbon goal for users whose latest goal is from "
+        "an earlier month, carrying its target forward; run at the start of "
+        "each month"
+    )
+
+    def handle(self, *args, **options):
+        month = current_month()
+        users = (
+            User.objects.filter(carbongoal__month__lt=month)
+            .exclude(carbongoal__month=month)
+            .distinct()
+        )
+
+        rolled = 0
+        for user in users.iterator():
+            with transaction.atomic():
+                update_goal_progress(user, month)
+                rebuild_snapshot(user)
+            rolled += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Started {month:%B %Y} goals for {rolled} users "
+                f"({CarbonGoal.objects.filter(month=month).count()} goals this month)"
+            )
+        )
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.25 on 2026-10-18 04:17
+
+import apps.pages.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pages", "0010_weeklycheckupresult_home_electric_subtotal_and_more"),
+    ]
+
+    # Existing rows get version 0 ("unknown") so recompute_results treats them
+    # as stale; new rows default to the current CarbonCalculator version.
+    operations = [
+        migrations.AddField(
+            model_name="initialsurveyresult",
+            name="factors_version",
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="initialsurveyresult",
+            name="factors_version",
+            field=models.PositiveIntegerField(
+                default=apps.pages.models.current_factors_version,
+                help_text="CarbonCalculator.FACTORS_VERSION the totals were calculated with",
+            ),
+        ),
+        migrations.AddField(
+            model_name="weeklycheckupresult",
+            name="factors_version",
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="weeklycheckupresult",
+            name="factors_version",
+            field=models.PositiveIntegerField(
+                default=apps.pages.models.current_factors_version,
+                help_text="CarbonCalculator.FACTORS_VERSION the totals were calculated with",
+            ),
+        ),
+    ]
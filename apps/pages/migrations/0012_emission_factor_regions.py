@@ -0,0 +1,48 @@
+# Generated by Django 4.2.25 on 2026-10-18 04:19
+
+import apps.pages.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pages", "0011_factors_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="initialsurveyresult",
+            name="factors_region",
+            field=models.CharField(default="default", max_length=32),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="region",
+            field=models.CharField(
+                default="default",
+                help_text="Emission factor region used to score this user's surveys",
+                max_length=32,
+            ),
+        ),
+        migrations.AddField(
+            model_name="weeklycheckupresult",
+            name="factors_region",
+            field=models.CharField(default="default", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="initialsurveyresult",
+            name="factors_version",
+            field=models.PositiveIntegerField(
+                default=apps.pages.models.current_factors_version,
+                help_text="Version of the region's emission factors the totals were calculated with",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="weeklycheckupresult",
+            name="factors_version",
+            field=models.PositiveIntegerField(
+                default=apps.pages.models.current_factors_version,
+                help_text="Version of the region's emission factors the totals were calculated with",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.25 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0013_dashboard_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='initialsurveyresult',
+            index=models.Index(fields=['user', '-date_submitted', '-id'], name='survey_user_latest'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklycheckupresult',
+            index=models.Index(fields=['user', '-date_submitted', '-id'], name='checkup_user_history'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklycheckupresult',
+            index=models.Index(fields=['date_submitted'], name='checkup_date'),
+        ),
+    ]
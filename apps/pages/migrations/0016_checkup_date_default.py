@@ -0,0 +1,19 @@
+# Generated by Django 4.2.25 on 2026-10-18 05:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0014_checkup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='weeklycheckupresult',
+            name='date_submitted',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pages", "0017_survey_date_default"),
+    ]
+
+    # The models dropped these fields' 0.0 defaults without a migration
+    operations = [
+        migrations.AlterField(
+            model_name="weeklycheckupresult",
+            name="home_electric_subtotal",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weeklycheckupresult",
+            name="monthly_estimate_per_person",
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name="weeklycheckupresult",
+            name="renewable_discount",
+            field=models.FloatField(),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.25 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pages", "0018_checkup_float_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="initialsurveyresult",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="weeklycheckupresult",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,5 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .carbon_calculator import CarbonCalculator
+
+
+def current_factors_version():
+    return CarbonCalculator.FACTORS_VERSION
 
 
 class UserProfile(models.Model):
@@ -19,6 +26,11 @@ class UserProfile(models.Model):
         help_text="Monthly carbon goal in kilograms of CO2", null=True, blank=True
     )
     onboarding_completed = models.BooleanField(default=False)
+    region = models.CharField(
+        max_length=32,
+        default="default",
+        help_text="Emission factor region used to score this user's surveys",
+    )
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
@@ -91,7 +103,10 @@ class InitialSurveyResult(models.Model):
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    date_submitted = models.DateTimeField(auto_now_add=True)
+    # Set on creation like auto_now_add, but an explicit date is kept
+    date_submitted = models.DateTimeField(default=timezone.now, editable=False)
+    # Last write of the row; bulk writes set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
 
     # Survey Questions
     primary_heating = models.CharField(max_length=4, choices=HEATING_CHOICES)
@@ -113,10 +128,23 @@ class InitialSurveyResult(models.Model):
     renewable_discount = models.FloatField()
     monthly_total = models.FloatField()
     monthly_per_person = models.FloatField()
+    factors_region = models.CharField(max_length=32, default="default")
+    factors_version = models.PositiveIntegerField(
+        default=current_factors_version,
+        help_text="Version of the region's emission factors the totals were calculated with",
+    )
 
     def __str__(self):
         return f"{self.user.username}'s Initial Survey - {self.date_submitted.strftime('%Y-%m-%d')}"
 
+    class Meta:
+        indexes = [
+            # The latest survey of a user, for the baseline
+            models.Index(
+                fields=["user", "-date_submitted", "-id"], name="survey_user_latest"
+            )
+        ]
+
 
 class WeeklyCheckupResult(models.Model):
     HEATING_CHOICES = [
@@ -184,7 +212,11 @@ class WeeklyCheckupResult(models.Model):
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    date_submitted = models.DateTimeField(auto_now_add=True)
+    # Set on creation like auto_now_add, but an explicit date is kept, so
+    # imported and generated history can be backdated
+    date_submitted = models.DateTimeField(default=timezone.now, editable=False)
+    # Last write of the row; bulk writes set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
 
     # Survey Questions
     heating_usage = models.CharField(max_length=6, choices=HEATING_CHOICES)
@@ -205,10 +237,41 @@ class WeeklyCheckupResult(models.Model):
     pct_change_from_last = models.FloatField(null=True, blank=True)
     monthly_estimate = models.FloatField()
     monthly_estimate_per_person = models.FloatField()
+    factors_region = models.CharField(max_length=32, default="default")
+    factors_version = models.PositiveIntegerField(
+        default=current_factors_version,
+        help_text="Version of the region's emission factors the totals were calculated with",
+    )
 
     def __str__(self):
         return f"{self.user.username}'s Weekly Checkup - {self.date_submitted.strftime('%Y-%m-%d')}"
 
+    class Meta:
+        indexes = [
+            # A user's checkups, newest first, also for the history's cursors
+            models.Index(
+                fields=["user", "-date_submitted", "-id"], name="checkup_user_history"
+            ),
+            # All users' checkups in a period, for the cohort statistics
+            models.Index(fields=["date_submitted"], name="checkup_date"),
+        ]
+
+
+class DashboardSnapshot(models.Model):
+    """Precomputed dashboard data, rebuilt whenever one of its inputs is written"""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="dashboard_snapshot"
+    )
+    version = models.PositiveIntegerField(
+        help_text="Layout version of the data; older snapshots are rebuilt"
+    )
+    data = models.JSONField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s Dashboard Snapshot"
+
 
 class Product(models.Model):
     id = models.AutoField(primary_key=True)
@@ -0,0 +1,242 @@
+"""Bulk re-scoring of stored survey results with the current emission factors.
+
+Used by ``manage.py recompute_results``. Reading and writing happen in the
+main process; ``score_initial`` and ``score_weekly`` are pure functions over
+columnar answers so they can run in a process pool.
+
+A row is current when it is stamped with the region and version of the
+factor set its region resolves to today. Rows of a region whose file was
+removed resolve to the default set and are re-scored with it.
+"""
+
+import math
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .carbon_calculator import CarbonCalculator, percentage_change
+from .emission_factors import factor_registry
+from .models import InitialSurveyResult, WeeklyCheckupResult
+
+INITIAL_ANSWER_FIELDS = [
+    field for field in CarbonCalculator.MONTHLY_WEIGHTS if field != "home_type"
+] + ["renewable_pct"]
+INITIAL_RESULT_FIELDS = [
+    "monthly_raw_total",
+    "home_electric_subtotal",
+    "renewable_discount",
+    "monthly_total",
+    "monthly_per_person",
+]
+
+WEEKLY_ANSWER_FIELDS = list(CarbonCalculator.WEEKLY_WEIGHTS)
+WEEKLY_RESULT_FIELDS = [
+    "weekly_raw_total",
+    "home_electric_subtotal",
+    "renewable_discount",
+    "weekly_total",
+    "pct_change_from_last",
+    "monthly_estimate",
+    "monthly_estimate_per_person",
+]
+
+STAMP_FIELDS = ["factors_region", "factors_version"]
+
+
+def current_factor_sets(model):
+    """Map every region found on ``model`` rows to its current factor set."""
+    registry = factor_registry()
+    regions = model.objects.values_list("factors_region", flat=True).distinct()
+    return {region: registry.get(region) for region in regions}
+
+
+def _stale(model, factor_sets, include_current):
+    queryset = model.objects.all()
+    current = [
+        Q(factors_region=region, factors_version=factor_set.version)
+        for region, factor_set in factor_sets.items()
+        if factor_set.region == region
+    ]
+    if current and not include_current:
+        queryset = queryset.exclude(reduce(or_, current))
+    return queryset
+
+
+def worker_factors(factor_sets, kind):
+    """Picklable ``region -> (stamp region, version, weights)`` for workers."""
+    return {
+        region: (
+            factor_set.region,
+            factor_set.version,
+            factor_set.monthly if kind == "initial" else factor_set.weekly,
+        )
+        for region, factor_set in factor_sets.items()
+    }
+
+
+def _columns(rows, names):
+    if not rows:
+        return {name: [] for name in names}
+    return dict(zip(names, (list(column) for column in zip(*rows))))
+
+
+def initial_chunks(factor_sets, chunk_size, include_current=False):
+    """Yield ``(ids, columns)`` chunks of initial surveys that need re-scoring.
+
+    Surveys of users without a profile are skipped, since home type and
+    household size come from the profile.
+    """
+    queryset = _stale(InitialSurveyResult, factor_sets, include_current).filter(
+        user__userprofile__isnull=False
+    )
+    names = [
+        "id",
+        "factors_region",
+        *INITIAL_ANSWER_FIELDS,
+        "user__userprofile__house_type",
+        "user__userprofile__household_size",
+        *INITIAL_RESULT_FIELDS,
+    ]
+
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list(*names)[:chunk_size]
+        )
+        if not rows:
+            return
+        columns = _columns(rows, names)
+        columns["home_type"] = columns.pop("user__userprofile__house_type")
+        columns["household_size"] = columns.pop("user__userprofile__household_size")
+        last_id = rows[-1][0]
+        yield columns.pop("id"), columns
+
+
+def weekly_chunks(factor_sets, users_per_chunk, include_current=False):
+    """Yield ``(ids, columns)`` chunks of weekly checkups that need re-scoring.
+
+    ``pct_change_from_last`` chains each checkup to the previous one, so a
+    user with any stale checkup has their whole history re-scored, and a
+    chunk always holds complete histories ordered by user and date.
+    """
+    stale = _stale(WeeklyCheckupResult, factor_sets, include_current)
+    user_ids = list(
+        stale.values_list("user_id", flat=True).distinct().order_by("user_id")
+    )
+    names = [
+        "id",
+        "user_id",
+        "factors_region",
+        *WEEKLY_ANSWER_FIELDS,
+        "user__userprofile__household_size",
+        *WEEKLY_RESULT_FIELDS,
+    ]
+
+    for start in range(0, len(user_ids), users_per_chunk):
+        rows = list(
+            WeeklyCheckupResult.objects.filter(
+                user_id__in=user_ids[start : start + users_per_chunk]
+            )
+            .order_by("user_id", "date_submitted", "id")
+            .values_list(*names)
+        )
+        columns = _columns(rows, names)
+        columns["household_size"] = [
+            size or 1 for size in columns.pop("user__userprofile__household_size")
+        ]
+        yield columns.pop("id"), columns
+
+
+def _score_by_region(columns, factors, score):
+    """Score each region's rows with its own weights and stamp them."""
+    regions = np.asarray(columns["factors_region"], dtype=object)
+    results = {}
+    stamp_regions = np.empty(len(regions), dtype=object)
+    versions = np.zeros(len(regions), dtype=np.int64)
+    for region in np.unique(regions):
+        stamp_region, version, weights = factors[region]
+        mask = regions == region
+        subset = {
+            name: np.asarray(values, dtype=object)[mask]
+            for name, values in columns.items()
+        }
+        for key, values in score(subset, weights).items():
+            results.setdefault(key, np.empty(len(regions)))[mask] = values
+        stamp_regions[mask] = stamp_region
+        versions[mask] = version
+    results["factors_region"] = stamp_regions
+    results["factors_version"] = versions
+    return results
+
+
+def score_initial(columns, factors):
+    return _score_by_region(
+        columns,
+        factors,
+        lambda subset, weights: CarbonCalculator.calculate_initial_survey_batch(
+            subset, weights
+        ),
+    )
+
+
+def score_weekly(columns, factors):
+    results = _score_by_region(
+        columns,
+        factors,
+        lambda subset, weights: CarbonCalculator.calculate_weekly_checkup_batch(
+            subset, household_size=subset["household_size"], weights=weights
+        ),
+    )
+    # Each checkup compares against the user's previous (re-scored) checkup
+    user_ids = np.asarray(columns["user_id"])
+    previous = np.roll(results["weekly_total"], 1)
+    previous[np.r_[True, user_ids[1:] != user_ids[:-1]]] = np.nan
+    results["pct_change_from_last"] = percentage_change(
+        results["weekly_total"], previous
+    )
+    return results
+
+
+def diff_summary(columns, results, fields):
+    """Per-field count of changed rows and largest absolute change."""
+    summary = {}
+    for field in fields:
+        old = np.array(columns[field], dtype=np.float64)
+        new = results[field]
+        changed = ~np.isclose(old, new, rtol=0, atol=1e-9, equal_nan=True)
+        delta = np.abs(np.nan_to_num(new - old))
+        summary[field] = (
+            int(changed.sum()),
+            float(delta.max()) if len(delta) else 0.0,
+        )
+    return summary
+
+
+def write_back(model, ids, results, fields):
+    """Store re-scored totals along with the factor set they were scored with.
+
+    Returns the ids of the users the rows belong to.
+    """
+    values = {field: results[field].tolist() for field in [*fields, *STAMP_FIELDS]}
+    # bulk_update does not apply auto_now
+    updated_at = timezone.now()
+    objects = []
+    for i, pk in enumerate(ids):
+        obj = model(id=pk, updated_at=updated_at)
+        for field in fields:
+            value = values[field][i]
+            setattr(obj, field, None if math.isnan(value) else value)
+        for field in STAMP_FIELDS:
+            setattr(obj, field, values[field][i])
+        objects.append(obj)
+    model.objects.bulk_update(
+        objects, [*fields, *STAMP_FIELDS, "updated_at"], batch_size=500
+    )
+    return set(
+        model.objects.filter(id__in=ids).values_list("user_id", flat=True).distinct()
+    )
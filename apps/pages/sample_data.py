@@ -0,0 +1,82 @@
+"""Realistic answer distributions for sample, synthetic and benchmark data."""
+
+import random
+
+import numpy as np
+
+# Field -> (choices, weights) for the initial survey
+INITIAL_SURVEY_CHOICES = {
+    "primary_heating": (["ELEC", "GAS", "OIL", "NONE"], [40, 30, 20, 10]),
+    "appliance_use": (["DAILY", "WEEKLY", "OCCAS", "NEVER"], [40, 30, 20, 10]),
+    "lighting_type": (["LED", "CFL", "INC", "MIX"], [40, 30, 10, 20]),  # Favor LED
+    "air_conditioning": (["YES", "NO"], [30, 70]),  # Favor no AC
+    "car_type": (
+        ["NONE", "PETROL", "DIESEL", "HYBRID", "ELEC"],
+        [15, 25, 20, 25, 15],
+    ),
+    "device_time": (["LT2", "2-4", "4-8", "GT8"], [20, 40, 30, 10]),
+    "flights_per_year": (
+        ["NONE", "1SHORT", "2-4SHORT", "1LONG", "MULTLONG"],
+        [30, 35, 20, 10, 5],
+    ),
+    "public_transport": (["NEVER", "OCCAS", "WEEKLY", "DAILY"], [20, 30, 30, 20]),
+    "compost_waste": (["YES", "NO"], [60, 40]),  # Favor composting
+    "clothes_drying": (["LINE", "MIXED", "DRYER"], [40, 40, 20]),
+    "buy_secondhand": (["OFTEN", "SOME", "RARELY", "NEVER"], [25, 35, 25, 15]),
+    "renewable_pct": ([0, 25, 50, 75, 100], [15, 25, 30, 20, 10]),
+}
+
+# Field -> (choices, weights) for the weekly checkup. Tends towards moderate
+# choices with occasional variation to show improvements and setbacks.
+WEEKLY_CHECKUP_CHOICES = {
+    # Favor ECO and SOME
+    "heating_usage": (["OFF", "ECO", "SOME", "MOST"], [15, 40, 30, 15]),
+    # Favor OPT and REG
+    "appliance_usage": (["OPT", "REG", "FREQ", "HEAVY"], [30, 40, 20, 10]),
+    # Balanced mix
+    "daily_transport": (["ACTIVE", "PUBLIC", "MIXED", "CAR"], [20, 30, 30, 20]),
+    # Favor local travel
+    "weekly_travel": (["LOCAL", "REGION", "LONG", "FLIGHT"], [40, 30, 20, 10]),
+    # Favor hybrid/electric
+    "vehicle_type": (
+        ["NONE", "ELECTRIC", "HYBRID", "STANDARD", "LARGE"],
+        [20, 20, 30, 20, 10],
+    ),
+    # Favor green energy
+    "energy_source": (
+        ["FULL_GREEN", "PARTIAL", "GREEN_OPT", "STANDARD"],
+        [25, 30, 25, 20],
+    ),
+    # Favor moderate usage
+    "water_usage": (["MINIMAL", "MODERATE", "TYPICAL", "HIGH"], [25, 35, 25, 15]),
+    # Favor low waste
+    "waste_generation": (["MINIMAL", "LOW", "MEDIUM", "HIGH"], [20, 35, 30, 15]),
+    # Favor essential/moderate
+    "weekly_consumption": (
+        ["NONE", "ESSENTIAL", "MODERATE", "HIGH"],
+        [15, 40, 35, 10],
+    ),
+}
+
+
+def random_answers(choices, rng=random):
+    """Draw one set of answers from a ``*_CHOICES`` distribution."""
+    return {
+        field: rng.choices(options, weights=weights)[0]
+        for field, (options, weights) in choices.items()
+    }
+
+
+def random_answer_columns(choices, count, rng):
+    """Draw ``count`` answers per field as NumPy arrays.
+
+    ``rng`` is a ``numpy.random.Generator``. Columns hold the choice codes,
+    ready for the batch calculator.
+    """
+    columns = {}
+    for field, (options, weights) in choices.items():
+        p = np.asarray(weights, dtype=np.float64)
+        columns[field] = np.asarray(options)[
+            rng.choice(len(options), count, p=p / p.sum())
+        ]
+    return columns
@@ -0,0 +1,230 @@
+"""What-if scenarios: which answer changes would cut a footprint the most.
+
+Every alternative choice for every field is evaluated in one vectorized pass,
+along with every pair of changes to two different fields, and the best
+``k`` pairs are returned.
+
+The weekly formula is not additive (the green energy and electric vehicle
+bonuses scale other fields), so weekly deltas are gathered from the user's
+compiled weekly table. The monthly total is additive apart from the
+renewable discount on the home-electric subtotal, so initial survey deltas
+come from per-field tables of weight and electric-subtotal differences with
+the discount applied on top.
+"""
+
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import InitialSurveyResult, WeeklyCheckupResult
+
+CACHE_TIMEOUT = 60 * 60
+MAX_PAIRS = 20
+RENEWABLE_CHOICES = [choice for choice, _ in InitialSurveyResult.RENEWABLE_PCT_CHOICES]
+ELECTRIC_FIELDS = ["appliance_use", "lighting_type", "air_conditioning", "device_time"]
+# home_type comes from the profile rather than a survey answer
+FIXED_INITIAL_FIELDS = ["home_type"]
+
+
+def _single_changes(weights, answers, fields):
+    """Every (field position, field, alternative) with a changed answer."""
+    changes = []
+    for position, field in enumerate(fields):
+        for code in weights[field]:
+            if code != answers[field]:
+                changes.append((position, field, code))
+    return changes
+
+
+def _pair_mask(positions):
+    """Pairs of changes to two different fields, each counted once."""
+    return positions[:, None] < positions[None, :]
+
+
+def _best_pairs(valid, pair_deltas, k):
+    """Indices (i, j) of the ``k`` most negative valid pair deltas."""
+    deltas = np.where(valid, pair_deltas, np.inf)
+    flat = deltas.ravel()
+    k = min(k, int(valid.sum()))
+    if k <= 0:
+        return []
+    best = np.argpartition(flat, k - 1)[:k]
+    best = best[np.argsort(flat[best], kind="stable")]
+    return [divmod(int(index), deltas.shape[1]) for index in best]
+
+
+def weekly_scenarios(answers, factors, k=5):
+    """Scenarios for a set of weekly checkup answers, in weekly kg CO2e."""
+    compiled = factors.compiled_weekly
+    current = compiled.pack(answers)
+    changes = _single_changes(compiled.weights, answers, compiled.fields)
+
+    positions = np.array([position for position, _, _ in changes])
+    codes = [list(compiled.weights[field]) for field in compiled.fields]
+    offsets = np.array(
+        [
+            (codes[position].index(code) - codes[position].index(answers[field]))
+            * compiled.strides[position]
+            for position, field, code in changes
+        ]
+    )
+
+    weekly_total = compiled.table[:, 1]
+    baseline = weekly_total[current]
+    single_deltas = weekly_total[current + offsets] - baseline
+    valid = _pair_mask(positions)
+    # Same-field pairs are not scenarios and can index past the table
+    pair_offsets = np.where(valid, offsets[:, None] + offsets[None, :], 0)
+    pair_deltas = weekly_total[current + pair_offsets] - baseline
+
+    return _result(
+        baseline,
+        changes,
+        single_deltas,
+        pair_deltas,
+        _best_pairs(valid, pair_deltas, k),
+    )
+
+
+def initial_scenarios(answers, factors, k=5):
+    """Scenarios for a set of initial survey answers, in monthly kg CO2e."""
+    weights = factors.monthly
+    fields = [field for field in weights if field not in FIXED_INITIAL_FIELDS]
+    fields.append("renewable_pct")
+    changeable = {**weights, "renewable_pct": dict.fromkeys(RENEWABLE_CHOICES)}
+    changes = _single_changes(changeable, answers, fields)
+
+    def electric(field, code):
+        if field in ELECTRIC_FIELDS:
+            return weights[field][code]
+        if field == "primary_heating" and code == "ELEC":
+            return weights[field][code]
+        return 0
+
+    baseline_results = factors.calculate_initial_survey(
+        {**answers, "household_size": 1}
+    )
+    electric_subtotal = baseline_results["home_electric_subtotal"]
+    renewable = answers["renewable_pct"] / 100
+
+    # Per-change deltas of the raw total and the electric subtotal, and the
+    # renewable share after the change (NaN when unchanged)
+    weight_deltas = np.zeros(len(changes))
+    electric_deltas = np.zeros(len(changes))
+    new_renewable = np.full(len(changes), np.nan)
+    for i, (_, field, code) in enumerate(changes):
+        if field == "renewable_pct":
+            new_renewable[i] = code / 100
+        else:
+            weight_deltas[i] = weights[field][code] - weights[field][answers[field]]
+            electric_deltas[i] = electric(field, code) - electric(field, answers[field])
+
+    def total_delta(weight_delta, electric_delta, share):
+        share = np.where(np.isnan(share), renewable, share)
+        return weight_delta - (
+            share * (electric_subtotal + electric_delta) - renewable * electric_subtotal
+        )
+
+    single_deltas = total_delta(weight_deltas, electric_deltas, new_renewable)
+    pair_deltas = total_delta(
+        weight_deltas[:, None] + weight_deltas[None, :],
+        electric_deltas[:, None] + electric_deltas[None, :],
+        np.fmax(new_renewable[:, None], new_renewable[None, :]),
+    )
+    positions = np.array([position for position, _, _ in changes])
+
+    return _result(
+        baseline_results["monthly_total"],
+        changes,
+        single_deltas,
+        pair_deltas,
+        _best_pairs(_pair_mask(positions), pair_deltas, k),
+    )
+
+
+def scenario_answers(kind, row, profile, factors):
+    """The answer vector of a saved result, as the calculator expects it."""
+    if kind == "weekly":
+        return {field: getattr(row, field) for field in factors.weekly}
+    answers = {
+        field: getattr(row, field)
+        for field in factors.monthly
+        if field not in FIXED_INITIAL_FIELDS
+    }
+    return {
+        **answers,
+        "renewable_pct": row.renewable_pct,
+        "home_type": profile.house_type,
+    }
+
+
+def _change(change, answers, labels):
+    _, field, code = change
+    return {
+        "field": field,
+        "from": answers[field],
+        "to": code,
+        "from_label": labels.get(field, {}).get(answers[field], str(answers[field])),
+        "to_label": labels.get(field, {}).get(code, str(code)),
+    }
+
+
+def _result(baseline, changes, single_deltas, pair_deltas, best_pairs):
+    order = np.argsort(single_deltas, kind="stable")
+    return {
+        "baseline": float(baseline),
+        "single": [
+            {"changes": [changes[i]], "delta": float(single_deltas[i])}
+            for i in order.tolist()
+        ],
+        "pairs": [
+            {"changes": [changes[i], changes[j]], "delta": float(pair_deltas[i, j])}
+            for i, j in best_pairs
+        ],
+    }
+
+
+def _choice_labels(model, fields):
+    return {
+        field: {
+            code: str(label) for code, label in model._meta.get_field(field).choices
+        }
+        for field in fields
+    }
+
+
+def _answer_key(kind, answers, factors, k):
+    payload = "|".join(
+        [kind, factors.region, str(factors.version), str(k)]
+        + [f"{field}={answers[field]}" for field in sorted(answers)]
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def scenarios_for(kind, answers, factors, k=5):
+    """Cached scenarios for an answer vector.
+
+    Users with identical answers and factor sets share a cache entry. The
+    returned dict carries the cache key as ``key`` for use as an ETag.
+    """
+    key = _answer_key(kind, answers, factors, k)
+
+    def compute():
+        if kind == "weekly":
+            model, result = WeeklyCheckupResult, weekly_scenarios(answers, factors, k)
+        else:
+            model, result = InitialSurveyResult, initial_scenarios(answers, factors, k)
+        scenarios = result["single"] + result["pairs"]
+        labels = _choice_labels(
+            model,
+            {change[1] for scenario in scenarios for change in scenario["changes"]},
+        )
+        for scenario in scenarios:
+            scenario["changes"] = [
+                _change(change, answers, labels) for change in scenario["changes"]
+            ]
+        return result
+
+    result = cache.get_or_set(f"scenarios:{key}", compute, CACHE_TIMEOUT)
+    return {**result, "kind": kind, "key": key}
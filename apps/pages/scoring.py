@@ -0,0 +1,153 @@
+"""Bulk scoring of answers that are not stored as survey results.
+
+Used by ``manage.py carbon_calc`` and the scoring API. Answers arrive as
+columns of untrusted values (parsed JSON or CSV text); ``validate`` checks
+and encodes a whole column at a time and reports bad rows instead of
+failing the batch, and ``score`` runs the valid rows through the batch
+calculators.
+"""
+
+import math
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from .carbon_calculator import CarbonCalculator
+from .models import InitialSurveyResult
+from .recompute import (
+    INITIAL_ANSWER_FIELDS,
+    INITIAL_RESULT_FIELDS,
+    WEEKLY_ANSWER_FIELDS,
+    WEEKLY_RESULT_FIELDS,
+)
+
+KINDS = ("initial", "weekly")
+INPUT_FIELDS = {
+    "initial": [*INITIAL_ANSWER_FIELDS, "home_type", "household_size"],
+    "weekly": [*WEEKLY_ANSWER_FIELDS, "last_week_total", "household_size"],
+}
+RESULT_FIELDS = {"initial": INITIAL_RESULT_FIELDS, "weekly": WEEKLY_RESULT_FIELDS}
+RENEWABLE_PCTS = [pct for pct, _ in InitialSurveyResult.RENEWABLE_PCT_CHOICES]
+
+
+def records_to_columns(kind, records):
+    """Columns of the input fields of ``kind`` from a list of dicts."""
+    return {
+        field: [record.get(field) for record in records] for field in INPUT_FIELDS[kind]
+    }
+
+
+def _blank(values):
+    return np.array([value is None or value == "" for value in values], dtype=bool)
+
+
+def _numeric(values):
+    """Floats for a column of numbers or numeric strings, NaN when blank.
+
+    Returns the floats and a mask of rows that were neither blank nor numbers.
+    """
+    values = list(values)
+    blank = _blank(values)
+    if any(isinstance(value, bool) for value in values):
+        values = [None if isinstance(value, bool) else value for value in values]
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(
+        dtype=np.float64
+    )
+    return numbers, np.isnan(numbers) & ~blank
+
+
+def validate(kind, columns, factors):
+    """Encode the answer columns of ``kind`` and collect per-row errors.
+
+    Returns ``(encoded, errors)``: columns the batch calculators accept
+    (choice indices and floats) and a dict mapping row numbers to lists of
+    messages. Missing ``household_size`` defaults to 1 and missing
+    ``last_week_total`` to no comparison.
+    """
+    weights = factors.monthly if kind == "initial" else factors.weekly
+    count = len(next(iter(columns.values()), []))
+    errors = defaultdict(list)
+    encoded = {}
+
+    def reject(mask, message):
+        for row in np.flatnonzero(mask).tolist():
+            errors[row].append(message(row))
+
+    for field in weights:
+        values = columns.get(field)
+        if values is None:
+            reject(np.ones(count, dtype=bool), lambda row, f=field: f"{f}: required")
+            encoded[field] = np.zeros(count, dtype=np.intp)
+            continue
+        # Lists and dicts from JSON cannot be looked up, and match no choice
+        objects = np.empty(count, dtype=object)
+        objects[:] = [
+            value if isinstance(value, (str, int)) else None for value in values
+        ]
+        indices = pd.Index(list(weights[field])).get_indexer(objects)
+        reject(
+            indices < 0,
+            lambda row, f=field, v=values: (
+                f"{f}: required"
+                if _blank([v[row]])[0]
+                else f"{f}: invalid choice {v[row]!r}"
+            ),
+        )
+        encoded[field] = np.maximum(indices, 0)
+
+    household_size, invalid = _numeric(columns.get("household_size", [None] * count))
+    household_size[np.isnan(household_size) & ~invalid] = 1
+    invalid |= (household_size < 1) | (household_size != np.floor(household_size))
+    reject(invalid, lambda row: "household_size: must be a positive whole number")
+    encoded["household_size"] = np.where(invalid, 1, household_size)
+
+    if kind == "initial":
+        renewable_pct, invalid = _numeric(columns.get("renewable_pct", [None] * count))
+        invalid |= ~np.isin(renewable_pct, RENEWABLE_PCTS)
+        reject(
+            invalid,
+            lambda row: (
+                "renewable_pct: must be one of " + ", ".join(map(str, RENEWABLE_PCTS))
+            ),
+        )
+        encoded["renewable_pct"] = np.where(invalid, 0, renewable_pct)
+    else:
+        last_week_total, invalid = _numeric(
+            columns.get("last_week_total", [None] * count)
+        )
+        reject(invalid, lambda row: "last_week_total: must be a number")
+        encoded["last_week_total"] = last_week_total
+
+    return encoded, dict(errors)
+
+
+def score(kind, encoded, factors):
+    """Score validated, encoded columns; returns a dict of result arrays."""
+    if kind == "initial":
+        return CarbonCalculator.calculate_initial_survey_batch(encoded, factors.monthly)
+    return factors.compiled_weekly.calculate_batch(
+        encoded, encoded["last_week_total"], encoded["household_size"]
+    )
+
+
+def select_rows(encoded, rows):
+    """The encoded columns restricted to ``rows`` (an index array or mask)."""
+    return {field: values[rows] for field, values in encoded.items()}
+
+
+def result_columns(kind, results):
+    """Result values per field as lists, with ``None`` where a value is NaN."""
+    columns = {}
+    for field in RESULT_FIELDS[kind]:
+        values = results[field].tolist()
+        if np.isnan(results[field]).any():
+            values = [None if math.isnan(value) else value for value in values]
+        columns[field] = values
+    return columns
+
+
+def result_rows(kind, results):
+    """Per-row result dicts, with ``None`` where a value is NaN."""
+    columns = result_columns(kind, results)
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
@@ -0,0 +1,240 @@
+"""Synthetic users and checkup histories for load and capacity testing.
+
+Used by ``manage.py generate_dataset``. Users are generated in chunks by
+``generate_chunk``, a pure function of the seed and the chunk's first user
+number. Chunks can therefore be generated in a process pool, and a dataset
+comes out the same whatever the number of workers. The main process writes
+each chunk in one transaction with ``write_chunk``.
+
+Each user gets a profile, an initial survey and one checkup a week for the
+given number of weeks, ending before the current week. Checkups fall at a
+time of the week drawn per user, and the survey comes a week before the
+first one. Dates are set explicitly on the rows, as ``date_submitted`` only
+defaults to the time of saving.
+"""
+
+from datetime import UTC, datetime, time
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from apps.charts.goals import current_month
+from apps.charts.models import CarbonGoal
+from apps.charts.rollups import rebuild_user_rollups, week_start
+
+from .bulk import insert_rows
+from .carbon_calculator import CarbonCalculator, percentage_change
+from .dashboard import SNAPSHOT_VERSION, bulk_dashboard_data
+from .models import (
+    DashboardSnapshot,
+    InitialSurveyResult,
+    UserProfile,
+    WeeklyCheckupResult,
+)
+from .recompute import (
+    INITIAL_ANSWER_FIELDS,
+    INITIAL_RESULT_FIELDS,
+    WEEKLY_ANSWER_FIELDS,
+    WEEKLY_RESULT_FIELDS,
+)
+from .sample_data import (
+    INITIAL_SURVEY_CHOICES,
+    WEEKLY_CHECKUP_CHOICES,
+    random_answer_columns,
+)
+
+WEEK = 7 * 24 * 3600
+# Profile field -> (choices, weights)
+PROFILE_CHOICES = {
+    "house_type": (["APT", "SMALL", "LARGE"], [45, 35, 20]),
+    "household_size": ([1, 2, 3, 4, 5], [30, 35, 15, 15, 5]),
+}
+CHECKUP_COLUMNS = [
+    "user_id",
+    "date_submitted",
+    *WEEKLY_ANSWER_FIELDS,
+    *WEEKLY_RESULT_FIELDS,
+    "factors_region",
+    "factors_version",
+    "updated_at",
+]
+
+
+def username(prefix, number):
+    return f"{prefix}{number:07d}"
+
+
+def history_end():
+    """POSIX time of the start of the current week, where histories end."""
+    start = datetime.combine(week_start(timezone.localdate()), time())
+    return timezone.make_aware(start).timestamp()
+
+
+def generate_chunk(seed, start, count, weeks, end, monthly, weekly):
+    """Profiles, initial surveys and checkups of users ``start`` to ``start + count``.
+
+    Runs in worker processes, so it only takes picklable arguments: ``end``
+    is the POSIX time histories end at, ``monthly`` and ``weekly`` the
+    factor set's weights. Returns NumPy columns: per-user ``profile``,
+    ``survey`` and ``survey_date`` columns, and ``checkup`` and
+    ``checkup_date`` columns in user then date order.
+    """
+    rng = np.random.default_rng([seed, start])
+    profile = random_answer_columns(PROFILE_CHOICES, count, rng)
+
+    survey = random_answer_columns(INITIAL_SURVEY_CHOICES, count, rng)
+    survey.update(
+        CarbonCalculator.calculate_initial_survey_batch(
+            {
+                **survey,
+                "home_type": profile["house_type"],
+                "household_size": profile["household_size"],
+            },
+            monthly,
+        )
+    )
+    # Goals a little below each user's baseline
+    profile["carbon_goal"] = np.round(
+        survey["monthly_total"] * rng.uniform(0.7, 0.95, count)
+    ).astype(np.int64)
+
+    checkup = random_answer_columns(WEEKLY_CHECKUP_CHOICES, count * weeks, rng)
+    checkup.update(
+        CarbonCalculator.calculate_weekly_checkup_batch(
+            checkup,
+            household_size=np.repeat(profile["household_size"], weeks),
+            weights=weekly,
+        )
+    )
+    # Each checkup compares against the user's previous week
+    previous = np.roll(checkup["weekly_total"], 1)
+    previous[::weeks] = np.nan
+    checkup["pct_change_from_last"] = percentage_change(
+        checkup["weekly_total"], previous
+    )
+
+    time_of_week = rng.integers(0, WEEK, count)
+    first = end - weeks * WEEK + time_of_week
+    return {
+        "profile": profile,
+        "survey": survey,
+        "survey_date": first - WEEK,
+        "checkup": checkup,
+        "checkup_date": (
+            np.repeat(first, weeks) + np.tile(np.arange(weeks) * WEEK, count)
+        ),
+    }
+
+
+def _datetimes(timestamps):
+    return [datetime.fromtimestamp(timestamp, UTC) for timestamp in timestamps.tolist()]
+
+
+def _values(columns, fields):
+    """Python values of ``fields``, one tuple per row, with None for NaN."""
+    values = []
+    for field in fields:
+        column = columns[field]
+        if column.dtype.kind == "f" and np.isnan(column).any():
+            values.append(np.where(np.isnan(column), None, column).tolist())
+        else:
+            values.append(column.tolist())
+    return list(zip(*values))
+
+
+def write_chunk(prefix, start, chunk, factors):
+    """Store a generated chunk and what is derived from it, in one transaction.
+
+    Returns the number of checkups written.
+    """
+    profile, survey, checkup = chunk["profile"], chunk["survey"], chunk["checkup"]
+    count = len(profile["house_type"])
+    weeks = len(checkup["weekly_total"]) // count
+    names = [username(prefix, number) for number in range(start, start + count)]
+    stamp = {
+        "factors_region": factors.region,
+        "factors_version": factors.version,
+        "updated_at": timezone.now(),
+    }
+    # Generated users cannot log in
+    password = make_password(None)
+
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in names]
+        )
+        ids = dict(
+            User.objects.filter(username__in=names).values_list("username", "id")
+        )
+        user_ids = [ids[name] for name in names]
+
+        UserProfile.objects.bulk_create(
+            UserProfile(
+                user_id=user_id,
+                display_name=name,
+                house_type=house_type,
+                household_size=household_size,
+                carbon_goal=carbon_goal,
+                onboarding_completed=True,
+            )
+            for user_id, name, (house_type, household_size, carbon_goal) in zip(
+                user_ids,
+                names,
+                _values(profile, ["house_type", "household_size", "carbon_goal"]),
+            )
+        )
+
+        survey_fields = [*INITIAL_ANSWER_FIELDS, *INITIAL_RESULT_FIELDS]
+        InitialSurveyResult.objects.bulk_create(
+            InitialSurveyResult(
+                user_id=user_id,
+                date_submitted=date_submitted,
+                **dict(zip(survey_fields, values)),
+                **stamp,
+            )
+            for user_id, date_submitted, values in zip(
+                user_ids,
+                _datetimes(chunk["survey_date"]),
+                _values(survey, survey_fields),
+            )
+        )
+
+        # Checkups are most of the rows, so they skip the ORM
+        insert_rows(
+            WeeklyCheckupResult,
+            CHECKUP_COLUMNS,
+            [
+                (user_id, date_submitted, *values, *stamp.values())
+                for user_id, date_submitted, values in zip(
+                    np.repeat(user_ids, weeks).tolist(),
+                    _datetimes(chunk["checkup_date"]),
+                    _values(checkup, [*WEEKLY_ANSWER_FIELDS, *WEEKLY_RESULT_FIELDS]),
+                )
+            ],
+        )
+        rebuild_user_rollups(user_ids)
+
+        latest = checkup["monthly_estimate"][weeks - 1 :: weeks].tolist()
+        CarbonGoal.objects.bulk_create(
+            CarbonGoal(
+                user_id=user_id,
+                month=current_month(),
+                target_amount=target,
+                current_amount=current,
+            )
+            for user_id, target, current in zip(
+                user_ids, profile["carbon_goal"].tolist(), latest
+            )
+        )
+
+        dashboards = bulk_dashboard_data(user_ids)
+        DashboardSnapshot.objects.bulk_create(
+            DashboardSnapshot(
+                user_id=user_id, version=SNAPSHOT_VERSION, data=dashboards[user_id]
+            )
+            for user_id in user_ids
+        )
+    return count * weeks
@@ -1 +1,1247 @@
-# Create your tests here.
+import csv
+import importlib.util
+import io
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.charts.goals import current_month
+from apps.charts.models import CarbonGoal, RankBucket, RankEntry
+from apps.charts.rollups import add_checkup
+from apps.charts.views import CHARTS
+
+from .carbon_calculator import CarbonCalculator, CompiledWeeklyCalculator
+from .checkup_import import COLUMNS
+from .dashboard import bulk_dashboard_data, load_dashboard_data, rebuild_snapshot
+from .emission_factors import (
+    BUILTIN_FACTORS,
+    FactorRegistry,
+    load_factor_set,
+    region_version,
+)
+from .export import export_rows
+from .models import (
+    DashboardSnapshot,
+    InitialSurveyResult,
+    UserProfile,
+    WeeklyCheckupResult,
+)
+from .scenarios import initial_scenarios, weekly_scenarios
+from .uncertainty import FootprintUncertainty
+from .user_context import UserContext
+
+
+def random_answers(weights, count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {field: rng.choice(list(choices)) for field, choices in weights.items()}
+        for _ in range(count)
+    ]
+
+
+def to_columns(rows):
+    return {field: [row[field] for row in rows] for field in rows[0]}
+
+
+class CarbonCalculatorBatchTests(SimpleTestCase):
+    def assert_matches_scalar(self, batch, scalar_results):
+        for key in scalar_results[0]:
+            expected = np.array(
+                [np.nan if r[key] is None else r[key] for r in scalar_results]
+            )
+            # Exact equality: the batch path must match bit for bit
+            np.testing.assert_array_equal(batch[key], expected, err_msg=key)
+
+    def test_initial_survey_batch_matches_scalar(self):
+        rows = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 500)
+        rng = random.Random(1)
+        for row in rows:
+            row["renewable_pct"] = rng.choice([0, 25, 50, 75, 100])
+            row["household_size"] = rng.randint(1, 6)
+
+        batch = CarbonCalculator.calculate_initial_survey_batch(to_columns(rows))
+        self.assert_matches_scalar(
+            batch, [CarbonCalculator.calculate_initial_survey(row) for row in rows]
+        )
+
+    def test_weekly_checkup_batch_matches_scalar_for_every_answer(self):
+        weights = CarbonCalculator.WEEKLY_WEIGHTS
+        rows = [
+            dict(zip(weights, combo))
+            for combo in itertools.product(
+                *(list(choices) for choices in weights.values())
+            )
+        ]
+        last_totals = [None, 0, 55.5, 120.0] * (len(rows) // 4)
+        household_sizes = [1, 2, 3, 4, 5] * (len(rows) // 5)
+
+        batch = CarbonCalculator.calculate_weekly_checkup_batch(
+            to_columns(rows),
+            last_week_total=[np.nan if t is None else t for t in last_totals],
+            household_size=household_sizes,
+        )
+        self.assert_matches_scalar(
+            batch,
+            [
+                CarbonCalculator.calculate_weekly_checkup(row, last, size)
+                for row, last, size in zip(rows, last_totals, household_sizes)
+            ],
+        )
+
+    def test_batch_accepts_dataframes_and_encoded_columns(self):
+        import pandas as pd
+
+        rows = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 50)
+        expected = CarbonCalculator.calculate_weekly_checkup_batch(to_columns(rows))
+
+        frame = pd.DataFrame(rows).astype("category")
+        from_frame = CarbonCalculator.calculate_weekly_checkup_batch(frame)
+        encoded = {
+            field: [list(choices).index(row[field]) for row in rows]
+            for field, choices in CarbonCalculator.WEEKLY_WEIGHTS.items()
+        }
+        from_indices = CarbonCalculator.calculate_weekly_checkup_batch(encoded)
+        from_arrays = CarbonCalculator.calculate_weekly_checkup_batch(
+            {field: np.array(values) for field, values in to_columns(rows).items()}
+        )
+
+        for key, values in expected.items():
+            np.testing.assert_array_equal(from_frame[key], values)
+            np.testing.assert_array_equal(from_indices[key], values)
+            np.testing.assert_array_equal(from_arrays[key], values)
+
+    def test_batch_rejects_unknown_choice_codes(self):
+        columns = to_columns(random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 3))
+        columns["water_usage"][1] = "FLOOD"
+        with self.assertRaisesMessage(KeyError, "unknown choice(s) FLOOD"):
+            CarbonCalculator.calculate_weekly_checkup_batch(columns)
+        columns["water_usage"] = np.array(columns["water_usage"])
+        with self.assertRaisesMessage(KeyError, "unknown choice(s) FLOOD"):
+            CarbonCalculator.calculate_weekly_checkup_batch(columns)
+
+
+class CompiledWeeklyCalculatorTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.compiled = CompiledWeeklyCalculator()
+
+    def test_table_matches_scalar_reference(self):
+        self.assertEqual(self.compiled.verify(), [])
+
+    def test_calculate_matches_scalar(self):
+        for row in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 200):
+            for last_week_total, household_size in [(None, 1), (0, 2), (73.2, 3)]:
+                self.assertEqual(
+                    self.compiled.calculate(row, last_week_total, household_size),
+                    CarbonCalculator.calculate_weekly_checkup(
+                        row, last_week_total, household_size
+                    ),
+                )
+
+    def test_calculate_batch_matches_batch_path(self):
+        columns = to_columns(random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 300))
+        last = np.linspace(0, 150, 300)
+        expected = CarbonCalculator.calculate_weekly_checkup_batch(columns, last, 2)
+        actual = self.compiled.calculate_batch(columns, last, 2)
+        for key, values in expected.items():
+            np.testing.assert_array_equal(actual[key], values, err_msg=key)
+
+    def test_save_and_load_round_trip(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.compiled.save(directory)
+            loaded = CompiledWeeklyCalculator.load(directory)
+        np.testing.assert_array_equal(loaded.table, self.compiled.table)
+
+
+class RecomputeResultsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("recompute", password="x")
+        UserProfile.objects.create(user=self.user, household_size=2)
+        last_week_total = None
+        for answers in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 5):
+            results = CarbonCalculator.calculate_weekly_checkup(
+                answers, last_week_total, 2
+            )
+            WeeklyCheckupResult.objects.create(user=self.user, **answers, **results)
+            last_week_total = results["weekly_total"]
+        self.expected = list(
+            WeeklyCheckupResult.objects.order_by("id").values_list(
+                "weekly_total", "pct_change_from_last", "monthly_estimate_per_person"
+            )
+        )
+
+    def recompute(self, **options):
+        call_command("recompute_results", workers=0, stdout=io.StringIO(), **options)
+
+    def test_stale_rows_are_rescored_and_stamped(self):
+        goal = CarbonGoal.objects.create(
+            user=self.user, month=current_month(), target_amount=50
+        )
+        WeeklyCheckupResult.objects.update(
+            factors_version=0, weekly_total=0, monthly_estimate_per_person=0
+        )
+        self.recompute()
+        rows = WeeklyCheckupResult.objects.order_by("id")
+        self.assertEqual(
+            list(
+                rows.values_list(
+                    "weekly_total",
+                    "pct_change_from_last",
+                    "monthly_estimate_per_person",
+                )
+            ),
+            self.expected,
+        )
+        self.assertEqual(
+            set(rows.values_list("factors_version", flat=True)),
+            {CarbonCalculator.FACTORS_VERSION},
+        )
+        # Goals and the dashboard follow the re-scored totals
+        goal.refresh_from_db()
+        self.assertEqual(
+            goal.current_amount,
+            WeeklyCheckupResult.objects.latest("date_submitted", "id").monthly_estimate,
+        )
+        call_command("rebuild_dashboard_snapshots", check=True, stdout=io.StringIO())
+
+    def test_dry_run_does_not_write(self):
+        WeeklyCheckupResult.objects.update(factors_version=0, weekly_total=0)
+        self.recompute(dry_run=True)
+        self.assertFalse(WeeklyCheckupResult.objects.exclude(weekly_total=0).exists())
+
+
+class CarbonCalcCommandTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 25)
+        for i, answers in enumerate(self.answers):
+            answers["id"] = i
+            answers["last_week_total"] = 50.0 if i % 2 else None
+
+    def carbon_calc(self, name, content, *args, **options):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        stdout = io.StringIO()
+        call_command(
+            "carbon_calc",
+            "weekly",
+            path,
+            *args,
+            stdout=stdout,
+            **{"stderr": io.StringIO(), **options},
+        )
+        return stdout.getvalue()
+
+    def expected(self, answers):
+        return CarbonCalculator.calculate_weekly_checkup(
+            answers, answers["last_week_total"]
+        )
+
+    def test_ndjson_rows_are_scored_in_order_across_batches(self):
+        content = "".join(json.dumps(answers) + "\n" for answers in self.answers)
+        output = self.carbon_calc("answers.ndjson", content, batch_size=4)
+        records = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([record["id"] for record in records], list(range(25)))
+        for answers, record in zip(self.answers, records):
+            for key, value in self.expected(answers).items():
+                self.assertEqual(record[key], value, key)
+
+    def test_csv_output_appends_result_columns(self):
+        fields = list(self.answers[0])
+        content = ",".join(fields) + "\n"
+        for answers in self.answers:
+            content += ",".join(
+                "" if answers[field] is None else str(answers[field])
+                for field in fields
+            )
+            content += "\n"
+        output = self.carbon_calc("answers.csv", content)
+        rows = list(csv.DictReader(io.StringIO(output)))
+        self.assertEqual(len(rows), 25)
+        for answers, row in zip(self.answers, rows):
+            self.assertEqual(
+                float(row["weekly_total"]), self.expected(answers)["weekly_total"]
+            )
+
+    def test_invalid_records_stop_the_run_unless_skipped(self):
+        self.answers[3]["water_usage"] = "FLOOD"
+        content = "".join(json.dumps(answers) + "\n" for answers in self.answers)
+        with self.assertRaisesMessage(CommandError, "Record 4: water_usage"):
+            self.carbon_calc("answers.ndjson", content)
+        output = self.carbon_calc("answers.ndjson", content, skip_invalid=True)
+        self.assertEqual(len(output.splitlines()), 24)
+
+    def test_empty_objects_and_unhashable_choices_are_skipped(self):
+        self.answers[1] = {}
+        self.answers[4]["heating_usage"] = ["OFF"]
+        self.answers[6]["water_usage"] = {"a": 1}
+        content = "".join(json.dumps(answers) + "\n" for answers in self.answers)
+        stderr = io.StringIO()
+        output = self.carbon_calc(
+            "answers.ndjson", content, skip_invalid=True, stderr=stderr
+        )
+        self.assertEqual(len(output.splitlines()), 22)
+        self.assertIn("Skipping record 2: heating_usage: required", stderr.getvalue())
+        self.assertIn(
+            "Skipping record 5: heating_usage: invalid choice ['OFF']",
+            stderr.getvalue(),
+        )
+        self.assertIn(
+            "Skipping record 7: water_usage: invalid choice {'a': 1}",
+            stderr.getvalue(),
+        )
+
+
+class ScoringApiTests(SimpleTestCase):
+    def setUp(self):
+        self.records = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 30)
+
+    def post(self, body, kind="weekly"):
+        return self.client.post(
+            f"/api/score/{kind}/", body, content_type="application/json"
+        )
+
+    def test_records_and_columns_are_scored_in_order(self):
+        expected = [
+            CarbonCalculator.calculate_weekly_checkup(record, None, 1)
+            for record in self.records
+        ]
+        response = self.post({"records": self.records})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], expected)
+        self.assertEqual(response.json()["factors_region"], "default")
+
+        response = self.post({"columns": to_columns(self.records)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"]["weekly_total"],
+            [result["weekly_total"] for result in expected],
+        )
+
+    def test_invalid_rows_are_reported_together(self):
+        self.records[2]["water_usage"] = "FLOOD"
+        self.records[5]["household_size"] = 0
+        response = self.post(self.records)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]), {"2", "5"})
+
+    def test_array_and_object_choices_are_invalid_choices(self):
+        self.records[1]["heating_usage"] = ["OFF"]
+        self.records[3]["water_usage"] = {"a": 1}
+        for body in (self.records, {"columns": to_columns(self.records)}):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.json()["errors"],
+                {
+                    "1": ["heating_usage: invalid choice ['OFF']"],
+                    "3": ["water_usage: invalid choice {'a': 1}"],
+                },
+            )
+
+    @override_settings(SCORING_API_MAX_BYTES=100)
+    def test_body_limit_applies_to_the_bytes_read(self):
+        from apps.pages.api import LimitedJSONParser, RequestTooLarge
+
+        # As a chunked request without a Content-Length would be read
+        body = json.dumps({"records": self.records}).encode()
+        with self.assertRaises(RequestTooLarge):
+            LimitedJSONParser().parse(io.BytesIO(body))
+        self.assertEqual(
+            LimitedJSONParser().parse(io.BytesIO(b'{"records": []}')), {"records": []}
+        )
+        self.assertEqual(self.post({"records": self.records}).status_code, 413)
+
+    @override_settings(SCORING_API_MAX_RECORDS=10)
+    def test_requests_over_the_record_limit_are_rejected(self):
+        self.assertEqual(self.post({"records": self.records}).status_code, 413)
+        self.assertEqual(
+            self.post({"records": self.records}, "yearly").status_code, 404
+        )
+
+
+class FactorRegistryTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.registry = FactorRegistry(self.directory.name, check_interval=0)
+
+    def write_region(self, region, data, mtime):
+        path = os.path.join(self.directory.name, f"{region}.json")
+        with open(path, "w") as f:
+            json.dump(data, f)
+        os.utime(path, ns=(mtime, mtime))
+
+    def test_default_region_uses_builtin_weights(self):
+        self.assertIs(self.registry.get(), BUILTIN_FACTORS)
+        self.assertEqual(self.registry.regions(), ["default"])
+
+    def test_region_file_overrides_weights_and_reloads_on_change(self):
+        self.write_region(
+            "north", {"version": 2, "weekly": {"energy_source": {"STANDARD": 30}}}, 1
+        )
+        factors = self.registry.get("north")
+        self.assertEqual(
+            factors.stamp,
+            {"factors_region": "north", "factors_version": region_version(2)},
+        )
+        self.assertEqual(factors.weekly["energy_source"]["STANDARD"], 30)
+        self.assertEqual(
+            factors.weekly["water_usage"],
+            CarbonCalculator.WEEKLY_WEIGHTS["water_usage"],
+        )
+        self.assertIs(self.registry.get("north"), factors)
+
+        self.write_region(
+            "north", {"version": 3, "weekly": {"energy_source": {"STANDARD": 25}}}, 2
+        )
+        reloaded = self.registry.get("north")
+        self.assertEqual(reloaded.version, region_version(3))
+        answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 1)[0]
+        self.assertEqual(
+            reloaded.calculate_weekly_checkup(answers),
+            CarbonCalculator.calculate_weekly_checkup(answers, weights=reloaded.weekly),
+        )
+
+    def test_builtin_version_is_part_of_region_versions(self):
+        self.write_region("north", {"version": 2}, 1)
+        path = os.path.join(self.directory.name, "north.json")
+        version = load_factor_set("north", path).version
+        with mock.patch.object(
+            CarbonCalculator, "FACTORS_VERSION", CarbonCalculator.FACTORS_VERSION + 1
+        ):
+            self.assertNotEqual(load_factor_set("north", path).version, version)
+
+    def test_invalid_file_keeps_last_good_set(self):
+        self.write_region("north", {"version": 2}, 1)
+        factors = self.registry.get("north")
+        self.write_region("north", {"version": 3, "weekly": {"rain": {}}}, 2)
+        with self.assertLogs("apps.pages.emission_factors", "ERROR"):
+            self.assertIs(self.registry.get("north"), factors)
+
+    def test_unknown_region_falls_back_to_default(self):
+        with self.assertLogs("apps.pages.emission_factors", "WARNING"):
+            self.assertIs(self.registry.get("atlantis"), BUILTIN_FACTORS)
+
+
+class FootprintUncertaintyTests(SimpleTestCase):
+    def setUp(self):
+        self.weekly = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 20)
+        self.initial = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 20)
+        for answers in self.initial:
+            answers["renewable_pct"] = 50
+
+    def test_bands_collapse_to_point_estimate_without_spread(self):
+        fields = [*CarbonCalculator.MONTHLY_WEIGHTS, *CarbonCalculator.WEEKLY_WEIGHTS]
+        uncertainty = FootprintUncertainty(
+            BUILTIN_FACTORS, samples=10, spreads=dict.fromkeys(fields, 0.0)
+        )
+        weekly = uncertainty.weekly_bands_batch(to_columns(self.weekly))
+        expected = CarbonCalculator.calculate_weekly_checkup_batch(
+            to_columns(self.weekly)
+        )["weekly_total"]
+        for column in weekly.T:
+            np.testing.assert_allclose(column, expected)
+
+        initial = uncertainty.initial_bands_batch(to_columns(self.initial))
+        expected = CarbonCalculator.calculate_initial_survey_batch(
+            {**to_columns(self.initial), "household_size": [1] * 20}
+        )["monthly_total"]
+        for column in initial.T:
+            np.testing.assert_allclose(column, expected)
+
+    def test_single_band_matches_batch_row_and_is_ordered(self):
+        uncertainty = FootprintUncertainty(BUILTIN_FACTORS, samples=2000)
+        batch = uncertainty.weekly_bands_batch(to_columns(self.weekly))
+        for answers, row in zip(self.weekly, batch):
+            band = uncertainty.weekly_bands(answers)
+            self.assertEqual(list(band.values()), row.tolist())
+            self.assertLess(band["p5"], band["p50"])
+            self.assertLess(band["p50"], band["p95"])
+
+
+class ScenarioTests(TestCase):
+    def assert_scenarios_match(self, result, answers, total):
+        baseline = total(answers)
+        self.assertAlmostEqual(result["baseline"], baseline)
+        pair_deltas = []
+        for scenario in result["single"]:
+            ((_, field, code),) = scenario["changes"]
+            self.assertAlmostEqual(
+                scenario["delta"], total({**answers, field: code}) - baseline
+            )
+        for first, second in itertools.combinations(result["single"], 2):
+            ((_, field_a, code_a),) = first["changes"]
+            ((_, field_b, code_b),) = second["changes"]
+            if field_a != field_b:
+                changed = {**answers, field_a: code_a, field_b: code_b}
+                pair_deltas.append(total(changed) - baseline)
+        # The best pairs are the k smallest of all cross-field pairs
+        np.testing.assert_allclose(
+            [scenario["delta"] for scenario in result["pairs"]],
+            sorted(pair_deltas)[: len(result["pairs"])],
+        )
+
+    def test_weekly_scenarios_match_calculator(self):
+        for answers in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 5):
+            self.assert_scenarios_match(
+                weekly_scenarios(answers, BUILTIN_FACTORS, k=5),
+                answers,
+                lambda data: CarbonCalculator.calculate_weekly_checkup(data)[
+                    "weekly_total"
+                ],
+            )
+
+    def test_initial_scenarios_match_calculator(self):
+        for answers in random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 5):
+            answers["renewable_pct"] = 25
+            self.assert_scenarios_match(
+                initial_scenarios(answers, BUILTIN_FACTORS, k=5),
+                answers,
+                lambda data: CarbonCalculator.calculate_initial_survey(
+                    {**data, "household_size": 1}
+                )["monthly_total"],
+            )
+
+    def test_endpoint_returns_scenarios_and_revalidates(self):
+        cache.clear()
+        user = User.objects.create_user("planner", password="x")
+        UserProfile.objects.create(user=user, onboarding_completed=True)
+        answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 1)[0]
+        WeeklyCheckupResult.objects.create(
+            user=user, **answers, **CarbonCalculator.calculate_weekly_checkup(answers)
+        )
+        self.client.force_login(user)
+
+        response = self.client.get("/survey/scenarios/", {"k": 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["kind"], "weekly")
+        self.assertEqual(len(data["pairs"]), 3)
+        self.assertEqual(
+            set(data["single"][0]["changes"][0]),
+            {"field", "from", "to", "from_label", "to_label"},
+        )
+
+        response = self.client.get(
+            "/survey/scenarios/", {"k": 3}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(
+            self.client.get("/survey/scenarios/", {"source": "initial"}).status_code,
+            404,
+        )
+
+
+class DashboardQueryTests(TestCase):
+    # Session, user, profile with baseline, and snapshot (cohort stats cached)
+    INDEX_QUERIES = 4
+    # Session, user, profile with baseline, baseline survey and checkups
+    SURVEY_DASHBOARD_QUERIES = 5
+
+    def setUp(self):
+        from django.utils import timezone
+
+        cache.clear()
+
+        from apps.charts.models import CarbonGoal
+
+        self.user = User.objects.create_user("dashboard", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        answers = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 1)[0]
+        answers["renewable_pct"] = 25
+        InitialSurveyResult.objects.create(
+            user=self.user,
+            **{k: v for k, v in answers.items() if k != "home_type"},
+            **CarbonCalculator.calculate_initial_survey(
+                {**answers, "household_size": 1}
+            ),
+        )
+        CarbonGoal.objects.create(
+            user=self.user, month=timezone.now().replace(day=1), target_amount=50
+        )
+        self.client.force_login(self.user)
+
+    def add_checkups(self, count):
+        for answers in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, count):
+            add_checkup(
+                WeeklyCheckupResult.objects.create(
+                    user=self.user,
+                    **answers,
+                    **CarbonCalculator.calculate_weekly_checkup(answers),
+                )
+            )
+        rebuild_snapshot(self.user)
+
+    def test_query_counts_do_not_grow_with_history(self):
+        # The first view loads this month's cohort statistics into the cache
+        self.client.get("/")
+        for count in [1, 5, 20]:
+            self.add_checkups(count)
+            with self.assertNumQueries(self.INDEX_QUERIES):
+                self.assertEqual(self.client.get("/").status_code, 200)
+            with self.assertNumQueries(self.SURVEY_DASHBOARD_QUERIES):
+                self.assertEqual(self.client.get("/survey/").status_code, 200)
+
+    def test_week_over_week_change_uses_previous_checkup(self):
+        self.add_checkups(3)
+        checkups = list(WeeklyCheckupResult.objects.order_by("-date_submitted"))
+        results = self.client.get("/").context["previous_results"]
+        self.assertAlmostEqual(
+            results[0]["pct_change"],
+            (checkups[0].weekly_total - checkups[1].weekly_total)
+            / checkups[1].weekly_total
+            * 100,
+        )
+        self.assertIsNone(results[-1]["pct_change"])
+
+    def test_checkup_submission_rebuilds_snapshot(self):
+        self.add_checkups(2)
+        answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 1, seed=5)[0]
+        self.client.post("/survey/weekly/", answers)
+        data = DashboardSnapshot.objects.get(user=self.user).data
+        latest = WeeklyCheckupResult.objects.latest("date_submitted")
+        self.assertEqual(data["current_usage"]["weekly_total"], latest.weekly_total)
+        self.assertEqual(len(data["previous_results"]), 3)
+        self.assertEqual(data["goal"]["current_amount"], latest.monthly_estimate)
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+
+    def test_snapshot_command_rebuilds_missing_and_stale(self):
+        self.add_checkups(2)
+        other = User.objects.create_user("other", password="x")
+        WeeklyCheckupResult.objects.filter(user=self.user).update(weekly_total=1)
+
+        with self.assertRaisesMessage(
+            CommandError, "2 users checked: 1 missing, 1 stale"
+        ):
+            call_command("rebuild_dashboard_snapshots", check=True)
+        call_command("rebuild_dashboard_snapshots", stdout=io.StringIO())
+        call_command("rebuild_dashboard_snapshots", check=True, stdout=io.StringIO())
+        self.assertEqual(
+            DashboardSnapshot.objects.get(user=other).data,
+            load_dashboard_data(other),
+        )
+        self.assertEqual(
+            DashboardSnapshot.objects.get(user=self.user).data,
+            load_dashboard_data(self.user),
+        )
+
+    def test_bulk_data_orders_checkups_with_the_same_time_like_per_user(self):
+        self.add_checkups(3)
+        WeeklyCheckupResult.objects.update(date_submitted=timezone.now())
+        self.assertEqual(
+            bulk_dashboard_data([self.user.id])[self.user.id],
+            load_dashboard_data(self.user),
+        )
+
+    def test_dashboard_get_does_not_write(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.add_checkups(3)
+        for snapshot in [True, False]:
+            if not snapshot:
+                DashboardSnapshot.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get("/").status_code, 200)
+            writes = [
+                query["sql"]
+                for query in queries.captured_queries
+                if query["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")
+            ]
+            self.assertEqual(writes, [])
+
+
+class UserContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("context", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        answers = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 1)[0]
+        answers["renewable_pct"] = 25
+        self.survey = InitialSurveyResult.objects.create(
+            user=self.user,
+            **{k: v for k, v in answers.items() if k != "home_type"},
+            **CarbonCalculator.calculate_initial_survey(
+                {**answers, "household_size": 1}
+            ),
+        )
+
+    def test_loads_profile_and_baseline_in_one_query(self):
+        context = UserContext(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(context.profile.user, self.user)
+            self.assertEqual(context.baseline, self.survey)
+            self.assertIs(self.user.userprofile, context.profile)
+
+    def test_baseline_is_not_kept_across_requests(self):
+        self.assertEqual(UserContext(self.user).baseline, self.survey)
+        # As another process re-scoring the survey would
+        InitialSurveyResult.objects.filter(id=self.survey.id).update(monthly_total=1)
+        self.assertEqual(UserContext(self.user).baseline.monthly_total, 1)
+
+    def test_initial_survey_submission_invalidates_baseline(self):
+        self.survey.delete()
+        self.assertIsNone(UserContext(self.user).baseline)
+        self.client.force_login(self.user)
+
+        answers = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 1, seed=3)[0]
+        answers.pop("home_type")
+        self.client.post("/survey/initial/", {**answers, "renewable_pct": 0})
+        self.assertEqual(
+            UserContext(self.user).baseline,
+            InitialSurveyResult.objects.get(user=self.user),
+        )
+
+
+@skipUnless(connection.vendor == "sqlite", "reads SQLite query plans")
+class QueryPlanTests(TestCase):
+    """Per-user reads of the time-series tables must not scan or sort them."""
+
+    TABLES = (
+        "pages_weeklycheckupresult",
+        "pages_initialsurveyresult",
+        "charts_carbongoal",
+        "charts_userweekrollup",
+        "charts_usermonthrollup",
+        "charts_rankentry",
+    )
+    # A whole-table scan, or a sort of the rows read
+    UNINDEXED = re.compile(r"^SCAN \w+$|USE TEMP B-TREE FOR ORDER BY")
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("plans", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        self.client.force_login(self.user)
+        answers = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 1)[0]
+        answers.pop("home_type")
+        self.client.post("/survey/initial/", {**answers, "renewable_pct": 0})
+        self.client.post("/detailed/manage-goal/", {"target_amount": 100})
+
+    def assert_indexed(self, queries):
+        checked = 0
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not any(
+                table in sql for table in self.TABLES
+            ):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            with self.subTest(sql=sql):
+                self.assertFalse(
+                    [step for step in plan if self.UNINDEXED.search(step)], plan
+                )
+            checked += 1
+        self.assertTrue(checked)
+
+    def test_hot_queries_use_indexes(self):
+        for answers in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 3):
+            with CaptureQueriesContext(connection) as submit:
+                self.client.post("/survey/weekly/", answers)
+            self.assert_indexed(submit.captured_queries)
+
+        cache.clear()
+        cursor = self.client.get("/survey/history/?size=1").json()["next"]
+        with CaptureQueriesContext(connection) as pages:
+            for url in [
+                "/",
+                "/survey/",
+                "/survey/history/?size=1",
+                f"/survey/history/?cursor={cursor}",
+                "/detailed/",
+                "/detailed/manage-goal/",
+                *(f"/detailed/data/{chart}/" for chart in CHARTS),
+            ]:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            for kind in ["initial", "weekly"]:
+                b"".join(self.client.get(f"/survey/export/{kind}/").streaming_content)
+        self.assert_indexed(pages.captured_queries)
+
+
+class CheckupHistoryTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        cache.clear()
+        self.user = User.objects.create_user("history", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 1)[0]
+        results = CarbonCalculator.calculate_weekly_checkup(answers)
+        checkups = WeeklyCheckupResult.objects.bulk_create(
+            [
+                WeeklyCheckupResult(user=self.user, **answers, **results)
+                for _ in range(30)
+            ]
+        )
+        now = timezone.now()
+        for i, checkup in enumerate(checkups):
+            # Pairs of checkups share a timestamp, so cursors must break ties
+            checkup.date_submitted = now - timedelta(weeks=i // 2)
+            checkup.weekly_total = i
+        WeeklyCheckupResult.objects.bulk_update(
+            checkups, ["date_submitted", "weekly_total"]
+        )
+        self.client.force_login(self.user)
+
+    def history(self):
+        return list(
+            WeeklyCheckupResult.objects.filter(user=self.user)
+            .order_by("-date_submitted", "-id")
+            .values_list("weekly_total", flat=True)
+        )
+
+    def test_pages_cover_history_in_order(self):
+        totals, cursor, queries = [], None, set()
+        while True:
+            params = {"size": 7, **({"cursor": cursor} if cursor else {})}
+            with CaptureQueriesContext(connection) as page_queries:
+                page = self.client.get("/survey/history/", params).json()
+            queries.add(len(page_queries))
+            self.assertEqual(page["fields"][1], "weekly_total")
+            totals += [row[1] for row in page["rows"]]
+            cursor = page["next"]
+            if cursor is None:
+                break
+        self.assertEqual(totals, self.history())
+        # Every page costs the same number of queries
+        self.assertEqual(len(queries), 1)
+
+    def test_survey_dashboard_continues_from_recent_checkups(self):
+        response = self.client.get("/survey/")
+        totals = [
+            checkup.weekly_total for checkup in response.context["weekly_checkups"]
+        ]
+        page = self.client.get(
+            "/survey/history/", {"cursor": response.context["history_cursor"]}
+        ).json()
+        totals += [row[1] for row in page["rows"]]
+        self.assertEqual(totals, self.history())
+
+    def test_bad_parameters_are_rejected(self):
+        for params in [{"cursor": "nope"}, {"size": 0}, {"size": 1000}]:
+            self.assertEqual(
+                self.client.get("/survey/history/", params).status_code, 400
+            )
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("export", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        self.client.force_login(self.user)
+        answers = random_answers(CarbonCalculator.MONTHLY_WEIGHTS, 1)[0]
+        answers.pop("home_type")
+        self.client.post("/survey/initial/", {**answers, "renewable_pct": 0})
+        for answers in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 25):
+            self.client.post("/survey/weekly/", answers)
+
+    def test_weekly_checkups_stream_oldest_first(self):
+        response = self.client.get("/survey/export/weekly/")
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(
+            csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode()))
+        )
+        checkups = WeeklyCheckupResult.objects.filter(user=self.user).order_by(
+            "date_submitted", "id"
+        )
+        self.assertEqual(
+            [float(row["weekly_total"]) for row in rows],
+            [checkup.weekly_total for checkup in checkups],
+        )
+        self.assertEqual(rows[0]["heating_usage"], checkups[0].heating_usage)
+        self.assertNotIn("user", rows[0])
+
+        initial = self.client.get("/survey/export/initial/")
+        self.assertEqual(len(b"".join(initial.streaming_content).splitlines()), 2)
+        self.assertEqual(self.client.get("/survey/export/other/").status_code, 404)
+
+    def test_header_comes_before_any_query_and_chunks_join_up(self):
+        chunks = export_rows(self.user, "weekly", chunk_size=4)
+        with self.assertNumQueries(0):
+            header = next(chunks)
+        self.assertTrue(header.startswith("date_submitted,"))
+        with self.assertNumQueries(8):
+            body = "".join(chunks)
+        self.assertEqual(header + body, "".join(export_rows(self.user, "weekly")))
+
+
+class CheckupImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("history", password="x")
+        UserProfile.objects.create(
+            user=self.user, household_size=2, onboarding_completed=True
+        )
+        self.answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 6, seed=3)
+        self.before = WeeklyCheckupResult.objects.create(
+            user=self.user,
+            date_submitted=timezone.make_aware(datetime(2024, 1, 1)),
+            **self.answers[0],
+            **CarbonCalculator.calculate_weekly_checkup(self.answers[0]),
+        )
+        add_checkup(self.before)
+
+    def csv(self, rows):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return out.getvalue()
+
+    def run_import(self, rows, *args):
+        path = os.path.join(tempfile.mkdtemp(), "checkups.csv")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "w", newline="") as f:
+            f.write(self.csv(rows))
+        stderr = io.StringIO()
+        call_command(
+            "import_checkups", path, *args, stdout=io.StringIO(), stderr=stderr
+        )
+        return stderr.getvalue()
+
+    def rows(self):
+        return [
+            {"username": "history", "date_submitted": f"2024-02-{day:02d}", **answers}
+            for day, answers in zip(range(1, 29, 7), self.answers[1:5])
+        ]
+
+    def test_rows_are_scored_and_chained_in_date_order(self):
+        rows = self.rows()
+        # Shuffled within and across batches of two
+        self.run_import([rows[3], rows[0], rows[2], rows[1]], "--batch-size", "2")
+
+        imported = list(
+            WeeklyCheckupResult.objects.filter(user=self.user)
+            .exclude(id=self.before.id)
+            .order_by("date_submitted")
+        )
+        self.assertEqual(
+            [checkup.date_submitted.day for checkup in imported], [1, 8, 15, 22]
+        )
+        last = self.before.weekly_total
+        for checkup, answers in zip(imported, self.answers[1:5]):
+            expected = CarbonCalculator.calculate_weekly_checkup(answers, last, 2)
+            self.assertEqual(checkup.heating_usage, answers["heating_usage"])
+            self.assertAlmostEqual(checkup.weekly_total, expected["weekly_total"])
+            self.assertAlmostEqual(
+                checkup.pct_change_from_last, expected["pct_change_from_last"]
+            )
+            last = checkup.weekly_total
+
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+        self.assertTrue(DashboardSnapshot.objects.filter(user=self.user).exists())
+
+    def test_stored_checkups_between_and_after_are_rechained(self):
+        for day, answers in ((10, self.answers[5]), (29, self.answers[0])):
+            WeeklyCheckupResult.objects.create(
+                user=self.user,
+                date_submitted=timezone.make_aware(datetime(2024, 2, day)),
+                **answers,
+                **CarbonCalculator.calculate_weekly_checkup(
+                    answers, self.before.weekly_total, 2
+                ),
+            )
+        self.run_import(self.rows(), "--batch-size", "2")
+
+        last = None
+        for checkup in WeeklyCheckupResult.objects.order_by("date_submitted"):
+            expected = (
+                None if last is None else (checkup.weekly_total - last) / last * 100
+            )
+            if expected is None:
+                self.assertIsNone(checkup.pct_change_from_last)
+            else:
+                self.assertAlmostEqual(checkup.pct_change_from_last, expected)
+            last = checkup.weekly_total
+
+    def test_chaining_queries_do_not_grow_with_users(self):
+        from apps.pages.checkup_import import CheckupImport
+
+        def save_queries(usernames):
+            run = CheckupImport()
+            records = [
+                {**row, "username": username}
+                for username in usernames
+                for row in self.rows()[:2]
+            ]
+            checkups, errors = run.prepare(1, records)
+            self.assertEqual(errors, [])
+            with CaptureQueriesContext(connection) as queries:
+                run.save(checkups)
+            return len(queries)
+
+        for username in ("second", "third"):
+            user = User.objects.create_user(username, password="x")
+            UserProfile.objects.create(user=user, onboarding_completed=True)
+            WeeklyCheckupResult.objects.create(
+                user=user,
+                date_submitted=timezone.make_aware(datetime(2024, 1, 1)),
+                **self.answers[0],
+                **CarbonCalculator.calculate_weekly_checkup(self.answers[0]),
+            )
+        self.assertEqual(save_queries(["history"]), save_queries(["second", "third"]))
+
+    def test_invalid_records_stop_the_import_unless_skipped(self):
+        rows = self.rows()
+        rows[1] = {**rows[1], "username": "nobody"}
+        rows[2] = {**rows[2], "water_usage": "LOTS"}
+        rows[3] = {**rows[3], "date_submitted": "2024-01-31"}
+        with self.assertRaisesMessage(CommandError, "Record 2: username: unknown user"):
+            self.run_import(rows, "--batch-size", "3")
+        self.assertEqual(WeeklyCheckupResult.objects.count(), 1)
+
+        stderr = self.run_import(rows, "--batch-size", "3", "--skip-invalid")
+        self.assertIn("Skipping record 3: water_usage: invalid choice 'LOTS'", stderr)
+        # Record 4 is in the next batch and dated before record 1, which is fine
+        self.assertNotIn("Skipping record 4", stderr)
+        self.assertEqual(WeeklyCheckupResult.objects.count(), 3)
+
+    def test_admin_upload(self):
+        admin = User.objects.create_superuser("admin", password="x")
+        self.client.force_login(admin)
+        upload = io.BytesIO(self.csv(self.rows()).encode())
+        upload.name = "checkups.csv"
+        response = self.client.post(
+            "/admin/pages/weeklycheckupresult/import/", {"file": upload}
+        )
+        self.assertRedirects(response, "/admin/pages/weeklycheckupresult/")
+        self.assertEqual(WeeklyCheckupResult.objects.count(), 5)
+
+        # Checkups are read-only; edits would skip the rollups and ranks
+        response = self.client.get("/admin/pages/weeklycheckupresult/")
+        self.assertContains(response, "Import CSV")
+        self.assertNotContains(response, "/admin/pages/weeklycheckupresult/add/")
+        change = f"/admin/pages/weeklycheckupresult/{self.before.id}/change/"
+        self.client.post(change, {"weekly_total": "1"})
+        self.before.refresh_from_db()
+        self.assertNotEqual(self.before.weekly_total, 1)
+        response = self.client.get(
+            f"/admin/pages/weeklycheckupresult/{self.before.id}/delete/"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class GenerateDatasetTests(TestCase):
+    def generate(self, **options):
+        call_command(
+            "generate_dataset",
+            users=3,
+            weeks=5,
+            chunk_size=2,
+            workers=0,
+            stdout=io.StringIO(),
+            **options,
+        )
+
+    def test_users_get_weekly_histories_and_derived_rows(self):
+        self.generate()
+        users = User.objects.filter(username__startswith="synthetic-")
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(WeeklyCheckupResult.objects.count(), 15)
+
+        week = timedelta(weeks=1)
+        for user in users:
+            survey = InitialSurveyResult.objects.get(user=user)
+            checkups = list(
+                WeeklyCheckupResult.objects.filter(user=user).order_by("date_submitted")
+            )
+            self.assertEqual(checkups[0].date_submitted - survey.date_submitted, week)
+            self.assertEqual(
+                [
+                    b.date_submitted - a.date_submitted
+                    for a, b in itertools.pairwise(checkups)
+                ],
+                [week] * 4,
+            )
+            self.assertLess(checkups[-1].date_submitted, timezone.now())
+            self.assertIsNone(checkups[0].pct_change_from_last)
+            self.assertAlmostEqual(
+                checkups[1].pct_change_from_last,
+                (checkups[1].weekly_total / checkups[0].weekly_total - 1) * 100,
+            )
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+        call_command("rebuild_dashboard_snapshots", check=True, stdout=io.StringIO())
+
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            self.generate()
+
+    def test_same_seed_gives_the_same_data(self):
+        self.generate(seed=7, prefix="a-")
+        self.generate(seed=7, prefix="b-")
+        self.generate(seed=8, prefix="c-")
+
+        def totals(prefix):
+            return list(
+                WeeklyCheckupResult.objects.filter(user__username__startswith=prefix)
+                .order_by("user__username", "date_submitted")
+                .values_list("weekly_total", "date_submitted")
+            )
+
+        self.assertEqual(totals("a-"), totals("b-"))
+        self.assertNotEqual(totals("a-"), totals("c-"))
+
+
+class DeleteUserTests(TestCase):
+    def setUp(self):
+        call_command(
+            "generate_dataset",
+            users=5,
+            weeks=6,
+            chunk_size=2,
+            workers=0,
+            stdout=io.StringIO(),
+        )
+        self.other = User.objects.create_user("other")
+        UserProfile.objects.create(user=self.other)
+        answers = random_answers(CarbonCalculator.WEEKLY_WEIGHTS, 1)[0]
+        add_checkup(
+            WeeklyCheckupResult.objects.create(
+                user=self.other,
+                **answers,
+                **CarbonCalculator.calculate_weekly_checkup(answers),
+            )
+        )
+        call_command("rebuild_ranks", months=3, stdout=io.StringIO())
+
+    def test_deletes_users_in_chunks_and_rebuilds_aggregates(self):
+        out = io.StringIO()
+        call_command(
+            "delete_user", prefix="synthetic-", force=True, chunk_size=2, stdout=out
+        )
+        output = out.getvalue()
+        self.assertIn("Will delete 5 users", output)
+        self.assertIn("- Weekly checkup results: 30", output)
+        self.assertIn("  5/5 users", output)
+        self.assertIn("Deleted 5 users", output)
+
+        self.assertEqual(list(User.objects.all()), [self.other])
+        self.assertEqual(WeeklyCheckupResult.objects.count(), 1)
+        self.assertFalse(InitialSurveyResult.objects.exists())
+        self.assertFalse(RankEntry.objects.exclude(user=self.other).exists())
+        self.assertEqual(
+            RankBucket.objects.aggregate(total=Sum("count"))["total"],
+            RankEntry.objects.count(),
+        )
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+
+    def test_file_warns_about_missing_users_and_asks_first(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("# users to remove\nsynthetic-0000000\n\nnobody\n")
+        self.addCleanup(os.remove, f.name)
+
+        out = io.StringIO()
+        with mock.patch("builtins.input", return_value="n"):
+            call_command("delete_user", file=f.name, stdout=out)
+        self.assertIn("User nobody does not exist", out.getvalue())
+        self.assertIn("Will delete 1 users (synthetic-0000000)", out.getvalue())
+        self.assertIn("Operation cancelled", out.getvalue())
+        self.assertTrue(User.objects.filter(username="synthetic-0000000").exists())
+
+        with self.assertRaisesMessage(CommandError, "--file or --prefix"):
+            call_command("delete_user", stdout=io.StringIO())
+
+
+@skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+class WarehouseExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("warehouse", password="x")
+        UserProfile.objects.create(user=self.user, onboarding_completed=True)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def add_checkups(self, count):
+        for answers in random_answers(CarbonCalculator.WEEKLY_WEIGHTS, count):
+            WeeklyCheckupResult.objects.create(
+                user=self.user,
+                **answers,
+                **CarbonCalculator.calculate_weekly_checkup(answers),
+            )
+
+    def export(self):
+        output = io.StringIO()
+        call_command(
+            "export_warehouse", self.directory, "--batch-size", "2", stdout=output
+        )
+        return output.getvalue()
+
+    def test_rewrites_only_changed_blocks(self):
+        import pyarrow.parquet as pq
+
+        self.add_checkups(5)
+        with mock.patch("apps.pages.warehouse.BLOCK_SIZE", 4):
+            self.assertIn("5 rows", self.export())
+            directory = os.path.join(self.directory, "weekly_checkups")
+            checkups = list(WeeklyCheckupResult.objects.order_by("id"))
+            first = f"block-{checkups[0].id // 4:08d}.parquet"
+            first_ids = [c.id for c in checkups if c.id // 4 == checkups[0].id // 4]
+            # Batches of two rows, written as row groups
+            self.assertEqual(
+                pq.ParquetFile(os.path.join(directory, first)).num_row_groups,
+                (len(first_ids) + 1) // 2,
+            )
+            untouched = os.stat(os.path.join(directory, first)).st_ino
+
+            # Re-scored in place, added and purged rows all reach the export
+            checkups[-1].weekly_total = 123.0
+            checkups[-1].save()
+            self.add_checkups(2)
+            self.export()
+            self.assertEqual(os.stat(os.path.join(directory, first)).st_ino, untouched)
+            WeeklyCheckupResult.objects.filter(id__in=first_ids).delete()
+            self.export()
+
+        self.assertNotIn(first, os.listdir(directory))
+        table = pq.read_table(directory)
+        self.assertEqual(
+            sorted(
+                zip(
+                    table.column("id").to_pylist(),
+                    table.column("weekly_total").to_pylist(),
+                )
+            ),
+            list(
+                WeeklyCheckupResult.objects.order_by("id").values_list(
+                    "id", "weekly_total"
+                )
+            ),
+        )
+        self.assertEqual(
+            pq.read_table(
+                os.path.join(self.directory, "user_profiles", "snapshot.parquet")
+            )
+            .column("user_id")
+            .to_pylist(),
+            [self.user.id],
+        )
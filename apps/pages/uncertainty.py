@@ -0,0 +1,157 @@
+"""Monte Carlo uncertainty bands for footprint estimates.
+
+Each weight is treated as a lognormal distribution whose median is the point
+estimate, with a per-field spread (``WEIGHT_SPREADS``, the standard deviation
+of the log). Samples are drawn once per factor set as a row of multipliers per
+field; a user's band is their chosen weights times those multipliers, pushed
+through the same array formulas as the batch calculator, so every sample is
+one vectorized pass with no Python loop over samples.
+
+Multipliers are shared between users and between calls, so bands are
+deterministic and users with the same answers get the same band.
+"""
+
+from functools import cached_property
+
+import numpy as np
+
+from .carbon_calculator import (
+    _choice_index,
+    _initial_survey_totals,
+    _weekly_checkup_totals,
+    _weight_vector,
+    encode_choices,
+)
+
+SAMPLES = 10_000
+SEED = 20240101
+PERCENTILES = (5, 50, 95)
+ROWS_PER_PASS = 16
+DEFAULT_SPREAD = 0.2
+# Travel and heating factors vary most with vehicle, route and building stock
+WEIGHT_SPREADS = {
+    "car_type": 0.3,
+    "flights_per_year": 0.35,
+    "primary_heating": 0.3,
+    "daily_transport": 0.3,
+    "weekly_travel": 0.3,
+    "vehicle_type": 0.3,
+    "heating_usage": 0.3,
+}
+
+
+class FootprintUncertainty:
+    """Percentile bands of ``monthly_total`` and ``weekly_total`` for a factor set."""
+
+    def __init__(self, factors, samples=SAMPLES, seed=SEED, spreads=None):
+        self.factors = factors
+        self.samples = samples
+        self.seed = seed
+        self.spreads = WEIGHT_SPREADS if spreads is None else spreads
+
+    def _multipliers(self, weights, stream):
+        rng = np.random.default_rng([self.seed, stream])
+        normals = rng.standard_normal((len(weights), self.samples))
+        spreads = np.array(
+            [self.spreads.get(field, DEFAULT_SPREAD) for field in weights]
+        )
+        multipliers = np.exp(spreads[:, None] * normals)
+        return dict(zip(weights, multipliers))
+
+    @cached_property
+    def monthly_multipliers(self):
+        return self._multipliers(self.factors.monthly, 0)
+
+    @cached_property
+    def weekly_multipliers(self):
+        return self._multipliers(self.factors.weekly, 1)
+
+    def _bands(self, count, totals):
+        """Percentiles of ``totals(rows)`` for every row, a few rows per pass.
+
+        ``totals`` returns a ``(rows, samples)`` array; passes are kept small
+        so memory stays flat however many rows are scored.
+        """
+        bands = np.empty((count, len(PERCENTILES)))
+        for start in range(0, count, ROWS_PER_PASS):
+            rows = slice(start, start + ROWS_PER_PASS)
+            bands[rows] = np.percentile(totals(rows), PERCENTILES, axis=1).T
+        return bands
+
+    def initial_bands_batch(self, columns):
+        """Bands of ``monthly_total`` for columns of initial survey answers.
+
+        ``columns`` is as for ``calculate_initial_survey_batch`` (without
+        ``household_size``). Returns an array of shape ``(rows, 3)`` holding
+        the 5th, 50th and 95th percentiles.
+        """
+        weights = self.factors.monthly
+        indices = _encode(weights, columns)
+        heating_is_elec = indices["primary_heating"] == _choice_index(
+            weights, "primary_heating", "ELEC"
+        )
+        renewable_pct = np.asarray(columns["renewable_pct"], dtype=np.float64)
+
+        def totals(rows):
+            values = _sampled(weights, self.monthly_multipliers, indices, rows)
+            return _initial_survey_totals(
+                values,
+                heating_is_elec[rows, None],
+                renewable_pct[rows, None],
+                1.0,
+            )["monthly_total"]
+
+        return self._bands(len(renewable_pct), totals)
+
+    def weekly_bands_batch(self, columns):
+        """Bands of ``weekly_total`` for columns of weekly checkup answers."""
+        weights = self.factors.weekly
+        indices = _encode(weights, columns)
+        energy = indices["energy_source"]
+        full_green = energy == _choice_index(weights, "energy_source", "FULL_GREEN")
+        partial = energy == _choice_index(weights, "energy_source", "PARTIAL")
+        green_opt = energy == _choice_index(weights, "energy_source", "GREEN_OPT")
+        electric_vehicle = indices["vehicle_type"] == _choice_index(
+            weights, "vehicle_type", "ELECTRIC"
+        )
+
+        def totals(rows):
+            values = _sampled(weights, self.weekly_multipliers, indices, rows)
+            return _weekly_checkup_totals(
+                values,
+                full_green[rows, None],
+                partial[rows, None],
+                green_opt[rows, None],
+                electric_vehicle[rows, None],
+            )["weekly_total"]
+
+        return self._bands(len(energy), totals)
+
+    def initial_bands(self, answers):
+        """Band of ``monthly_total`` for one set of initial survey answers."""
+        return _band(self.initial_bands_batch(_one_row(answers))[0])
+
+    def weekly_bands(self, answers):
+        """Band of ``weekly_total`` for one set of weekly checkup answers."""
+        return _band(self.weekly_bands_batch(_one_row(answers))[0])
+
+
+def _encode(weights, columns):
+    return {field: encode_choices(weights, field, columns[field]) for field in weights}
+
+
+def _sampled(weights, multipliers, indices, rows):
+    """Sampled weight values, one row per answer row and one column per sample."""
+    return {
+        field: _weight_vector(weights, field)[indices[field][rows], None]
+        * multipliers[field]
+        for field in weights
+    }
+
+
+def _one_row(answers):
+    return {field: [value] for field, value in answers.items()}
+
+
+def _band(row):
+    return dict(zip(("p5", "p50", "p95"), row.tolist()))
@@ -1,10 +1,14 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.index, name="index"),
     path("onboarding/", views.onboarding, name="onboarding"),
     path("survey/", views.survey_dashboard, name="survey_dashboard"),
+    path("survey/history/", views.checkup_history, name="checkup_history"),
+    path("survey/export/<str:kind>/", views.export_results, name="export_results"),
     path("survey/initial/", views.initial_survey, name="initial_survey"),
     path("survey/weekly/", views.weekly_checkup, name="weekly_checkup"),
+    path("survey/scenarios/", views.scenarios, name="scenarios"),
+    path("api/score/<str:kind>/", api.score, name="api_score"),
 ]
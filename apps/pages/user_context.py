@@ -0,0 +1,83 @@
+"""Per-request access to the signed-in user's profile and baseline survey.
+
+Views read the profile and the baseline initial survey through
+``user_context(request)``, which loads both in one query on first access and
+memoizes them on the request. Nothing is kept across requests: the web
+workers do not share a cache, so a cached baseline would outlive surveys
+that another process re-scores, replaces or deletes.
+"""
+
+from django.db.models import FilteredRelation, OuterRef, Q, Subquery
+from django.utils.functional import cached_property
+
+from .models import InitialSurveyResult, UserProfile
+
+
+def _latest_baseline(user_ref):
+    return (
+        InitialSurveyResult.objects.filter(user=user_ref)
+        .order_by("-date_submitted", "-id")
+        .values("id")[:1]
+    )
+
+
+def latest_baseline(user_id):
+    """Return the user's latest initial survey, or None."""
+    return (
+        InitialSurveyResult.objects.filter(user_id=user_id)
+        .order_by("-date_submitted", "-id")
+        .first()
+    )
+
+
+class UserContext:
+    """The profile and baseline survey of one user, loaded on first access."""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _loaded(self):
+        if not self.user.is_authenticated:
+            return None, None
+
+        # One query: the profile with the latest baseline joined in
+        profile = (
+            UserProfile.objects.filter(user_id=self.user.pk)
+            .annotate(
+                baseline=FilteredRelation(
+                    "user__initialsurveyresult",
+                    condition=Q(
+                        user__initialsurveyresult__id=Subquery(
+                            _latest_baseline(OuterRef("user"))
+                        )
+                    ),
+                )
+            )
+            .select_related("baseline")
+            .first()
+        )
+        if profile is None:
+            return None, None
+
+        profile.user = self.user
+        # Later reads of request.user.userprofile reuse this instance
+        self.user.userprofile = profile
+        # Left unset when the user has no initial survey yet
+        return profile, getattr(profile, "baseline", None)
+
+    @property
+    def profile(self):
+        return self._loaded[0]
+
+    @property
+    def baseline(self):
+        return self._loaded[1]
+
+
+def user_context(request):
+    """Return the request's ``UserContext``, creating it on first use."""
+    context = getattr(request, "user_context", None)
+    if context is None:
+        context = request.user_context = UserContext(request.user)
+    return context
@@ -1,15 +1,30 @@
-import json
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
-from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from .forms import InitialSurveyForm, WeeklyCheckupForm, UserOnboardingForm
-from .models import InitialSurveyResult, WeeklyCheckupResult, UserProfile
+from .models import WeeklyCheckupResult, UserProfile
+from apps.charts.cohorts import cohort_stats
+from apps.charts.goals import current_month, update_goal_progress
 from apps.charts.models import CarbonGoal
+from apps.charts.ranks import update_rank
+from apps.charts.rollups import add_checkup
+from .dashboard import (
+    index_context,
+    rebuild_snapshot,
+    snapshot_data,
+    survey_dashboard_context,
+)
 from .decorators import onboarding_required
-from .carbon_calculator import CarbonCalculator
+from .emission_factors import factors_for
+from .export import EXPORTS, csv_response
+from .history import MAX_PAGE_SIZE, PAGE_SIZE, history_page
+from .scenarios import MAX_PAIRS, scenario_answers, scenarios_for
+from .user_context import user_context
 
 
 def register(request):
@@ -31,12 +46,9 @@ def register(request):
 @login_required
 def onboarding(request):
     # Check if user has already completed onboarding
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-        if profile.onboarding_completed:
-            return redirect("index")
-    except UserProfile.DoesNotExist:
-        profile = UserProfile(user=request.user)
+    profile = user_context(request).profile or UserProfile(user=request.user)
+    if profile.onboarding_completed:
+        return redirect("index")
 
     if request.method == "POST":
         form = UserOnboardingForm(request.POST, instance=profile)
@@ -46,11 +58,10 @@ def onboarding(request):
             profile.save()
 
             # Create initial carbon goal
-            current_month = timezone.now().replace(day=1)
-            CarbonGoal.objects.create(
+            CarbonGoal.objects.update_or_create(
                 user=request.user,
-                month=current_month,
-                target_amount=profile.carbon_goal,
+                month=current_month(),
+                defaults={"target_amount": profile.carbon_goal},
             )
 
             messages.success(
@@ -67,251 +78,66 @@ def onboarding(request):
 @login_required
 @onboarding_required
 def index(request):
-    # Check if user needs to complete onboarding
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-        if not profile.onboarding_completed:
-            return redirect("onboarding")
-    except UserProfile.DoesNotExist:
-        return redirect("onboarding")
-
     # Check if user needs to complete initial survey
-    if not InitialSurveyResult.objects.filter(user=request.user).exists():
+    if user_context(request).baseline is None:
         messages.info(
             request,
             "Please complete the initial survey to start tracking your carbon footprint.",
         )
         return redirect("initial_survey")
 
-    context = {}
+    data = snapshot_data(request.user)
+    # How households like the user's did this month, from the cached cohort stats
+    [cohort] = cohort_stats(user_context(request).profile, [current_month()])
+    return render(request, "pages/index.html", index_context(data, cohort=cohort))
 
-    if request.user.is_authenticated:
-        # Get initial survey and weekly checkups
-        initial_survey = (
-            InitialSurveyResult.objects.filter(user=request.user)
-            .order_by("-date_submitted")
-            .first()
-        )
-        weekly_checkups = WeeklyCheckupResult.objects.filter(
-            user=request.user
-        ).order_by("-date_submitted")[:12]
-
-        # Get current carbon goal
-        current_month = timezone.now().replace(day=1)
-        current_goal = CarbonGoal.objects.filter(
-            user=request.user, month=current_month
-        ).first()
-
-        # Area chart data - last 7 weekly checkups reversed for chronological order
-        last_7_checkups = list(reversed(weekly_checkups[:7])) if weekly_checkups else []
-        if last_7_checkups:
-            area_chart_data = {
-                "labels": [
-                    checkup.date_submitted.strftime("%b %d")
-                    for checkup in last_7_checkups
-                ],
-                "weekly_totals": [
-                    float(checkup.weekly_total) for checkup in last_7_checkups
-                ],
-                "monthly_estimates": [
-                    float(checkup.monthly_estimate) for checkup in last_7_checkups
-                ],
-            }
-        else:
-            area_chart_data = None
-
-        # Previous results for table
-        previous_results = []
-        # Iterate through checkups to calculate percentage change from the previous one
-        for i, checkup in enumerate(weekly_checkups):
-            pct_change = None
-            # Find the previous checkup (the next one in the list, since it's sorted descending)
-            if i + 1 < len(weekly_checkups):
-                prev_checkup = weekly_checkups[i + 1]
-                if prev_checkup.weekly_total > 0:
-                    pct_change = (
-                        (checkup.weekly_total - prev_checkup.weekly_total)
-                        / prev_checkup.weekly_total
-                    ) * 100
-
-            previous_results.append(
-                {
-                    "date": checkup.date_submitted,
-                    "carbon": checkup.weekly_total,
-                    "pct_change": pct_change,
-                    "monthly_est": checkup.monthly_estimate,
-                }
-            )
-
-        # Current usage stats
-        latest_checkup = weekly_checkups.first() if weekly_checkups else None
-        current_usage = {
-            "weekly_total": latest_checkup.weekly_total if latest_checkup else 0,
-            "monthly_estimate": latest_checkup.monthly_estimate
-            if latest_checkup
-            else 0,
-            "pct_change": previous_results[0]["pct_change"]
-            if previous_results and "pct_change" in previous_results[0]
-            else None,
-        }
-
-        # Time since last checkup
-        time_since_last = None
-        if latest_checkup:
-            time_since_last = (timezone.now() - latest_checkup.date_submitted).days
-
-        # Carbon usage chart data - improved logic to always show meaningful trend data
-        monthly_data = []
-        if weekly_checkups:
-            # Always show individual weekly data for better visualization
-            # Take the most recent 6 weeks to show a good trend
-            recent_checkups = list(reversed(weekly_checkups[:6]))
-            for i, checkup in enumerate(recent_checkups):
-                # Use relative week labels for better readability
-                weeks_ago = len(recent_checkups) - i - 1
-                if weeks_ago == 0:
-                    label = "This Week"
-                elif weeks_ago == 1:
-                    label = "Last Week"
-                else:
-                    label = f"{weeks_ago} Weeks Ago"
-
-                monthly_data.append(
-                    {"month": label, "average": float(checkup.weekly_total)}
-                )
-
-        # Calculate goal progress based on current goal and baseline
-        current = float(latest_checkup.monthly_estimate) if latest_checkup else 0
-        goal_progress = 0
-
-        if (
-            current_goal
-            and current_goal.target_amount > 0
-            and current >= 0
-            and initial_survey
-        ):
-            baseline = float(initial_survey.monthly_total)
-            target = float(current_goal.target_amount)
-
-            # Check if current usage is at or below target (achieved goal)
-            if current <= target:
-                goal_progress = 100
-            # Check if current usage exceeds baseline (no progress)
-            elif current >= baseline:
-                goal_progress = 0
-            # Calculate progress for values between baseline and target
-            else:
-                total_reduction_needed = baseline - target
-                reduction_achieved = baseline - current
-                goal_progress = (reduction_achieved / total_reduction_needed) * 100
-                goal_progress = max(0, min(100, goal_progress))
-        elif initial_survey and current > 0:
-            # Fall back to simple baseline comparison if no goal is set
-            baseline = float(initial_survey.monthly_total)
-            if current >= baseline:
-                goal_progress = 0
-            else:
-                reduction = baseline - current
-                goal_progress = min(100, (reduction / baseline) * 100)
-
-        # Ensure time calculations are valid
-        time_since_last = (
-            (timezone.now() - latest_checkup.date_submitted).days
-            if latest_checkup
-            else None
-        )
-        days_until_next = max(0, 7 - (time_since_last or 0))  # Ensure non-negative
-
-        # Update current goal's current_amount if we have a latest checkup
-        if current_goal and latest_checkup:
-            current_goal.current_amount = latest_checkup.monthly_estimate
-            current_goal.save()
-
-        context.update(
-            {
-                "initial_survey": initial_survey,
-                "area_chart_data": json.dumps(area_chart_data)
-                if area_chart_data
-                else None,
-                "previous_results": previous_results,
-                "current_usage": current_usage,
-                "time_since_last": time_since_last
-                or 0,  # Ensure we don't send None to template
-                "days_until_next": days_until_next,
-                "monthly_data": json.dumps(monthly_data) if monthly_data else None,
-                "goal_progress": round(goal_progress, 1),
-                "show_estimator": not initial_survey or not latest_checkup,
-                "current_goal": current_goal,
-            }
-        )
 
-    return render(request, "pages/index.html", context)
+@login_required
+@onboarding_required
+def survey_dashboard(request):
+    context = survey_dashboard_context(request.user)
+    return render(request, "pages/survey_dashboard.html", context)
 
 
 @login_required
 @onboarding_required
-def survey_dashboard(request):
-    initial_survey = (
-        InitialSurveyResult.objects.filter(user=request.user)
-        .order_by("-date_submitted")
-        .first()
-    )
-    weekly_checkups = WeeklyCheckupResult.objects.filter(user=request.user).order_by(
-        "-date_submitted"
-    )[:12]
+def checkup_history(request):
+    """A page of the user's checkup history as JSON, for infinite scroll."""
+    try:
+        size = int(request.GET.get("size", PAGE_SIZE))
+        if not 1 <= size <= MAX_PAGE_SIZE:
+            raise ValueError(f"size must be between 1 and {MAX_PAGE_SIZE}")
+        page = history_page(request.user, request.GET.get("cursor"), size)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(page)
 
-    initial_survey = (
-        InitialSurveyResult.objects.filter(user=request.user)
-        .order_by("-date_submitted")
-        .first()
-    )
-    weekly_checkups = WeeklyCheckupResult.objects.filter(user=request.user).order_by(
-        "-date_submitted"
-    )[:12]
-
-    # Prepare chart data with better error handling
-    chart_data = {
-        "labels": [
-            checkup.date_submitted.strftime("%Y-%m-%d")
-            for checkup in reversed(weekly_checkups)
-        ],
-        "weekly_totals": [
-            float(checkup.weekly_total or 0) for checkup in reversed(weekly_checkups)
-        ],
-        "monthly_estimates": [
-            float(checkup.monthly_estimate or 0)
-            for checkup in reversed(weekly_checkups)
-        ],
-    }
-
-    # JSON serialize the chart data
-    chart_data = {
-        "labels": json.dumps(chart_data["labels"]),
-        "weekly_totals": json.dumps(chart_data["weekly_totals"]),
-        "monthly_estimates": json.dumps(chart_data["monthly_estimates"]),
-    }
-
-    context = {
-        "initial_survey": initial_survey,
-        "weekly_checkups": weekly_checkups,
-        "chart_data": chart_data,
-    }
-    return render(request, "pages/survey_dashboard.html", context)
+
+@login_required
+@onboarding_required
+def export_results(request, kind):
+    """Download all of the user's initial surveys or weekly checkups as CSV."""
+    if kind not in EXPORTS:
+        return JsonResponse({"error": f"unknown export {kind!r}"}, status=404)
+    response = csv_response(request.user, kind)
+    patch_cache_control(response, private=True, no_store=True)
+    return response
 
 
 @login_required
 def initial_survey(request):
+    context = user_context(request)
+
     # Check if user has completed onboarding
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-        if not profile.onboarding_completed:
-            messages.error(request, "Please complete the onboarding process first.")
-            return redirect("onboarding")
-    except UserProfile.DoesNotExist:
+    profile = context.profile
+    if profile is None:
+        return redirect("onboarding")
+    if not profile.onboarding_completed:
+        messages.error(request, "Please complete the onboarding process first.")
         return redirect("onboarding")
 
     # Check if user already has an initial survey
-    if InitialSurveyResult.objects.filter(user=request.user).exists():
+    if context.baseline is not None:
         messages.info(request, "You have already completed the initial survey.")
         return redirect("survey_dashboard")
 
@@ -323,10 +149,6 @@ def initial_survey(request):
 
             # Calculate carbon footprint
             data = form.cleaned_data
-            try:
-                profile = UserProfile.objects.get(user=request.user)
-            except UserProfile.DoesNotExist:
-                return redirect("onboarding")
 
             # Create data dict with profile and form data
             survey_data = {
@@ -335,13 +157,16 @@ def initial_survey(request):
                 "home_type": profile.house_type,
             }
 
-            results = CarbonCalculator.calculate_initial_survey(survey_data)
+            factors = factors_for(profile)
+            results = factors.calculate_initial_survey(survey_data)
 
-            # Update survey with calculated fields
-            for key, value in results.items():
+            # Update survey with calculated fields and the factors used
+            for key, value in {**results, **factors.stamp}.items():
                 setattr(survey, key, value)
 
-            survey.save()
+            with transaction.atomic():
+                survey.save()
+                rebuild_snapshot(request.user)
             messages.success(request, "Initial survey completed successfully!")
             return redirect("survey_dashboard")
     else:
@@ -358,11 +183,6 @@ def weekly_checkup(request):
         .order_by("-date_submitted")
         .first()
     )
-    last_checkup = (
-        WeeklyCheckupResult.objects.filter(user=request.user)
-        .order_by("-date_submitted")
-        .first()
-    )
 
     if request.method == "POST":
         form = WeeklyCheckupForm(request.POST)
@@ -373,18 +193,65 @@ def weekly_checkup(request):
             # Get last week's total for comparison
             last_week_total = last_checkup.weekly_total if last_checkup else None
 
-            # Calculate carbon footprint
+            # Calculate carbon footprint with the user's regional factors
             data = form.cleaned_data
-            results = CarbonCalculator.calculate_weekly_checkup(data, last_week_total)
+            profile = user_context(request).profile
+            factors = factors_for(profile)
+            results = factors.calculate_weekly_checkup(
+                data, last_week_total, profile.household_size
+            )
 
-            # Update checkup with calculated fields
-            for key, value in results.items():
+            # Update checkup with calculated fields and the factors used
+            for key, value in {**results, **factors.stamp}.items():
                 setattr(checkup, key, value)
 
-            checkup.save()
+            with transaction.atomic():
+                checkup.save()
+                add_checkup(checkup)
+                update_rank(checkup, profile)
+                update_goal_progress(request.user)
+                rebuild_snapshot(request.user)
             messages.success(request, "Weekly checkup completed successfully!")
             return redirect("survey_dashboard")
     else:
         form = WeeklyCheckupForm()
 
     return render(request, "pages/weekly_checkup.html", {"form": form})
+
+
+@login_required
+@onboarding_required
+def scenarios(request):
+    """What-if reduction scenarios for the user's latest answers, as JSON."""
+    kind = request.GET.get("source", "weekly")
+    if kind not in ("weekly", "initial"):
+        return JsonResponse({"error": "source must be weekly or initial"}, status=400)
+    try:
+        k = min(max(int(request.GET.get("k", 5)), 1), MAX_PAIRS)
+    except ValueError:
+        return JsonResponse({"error": "k must be an integer"}, status=400)
+
+    context = user_context(request)
+    if kind == "weekly":
+        row = (
+            WeeklyCheckupResult.objects.filter(user=request.user)
+            .order_by("-date_submitted")
+            .first()
+        )
+    else:
+        row = context.baseline
+    if row is None:
+        return JsonResponse({"error": f"no {kind} results yet"}, status=404)
+
+    profile = context.profile
+    factors = factors_for(profile)
+    result = scenarios_for(
+        kind, scenario_answers(kind, row, profile, factors), factors, k
+    )
+
+    # The result only changes with the answer vector, so clients can revalidate
+    etag = f'"{result.pop("key")}"'
+    response = get_conditional_response(request, etag=etag) or JsonResponse(result)
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,238 @@
+"""Incremental Parquet export of the survey, checkup, goal and profile tables.
+
+Each table is written under its own directory of the warehouse, and
+``_manifest.json`` records what each export wrote:
+
+- ``initial_surveys`` and ``weekly_checkups`` are split into blocks of
+  ``BLOCK_SIZE`` ids, one ``block-<n>.parquet`` each.
+- ``carbon_goals`` has one ``month=<YYYY-MM-DD>.parquet`` per month.
+- ``user_profiles`` are one row per user, so each run replaces
+  ``snapshot.parquet``.
+
+Rows are not only appended: ``recompute_results`` re-scores them in place,
+``delete_user`` purges them and transactions commit out of id order. So
+the manifest keeps a signature of every block or month, from one grouped
+query per run, and a run rewrites the partitions whose signature changed and
+removes the ones that no longer have rows. Row counts catch inserted and
+deleted rows. Rows changed in place are caught by the latest ``updated_at``
+of surveys and checkups, and by the id and amount sums of goals. Signatures
+are read before the rows, so a row written during a run is at worst
+exported again by the next one.
+
+Rows are read in keyset batches of ``batch_size`` and written as one row
+group each, so memory is bounded by the batch size, not the table size.
+Files are written under a temporary name and renamed when complete, and
+the manifest is updated after every file, so an interrupted run resumes
+where it stopped.
+"""
+
+import json
+import os
+import shutil
+import time
+
+from django.db import models
+from django.db.models import Count, F, Max, Q, Sum
+
+from apps.charts.models import CarbonGoal
+
+from .models import InitialSurveyResult, UserProfile, WeeklyCheckupResult
+
+MANIFEST = "_manifest.json"
+BATCH_SIZE = 50000
+BLOCK_SIZE = 100_000
+
+# Table name, model and how it is partitioned
+TABLES = {
+    "initial_surveys": (InitialSurveyResult, "blocks"),
+    "weekly_checkups": (WeeklyCheckupResult, "blocks"),
+    "carbon_goals": (CarbonGoal, "monthly"),
+    "user_profiles": (UserProfile, "snapshot"),
+}
+
+
+def _pyarrow():
+    # Imported on use, so the app runs without pyarrow installed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    return pa, pq
+
+
+def arrow_schema(model):
+    """The Arrow schema of a model's concrete columns."""
+    pa, _ = _pyarrow()
+    types = [
+        (models.BooleanField, pa.bool_()),
+        (models.DateTimeField, pa.timestamp("us", tz="UTC")),
+        (models.DateField, pa.date32()),
+        (models.FloatField, pa.float64()),
+        (models.CharField, pa.string()),
+        (models.TextField, pa.string()),
+        # Integer columns, auto ids and foreign keys
+        (models.Field, pa.int64()),
+    ]
+    return pa.schema(
+        [
+            pa.field(
+                field.attname,
+                next(t for cls, t in types if isinstance(field, cls)),
+                nullable=field.null,
+            )
+            for field in model._meta.concrete_fields
+        ]
+    )
+
+
+def batches(queryset, columns, batch_size):
+    """``{column: values}`` batches of ``queryset``, in id order."""
+    last = None
+    while True:
+        rows = queryset.order_by("id")
+        if last is not None:
+            rows = rows.filter(id__gt=last)
+        rows = list(rows.values_list(*columns)[:batch_size])
+        if not rows:
+            return
+        last = rows[-1][columns.index("id")]
+        yield dict(zip(columns, map(list, zip(*rows))))
+
+
+def signatures(model, mode):
+    """``{partition: signature}`` of a table's blocks or months, in one query."""
+    if mode == "blocks":
+        partitions = (
+            model.objects.annotate(partition=F("id") / BLOCK_SIZE)
+            .values("partition")
+            .annotate(rows=Count("id"), updated=Max("updated_at"))
+            .order_by("partition")
+        )
+        return {
+            str(row["partition"]): [row["rows"], row["updated"].isoformat()]
+            for row in partitions
+        }
+    partitions = (
+        model.objects.values("month")
+        .annotate(
+            rows=Count("id"),
+            ids=Sum("id"),
+            target=Sum("target_amount"),
+            current=Sum("current_amount"),
+            achieved=Count("id", filter=Q(achieved=True)),
+        )
+        .order_by("month")
+    )
+    return {
+        row["month"].isoformat(): [
+            row["rows"],
+            row["ids"],
+            row["target"],
+            row["current"],
+            row["achieved"],
+        ]
+        for row in partitions
+    }
+
+
+def partition_file(mode, key):
+    if mode == "blocks":
+        return f"block-{int(key):08d}.parquet"
+    return f"month={key}.parquet"
+
+
+class Warehouse:
+    def __init__(self, directory, batch_size=BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+    def reset(self, table):
+        """Forget a table's exports, so the next run writes it in full."""
+        shutil.rmtree(os.path.join(self.directory, table), ignore_errors=True)
+        self.manifest.pop(table, None)
+        self._save_manifest()
+
+    def _write(self, table, name, model, queryset):
+        """Write ``queryset`` to one file; returns ``(rows, bytes)``."""
+        pa, pq = _pyarrow()
+        schema = arrow_schema(model)
+        directory = os.path.join(self.directory, table)
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, ".writing.tmp")
+        rows = 0
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+            for batch in batches(queryset, schema.names, self.batch_size):
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+                rows += len(batch["id"])
+        path = os.path.join(directory, name)
+        os.replace(tmp, path)
+        return rows, os.path.getsize(path)
+
+    def export(self, table):
+        """Export one table's changed partitions; returns ``(rows, bytes, seconds)``."""
+        model, mode = TABLES[table]
+        started = time.monotonic()
+        if mode == "snapshot":
+            rows, size = self._write(
+                table, "snapshot.parquet", model, model.objects.all()
+            )
+        else:
+            rows, size = self._export_partitions(table, model, mode)
+        self.manifest.setdefault(table, {})["exported_at"] = time.strftime(
+            "%Y-%m-%dT%H:%M:%S%z"
+        )
+        self._save_manifest()
+        return rows, size, time.monotonic() - started
+
+    def _export_partitions(self, table, model, mode):
+        state = self.manifest.setdefault(table, {})
+        if "partitions" not in state:
+            # Files of an unknown earlier layout would be read alongside
+            shutil.rmtree(os.path.join(self.directory, table), ignore_errors=True)
+            state["partitions"] = {}
+        exported = state["partitions"]
+        current = signatures(model, mode)
+        rows = size = 0
+
+        for key, signature in current.items():
+            if exported.get(key) == signature:
+                continue
+            if mode == "blocks":
+                start = int(key) * BLOCK_SIZE
+                queryset = model.objects.filter(
+                    id__gte=start, id__lt=start + BLOCK_SIZE
+                )
+            else:
+                queryset = model.objects.filter(month=key)
+            written, written_bytes = self._write(
+                table, partition_file(mode, key), model, queryset
+            )
+            rows += written
+            size += written_bytes
+            exported[key] = signature
+            self._save_manifest()
+
+        for key in set(exported) - set(current):
+            try:
+                os.remove(
+                    os.path.join(self.directory, table, partition_file(mode, key))
+                )
+            except FileNotFoundError:
+                pass
+            del exported[key]
+            self._save_manifest()
+        return rows, size
@@ -172,6 +172,11 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, "static"),)
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Per-region emission factor files (<region>.json), see docs/surveys.md
+EMISSION_FACTORS_DIR = os.path.join(BASE_DIR, "emission_factors")
+# Seconds between checks of a region file's mtime
+EMISSION_FACTORS_CHECK_INTERVAL = 2.0
+
 LOGIN_REDIRECT_URL = "/"
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
@@ -194,4 +199,8 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.TokenAuthentication",
     ],
 }
+
+# Limits for the stateless scoring API (apps/pages/api.py)
+SCORING_API_MAX_RECORDS = 10_000
+SCORING_API_MAX_BYTES = 8 * 1024 * 1024
 ########################################